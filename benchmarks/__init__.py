@@ -0,0 +1,6 @@
+"""
+Benchmarks of job-combine
+
+`suite` times the stages of job-combine on synthetic job files created by `generators`; the other modules are
+micro-benchmarks of single components.
+"""
@@ -0,0 +1,103 @@
+"""Generators of synthetic job files for the benchmarks"""
+from __future__ import absolute_import, division, print_function
+
+import math
+import os
+import random
+from datetime import timedelta
+from os import path
+
+from job_combine.cluster.managers import managers
+from job_combine.utils import time_parser
+
+# Directives that do not affect the combination; used to vary the header size
+FILLER = {
+    'Slurm': ['--mail-type=END', '--export=NONE', '--get-user-env', '--mem=50G', '--account=project',
+              '--mail-user=user@example.com', '--cpus-per-task=2', '--constraint=haswell'],
+    'LoadLeveler': ['notification = never', 'energy_policy_tag = bench', 'minimize_time_to_solution = yes',
+                    'island_count = 1', 'network.MPI = sn_all,not_shared,us', 'tasks_per_node = 28',
+                    'class = micro', 'notify_user = user@example.com'],
+}
+
+# Directives distinguishing the groups of combinable jobs
+GROUP_ARG = {'Slurm': '--nodes=%i', 'LoadLeveler': 'node = %i'}
+
+
+def uniform(rnd, mean):
+    return rnd.uniform(0, 2 * mean)
+
+
+def lognormal(rnd, mean):
+    # sigma of 1 gives the long tail of real job times; mu is chosen so the mean is kept
+    return rnd.lognormvariate(math.log(mean) - 0.5, 1)
+
+
+def bimodal(rnd, mean):
+    # mostly short jobs with some very long ones
+    return rnd.uniform(0, 0.4 * mean) if rnd.random() < 0.8 else rnd.uniform(2.4 * mean, 4.4 * mean)
+
+
+distributions = {
+    'uniform': uniform,
+    'lognormal': lognormal,
+    'bimodal': bimodal,
+}
+
+
+def job_file(manager_name, name, seconds, group, n_directives):
+    """
+    Creates the content of a job file
+    :param manager_name: Name of the workload manager
+    :param name: Job name
+    :param seconds: Requested time in seconds
+    :param group: Index of the group of combinable jobs
+    :param n_directives: Number of directives besides name, time, output and group
+    :return: Content of the job file
+    """
+    m = managers[manager_name]
+    time = time_parser.str_from_timedelta(timedelta(seconds=seconds), m.time_formats[0])
+    d = m.directive + ' '
+    lines = ['#!/bin/bash',
+             d + m.arg_format[0] % (m.name_args[0], name),
+             d + m.arg_format[0] % (m.time_args[0], time),
+             d + m.arg_format[0] % (m.stdout_args[0], name + '.out'),
+             d + GROUP_ARG[manager_name] % (group + 1)]
+    filler = FILLER[manager_name]
+    lines += [d + filler[i % len(filler)] for i in range(n_directives)]
+    if manager_name == 'LoadLeveler':
+        lines.append(d + 'queue')
+    lines += ['', 'srun ./simulation %s' % name, '']
+    return '\n'.join(lines)
+
+
+def generate(directory, n_jobs, manager_name='Slurm', n_groups=1, n_directives=8, distribution='lognormal',
+             mean_minutes=60, seed=0):
+    """
+    Writes synthetic job files; the same arguments always create the same files
+    :param directory: Directory the job files are written to; one sub directory is created for 1000 files each
+    :param n_jobs: Number of job files
+    :param manager_name: Name of the workload manager
+    :param n_groups: Number of distinct groups of combinable jobs
+    :param n_directives: Number of additional directives per job file
+    :param distribution: Name of the distribution of the requested times
+    :param mean_minutes: Mean requested time in minutes
+    :param seed: Seed of the random number generator
+    :return: List of paths to the job files
+    """
+    rnd = random.Random(seed)
+    draw = distributions[distribution]
+    files = []
+    for i in range(n_jobs):
+        sub_dir = path.join(directory, '%04i' % (i // 1000))
+        if i % 1000 == 0:
+            os.makedirs(sub_dir)
+        seconds = max(60, int(draw(rnd, mean_minutes * 60)))
+        file = path.join(sub_dir, 'job%07i.sh' % i)
+        with open(file, 'w') as f:
+            f.write(job_file(manager_name, 'sim-%i' % i, seconds, rnd.randrange(n_groups), n_directives))
+        files.append(file)
+    return files
+
+
+def available_distributions():
+    return distributions.keys()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Memory and pickle size of the job representation
+
+Compares the compact `Job` with slots, whole seconds and shared params with the previous `Job` keeping a dictionary,
+a timedelta and its own params per instance. Run with `python -m benchmarks.job_memory_bench`.
+"""
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import gc
+import pickle
+import tracemalloc
+from datetime import timedelta
+
+from job_combine.cluster.job import Job
+from job_combine.storage.backends import PICKLE_PROTOCOL
+
+
+class LegacyJob:
+    """Previous implementation of `Job`"""
+
+    def __init__(self, file, name, directory, time, stdout, stderr, params, manager_name):
+        self.file = file
+        self.name = name
+        self.directory = directory
+        self.time = time
+        self.stdout = stdout
+        self.stderr = stderr
+        self.params = tuple(sorted(params, key=lambda x: x[0]))
+        self.manager_name = manager_name
+
+
+def make_jobs(cls, n, n_groups):
+    jobs = []
+    for i in range(n):
+        # every job parses its own strings and params like `Job.from_file`
+        directory = '/home/user/project/runs/%04i' % (i // 1000)
+        params = [('nodes', 0, '%i' % (i % n_groups + 1)), ('partition', 0, 'micro'), ('ntasks', 0, '28'),
+                  ('account', 0, 'project'), ('export', 0, 'NONE')]
+        jobs.append(cls('%s/job%07i.sh' % (directory, i), 'sim-%i' % i, directory, timedelta(seconds=60 + i % 7200),
+                        'sim-%i.out' % i, None, params, ''.join(['Slu', 'rm'])))
+    return jobs
+
+
+def measure(cls, n, n_groups):
+    gc.collect()
+    tracemalloc.start()
+    jobs = make_jobs(cls, n, n_groups)
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    list_pickle = len(pickle.dumps(jobs, protocol=PICKLE_PROTOCOL))
+    # the sqlite storage keeps one pickle per job
+    job_pickles = sum(len(pickle.dumps(job, protocol=PICKLE_PROTOCOL)) for job in jobs)
+    return size, list_pickle, job_pickles
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measures memory and pickle size of the job representation.')
+    parser.add_argument('-n', '--jobs', default=100000, type=int, help='Number of jobs [default: %(default)i]')
+    parser.add_argument('-g', '--groups', default=4, type=int, help='Number of groups [default: %(default)i]')
+    args = parser.parse_args()
+
+    results = [('legacy', measure(LegacyJob, args.jobs, args.groups)),
+               ('compact', measure(Job, args.jobs, args.groups))]
+
+    print('%i jobs in %i groups' % (args.jobs, args.groups))
+    print('%-8s %14s %14s %18s' % ('', 'memory', 'pickled list', 'pickled per job'))
+    for name, (size, list_pickle, job_pickles) in results:
+        print('%-8s %10.1f MiB %10.1f MiB %14.1f MiB' % (name, size / 2 ** 20, list_pickle / 2 ** 20,
+                                                         job_pickles / 2 ** 20))
+    print('%-8s %13.2fx %13.2fx %17.2fx' % (('ratio',) + tuple(results[0][1][k] / results[1][1][k] for k in range(3))))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the names of combined jobs
+
+Compares the previous naming, which ran SequenceMatcher against every job name in turn, with the suffix automaton of
+`names.longest_common_substring` on names of runs sharing a stem and differing in their parameters. Run with
+`python benchmarks/names_bench.py`.
+"""
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import random
+import string
+import time
+from difflib import SequenceMatcher
+
+from job_combine.utils import names
+
+
+def legacy_name(job_names):
+    """Previous implementation of the name of a combined job"""
+    best_match = job_names[0]
+    for name in job_names:
+        match = SequenceMatcher(None, name, best_match).find_longest_match(0, len(name), 0, len(best_match))
+        best_match = job_names[0][match.a:match.a + match.size]
+    return best_match
+
+
+def job_names(n, length, stem_length, seed):
+    """Names of `length` characters sharing a stem followed by random parameters and the index of the run"""
+    rnd = random.Random(seed)
+    chars = string.ascii_lowercase + string.digits
+    stem = ''.join(rnd.choice(chars) for _ in range(stem_length)) + '_'
+    result = []
+    for i in range(n):
+        suffix = '_%06i' % i
+        result.append(stem + ''.join(rnd.choice(chars) for _ in range(length - len(stem) - len(suffix))) + suffix)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks the names of combined jobs.')
+    parser.add_argument('--seed', default=0, type=int, help='Seed of the generated names [default: %(default)i]')
+    args = parser.parse_args()
+
+    for n, length, stem_length in ((5000, 80, 10), (2000, 400, 10), (2000, 1000, 10), (2000, 1000, 900)):
+        job_names_ = job_names(n, length, stem_length, args.seed)
+        results = []
+        for name, func in (('legacy', legacy_name), ('automaton', names.longest_common_substring)):
+            start = time.time()
+            common = func(job_names_)
+            results.append((name, time.time() - start, common))
+
+        # ties may be broken differently, but the common substrings have the same length
+        assert all(len(r[2]) == len(results[0][2]) for r in results)
+        print('%i names of %i characters with a common stem of %i' % (n, length, stem_length + 1))
+        for name, elapsed, _ in results:
+            print('%-9s %8.3f s %6.1fx' % (name, elapsed, results[0][1] / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark of the directive parser used by `Job.from_file`
+
+Compares the compiled, header-only parser with the previous parser that applied every regex to every directive line
+and read the whole file. Run with `python benchmarks/parser_bench.py`.
+"""
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import os
+import re
+import shutil
+import tempfile
+import time
+
+from job_combine.cluster import parser
+from job_combine.cluster.managers import managers
+
+DIRECTIVES = ['--nodes=1', '--ntasks=28', '--cpus-per-task=2', '--partition=micro', '--account=project', '--mem=50G',
+              '--mail-type=END', '--export=NONE', '--get-user-env', '--exclusive', '-J bench', '--time=02:00:00',
+              '--output=out.txt', '--error=err.txt']
+
+
+def write_job(file, n_directives, n_body_lines):
+    with open(file, 'w') as f:
+        f.write('#!/bin/bash\n')
+        for i in range(n_directives):
+            f.write('#SBATCH %s\n' % DIRECTIVES[i % len(DIRECTIVES)])
+        f.write('\ncat > input.dat <<EOF\n')
+        for i in range(n_body_lines):
+            f.write('%i 0.125 0.250 0.500 1.000 2.000 4.000 8.000 16.000 32.000 64.000\n' % i)
+        f.write('EOF\nsrun ./simulation input.dat\n')
+
+
+def legacy_parse(job_file):
+    """Directive matching of the previous `Job.from_file`; reads the complete file"""
+    manager = None
+    params = []
+    with open(job_file, 'r') as f:
+        for line in f:
+            if line.startswith('#!') or line.startswith('# '):
+                pass
+            elif line.startswith('#'):
+                if manager is None:
+                    for wm in managers.values():
+                        if line.startswith(wm.directive):
+                            manager = wm
+                            break
+                if not line.startswith(manager.directive):
+                    continue
+                matches = [re.search(regex, line) for regex in manager.arg_regex + manager.flag_regex]
+                for i, m in enumerate(matches):
+                    if m is not None:
+                        try:
+                            val = m.group('val')
+                        except IndexError:
+                            val = None
+                        params.append((m.group('arg'), i % len(manager.arg_regex), val))
+                        break
+    return params
+
+
+def compiled_parse(job_file):
+    """Directive matching of `Job.from_file` with the compiled parser; stops reading after the header"""
+    manager = None
+    params = []
+    with open(job_file, 'r') as f:
+        for line in parser.header(f):
+            if line.startswith('#!') or line.startswith('# '):
+                continue
+            if manager is None:
+                for wm in managers.values():
+                    if line.startswith(wm.directive):
+                        manager = wm
+                        break
+            if line.startswith(manager.directive):
+                params.append(parser.parser(manager).parse(line)[:3])
+    return params
+
+
+def measure(func, files, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.time()
+        for f in files:
+            func(f)
+        best = min(best, time.time() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks the job file directive parser.')
+    parser.add_argument('-n', '--files', default=200, type=int, help='Number of job files [default: %(default)i]')
+    parser.add_argument('-d', '--directives', default=14, type=int,
+                        help='Directives per job file [default: %(default)i]')
+    parser.add_argument('-b', '--body-lines', default=20000, type=int,
+                        help='Lines of the heredoc in every job file [default: %(default)i]')
+    parser.add_argument('-r', '--repeat', default=3, type=int, help='Repetitions, the best is reported'
+                                                                     ' [default: %(default)i]')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    try:
+        files = [os.path.join(tmp, 'job%i.sh' % i) for i in range(args.files)]
+        for f in files:
+            write_job(f, args.directives, args.body_lines)
+        lines = sum(1 for f in files for _ in open(f))
+
+        results = [('legacy', measure(legacy_parse, files, args.repeat)),
+                   ('compiled', measure(compiled_parse, files, args.repeat))]
+        assert all(legacy_parse(f) == compiled_parse(f) for f in files[:10])
+    finally:
+        shutil.rmtree(tmp)
+
+    print('%i files with %i directives and %i body lines each (%i lines in total)'
+          % (args.files, args.directives, args.body_lines, lines))
+    for name, elapsed in results:
+        print('%-8s %8.3f s %14.0f lines/s %10.0f files/s' % (name, elapsed, lines / elapsed, args.files / elapsed))
+    print('speedup  %8.1fx' % (results[0][1] / results[1][1]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,268 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmark suite of the job-combine stages on synthetic job files
+
+Generates job files, then times `Job.from_file`, `add` (with and without the parse cache), loading the storage,
+`partition`, `combine` and `restart` and reports the throughput and optionally the peak memory of every stage. Results
+are written as JSON and can be compared with the results of another commit:
+
+    python -m benchmarks.suite -n 100000 -o new.json --compare baseline.json --threshold 0.1
+
+The exit status is 1 if a stage got slower than the threshold allows.
+"""
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+from os import path
+
+from benchmarks import generators
+from job_combine import job_combine
+from job_combine.cluster import job as cjob, ledger
+from job_combine.storage import backends
+
+try:
+    import tracemalloc
+except ImportError:  # python 2
+    tracemalloc = None
+
+
+@contextlib.contextmanager
+def quiet():
+    """Suppresses the progress output of the measured functions"""
+    stdout = sys.stdout
+    sys.stdout = io.StringIO() if sys.version_info[0] >= 3 else io.BytesIO()
+    try:
+        yield
+    finally:
+        sys.stdout = stdout
+
+
+class Stages(object):
+    """Runs the stages in order and records their elapsed time, number of items and peak memory"""
+
+    def __init__(self, memory=False):
+        self.memory = memory and tracemalloc is not None
+        self.results = OrderedDict()
+
+    def run(self, name, func, items=None):
+        """
+        Measures a stage
+        :param name: Name of the stage
+        :param func: Function running the stage; returns the number of processed items if `items` is None
+        :param items: Number of items processed by the stage
+        :return: Return value of the function
+        """
+        if self.memory:
+            tracemalloc.start()
+        start = time.time()
+        with quiet():
+            value = func()
+        elapsed = time.time() - start
+        peak = None
+        if self.memory:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        n = value if items is None else items
+        self.results[name] = {'seconds': elapsed, 'items': n, 'throughput': n / elapsed if elapsed > 0 else None,
+                              'peak_bytes': peak}
+        return value
+
+
+def cli_args(work_dir, **kwargs):
+    args = argparse.Namespace(storage_file=path.join(work_dir, 'job.storage'), backend='sqlite', cache_size=100000,
+                              verbose=0, workload_manager=None, processes=1, recursive=False, from_file=None,
+                              directory=path.join(work_dir, 'scripts'), adapt_time=1)
+    for key, value in kwargs.items():
+        setattr(args, key, value)
+    return args
+
+
+def run_once(work_dir, options):
+    """
+    Runs every stage once in a fresh directory
+    :param work_dir: Empty directory for the job files, storage and combined scripts
+    :param options: Parsed command line arguments
+    :return: Results by stage
+    """
+    stages = Stages(options.memory)
+    job_dir = path.join(work_dir, 'jobs')
+
+    files = stages.run('generate', lambda: generators.generate(
+        job_dir, options.jobs, options.manager, options.groups, options.directives, options.distribution,
+        options.mean_minutes, options.seed), options.jobs)
+
+    stages.run('from_file', lambda: len([cjob.Job.from_file(f, verbose=False) for f in files]))
+
+    args = cli_args(work_dir, job_files=files, processes=options.processes)
+    stages.run('add', lambda: job_combine.add(args), len(files))
+    stages.run('add_cached', lambda: job_combine.add(args), len(files))
+
+    def load():
+        with backends.open_store(args.storage_file) as storage:
+            return storage.groups()
+
+    groups = stages.run('load', load, len(files))
+
+    def partition():
+        return [job_combine.partition(jobs, max_time=options.max_time, parallel=options.parallel,
+                                      strategy=options.strategy, budget=options.strategy_budget)
+                for jobs in groups.values()]
+
+    parts = stages.run('partition', partition, len(files))
+
+    def combine():
+        # the scripts are generated lazily
+        return [(job, ''.join(script)) for job, script in (job_combine.combine(p) for part in parts for p in part)]
+
+    combined = stages.run('combine', combine, len(files))
+
+    # every second job succeeded in the combined job it was assigned to
+    for i, part in enumerate(p for part in parts for p in part):
+        script_dir = path.join(args.directory, '%02i' % i)
+        os.makedirs(script_dir)
+        with open(path.join(script_dir, ledger.DONE), 'w') as f:
+            for k, job in enumerate(part):
+                f.write('%s\t%i\t%i\t%i\n' % (job.file, k % 2, int(job.time.total_seconds()), 1000000 + k))
+    stages.run('restart', lambda: job_combine.remove_completed(args), len(files))
+
+    assert len(combined) > 0
+    return stages.results
+
+
+def run(options):
+    """
+    Runs the stages `options.repeat` times and keeps the fastest time and the largest peak memory of every stage
+    :param options: Parsed command line arguments
+    :return: Results by stage
+    """
+    best = OrderedDict()
+    for _ in range(options.repeat):
+        work_dir = tempfile.mkdtemp(dir=options.tmp)
+        try:
+            results = run_once(work_dir, options)
+        finally:
+            shutil.rmtree(work_dir)
+        for name, result in results.items():
+            previous = best.get(name, result)
+            fastest = result if result['seconds'] < previous['seconds'] else previous
+            peaks = [r['peak_bytes'] for r in (previous, result) if r['peak_bytes'] is not None]
+            best[name] = dict(fastest, peak_bytes=max(peaks) if peaks else None)
+    return best
+
+
+def commit():
+    try:
+        root = path.dirname(path.dirname(path.abspath(__file__)))
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=root,
+                                       stderr=subprocess.STDOUT).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    """
+    Compares the elapsed time of every stage with a baseline
+    :param results: Results by stage
+    :param baseline: Results by stage of the baseline
+    :param threshold: Allowed slowdown as a fraction of the baseline time
+    :return: List of (stage, baseline seconds, seconds, ratio, regressed) for the stages of both results
+    """
+    rows = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        base = baseline[name]['seconds']
+        ratio = result['seconds'] / base if base > 0 else float('inf')
+        rows.append((name, base, result['seconds'], ratio, ratio > 1 + threshold))
+    return rows
+
+
+def print_results(results):
+    print('%-12s %10s %10s %14s %12s' % ('stage', 'items', 'seconds', 'items/s', 'peak MiB'))
+    for name, r in results.items():
+        peak = '%12.1f' % (r['peak_bytes'] / 2 ** 20) if r['peak_bytes'] is not None else '%12s' % '-'
+        throughput = r['throughput'] if r['throughput'] is not None else float('inf')
+        print('%-12s %10i %10.3f %14.0f %s' % (name, r['items'], r['seconds'], throughput, peak))
+
+
+def read_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks the job-combine stages on synthetic job files.')
+    parser.add_argument('-n', '--jobs', default=10000, type=int, help='Number of job files [default: %(default)i]')
+    parser.add_argument('-m', '--manager', default='Slurm', choices=sorted(generators.FILLER),
+                        help='Workload manager of the job files [default: %(default)s]')
+    parser.add_argument('-g', '--groups', default=4, type=int,
+                        help='Number of groups of combinable jobs [default: %(default)i]')
+    parser.add_argument('--directives', default=8, type=int,
+                        help='Additional directives per job file [default: %(default)i]')
+    parser.add_argument('--distribution', default='lognormal', choices=sorted(generators.available_distributions()),
+                        help='Distribution of the requested times [default: %(default)s]')
+    parser.add_argument('--mean-minutes', default=60, type=float,
+                        help='Mean requested time in minutes [default: %(default)s]')
+    parser.add_argument('--seed', default=0, type=int, help='Seed of the job file generator [default: %(default)i]')
+    parser.add_argument('-p', '--parallel', default=50, type=int,
+                        help='Number of combined jobs to target per group [default: %(default)i]')
+    parser.add_argument('-t', '--max-time', default='48:00:00',
+                        help='Time limit of a combined job [default: %(default)s]')
+    parser.add_argument('--strategy', default='greedy', help='Partitioning strategy [default: %(default)s]')
+    parser.add_argument('--strategy-budget', default=10, type=float,
+                        help='Seconds the partitioning strategy may spend per group [default: %(default)s]')
+    parser.add_argument('-j', '--processes', default=1, type=int,
+                        help='Processes parsing the job files in `add` [default: %(default)i]')
+    parser.add_argument('-r', '--repeat', default=1, type=int,
+                        help='Repetitions, the fastest is reported [default: %(default)i]')
+    parser.add_argument('--memory', action='store_true',
+                        help='Trace the peak memory of every stage; slows down the stages')
+    parser.add_argument('--tmp', default=None, help='Directory for the temporary files')
+    parser.add_argument('-o', '--output', default=None, help='Write the results as JSON to this file')
+    parser.add_argument('--compare', default=None, help='JSON results to compare with')
+    parser.add_argument('--threshold', default=0.1, type=float,
+                        help='Allowed slowdown compared to the baseline as a fraction [default: %(default)s]')
+    options = parser.parse_args(argv)
+    options.max_time = job_combine.time_parser.str_to_timedelta(options.max_time, '%H:%M:%S')
+    return options
+
+
+def main(argv=None):
+    options = read_args(argv)
+    results = run(options)
+
+    print_results(results)
+    report = OrderedDict([
+        ('commit', commit()),
+        ('python', platform.python_version()),
+        ('parameters', OrderedDict((k, v) for k, v in sorted(vars(options).items())
+                                   if k not in ('output', 'compare', 'threshold', 'tmp', 'max_time'))),
+        ('stages', results),
+    ])
+    if options.output is not None:
+        with open(options.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if options.compare is None:
+        return 0
+    with open(options.compare) as f:
+        baseline = json.load(f)
+    if baseline.get('parameters') != report['parameters']:
+        print('WARNING: The baseline was measured with other parameters.')
+    print('\nCompared with %s:' % (baseline.get('commit') or options.compare))
+    regressed = False
+    for name, base, seconds, ratio, slower in compare(results, baseline['stages'], options.threshold):
+        print('%-12s %10.3f s -> %10.3f s %8.2fx%s' % (name, base, seconds, ratio, '  REGRESSION' if slower else ''))
+        regressed = regressed or slower
+    return 1 if regressed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the time string conversion used for every time directive
+
+Compares the previous `str_to_timedelta`, which built and matched the regex of every format on every call, with the
+cached conversion and the batch API. Run with `python benchmarks/time_parser_bench.py`.
+"""
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import random
+import re
+import time
+from datetime import timedelta
+
+from job_combine.cluster.managers import managers
+from job_combine.utils import time_parser
+
+
+def legacy_str_to_timedelta(time_str, *formats):
+    """Previous implementation of `time_parser.str_to_timedelta`"""
+    for f in formats:
+        pattern = f.replace('%D', '(?P<d>[0-9]+)')
+        pattern = pattern.replace('%H', '(?P<h>[0-9]+)')
+        pattern = pattern.replace('%M', '(?P<m>[0-9]+)')
+        pattern = pattern.replace('%S', '(?P<s>[0-9]+)')
+        match = re.match(r'^' + pattern + r'$', time_str)
+
+        if match is None:
+            continue
+
+        def get_group(grp):
+            try:
+                return match.group(grp)
+            except IndexError:
+                return 0
+
+        return timedelta(days=int(get_group('d')), hours=int(get_group('h')), minutes=int(get_group('m')),
+                         seconds=int(get_group('s')))
+
+    raise ValueError('`%s` is not a supported time format: %s' % (time_str, ', '.join(formats)))
+
+
+def time_strings(n, seed):
+    """Mix of Slurm time strings dominated by the common H:M:S and D-H:M:S shapes"""
+    rnd = random.Random(seed)
+    shapes = [(6, lambda: '%02i:%02i:%02i' % (rnd.randint(0, 47), rnd.randint(0, 59), rnd.randint(0, 59))),
+              (2, lambda: '%i-%02i:%02i:%02i' % (rnd.randint(0, 6), rnd.randint(0, 23), rnd.randint(0, 59),
+                                                 rnd.randint(0, 59))),
+              (1, lambda: '%i' % rnd.randint(1, 600)),
+              (1, lambda: '%i-%02i' % (rnd.randint(0, 6), rnd.randint(0, 23)))]
+    choices = [shape for weight, shape in shapes for _ in range(weight)]
+    return [rnd.choice(choices)() for _ in range(n)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks the conversion of time strings.')
+    parser.add_argument('-n', '--strings', default=1000000, type=int, help='Number of time strings'
+                                                                           ' [default: %(default)i]')
+    parser.add_argument('--seed', default=0, type=int, help='Seed of the generated strings [default: %(default)i]')
+    args = parser.parse_args()
+
+    formats = managers['Slurm'].time_formats
+    strings = time_strings(args.strings, args.seed)
+
+    results = []
+    for name, func in (('legacy', lambda: [legacy_str_to_timedelta(s, *formats) for s in strings]),
+                       ('cached', lambda: [time_parser.str_to_timedelta(s, *formats) for s in strings]),
+                       ('batch', lambda: time_parser.strs_to_timedeltas(strings, *formats))):
+        start = time.time()
+        converted = func()
+        results.append((name, time.time() - start, converted))
+
+    assert all(r[2] == results[0][2] for r in results)
+    print('%i time strings with the Slurm formats' % args.strings)
+    for name, elapsed, _ in results:
+        print('%-7s %8.3f s %12.0f strings/s %6.1fx' % (name, elapsed, args.strings / elapsed,
+                                                         results[0][1] / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""
+Client of the server started by `job-combine serve`
+
+The modes using the stored jobs send their command line, working directory and environment to the server, which runs
+them on the jobs it keeps in memory and streams their output back. Only the standard library is imported before the
+server answered, so an invocation does not pay for loading the modules and the storage file. Without a running server
+the command line is run directly.
+
+Every message is a JSON object on a line of its own. The client sends the request
+`{"argv": [...], "cwd": ..., "env": {...}}` and the server answers with any number of `{"out": text}`, `{"err": text}`
+and `{"stdin": true}` messages, the latter asking for the standard input, followed by `{"exit": status}`. It answers
+`{"fallback": reason}` instead if it can not run the command line, e.g. for another storage file.
+"""
+from __future__ import absolute_import, division, print_function
+
+import json
+import os
+import socket
+import sys
+
+# modes run by the server; the names of the subcommands
+SERVED_MODES = ('add', 'remove', 'restart', 'status', 'queue', 'clear')
+# global options taking a value; only global options may precede the mode
+VALUE_OPTIONS = ('--storage-file', '--backend', '--cache-size', '--equivalence', '--metrics-json', '--socket')
+SHORT_OPTIONS = {'-s': '--storage-file', '-b': '--backend', '-e': '--equivalence'}
+
+
+def global_options(argv):
+    """
+    Finds the mode and the global options preceding it without parsing the whole command line
+    :param argv: Command line arguments
+    :return: Tuple of the mode, None if it is not given, and a dictionary of the global options by long name
+    """
+    options = {}
+    i = 0
+    while i < len(argv):
+        arg = argv[i]
+        if not arg.startswith('-'):
+            return arg, options
+        if arg[:2] in SHORT_OPTIONS and len(arg) > 2:  # value attached to the short option
+            name, value = SHORT_OPTIONS[arg[:2]], arg[2:]
+        else:
+            name, sep, value = arg.partition('=')
+            name = SHORT_OPTIONS.get(name, name)
+            if not sep:
+                value = True  # flag
+                if name in VALUE_OPTIONS:
+                    i += 1
+                    value = argv[i] if i < len(argv) else None
+        options[name] = value
+        i += 1
+    return None, options
+
+
+def socket_file(options):
+    """
+    :param options: Global options as returned by `global_options`
+    :return: Path to the socket of the server using the storage file
+    """
+    if options.get('--socket') is not None:
+        return options['--socket']
+    return (options.get('--storage-file') or 'job_combine.storage') + '.sock'
+
+
+def send(sock, message):
+    sock.sendall((json.dumps(message) + '\n').encode('utf-8'))
+
+
+def receive(reader):
+    """
+    Reads the next message
+    :param reader: File object of the socket opened for reading bytes
+    :return: Message or None if the connection was closed
+    """
+    line = reader.readline()
+    if not line:
+        return None
+    return json.loads(line.decode('utf-8'))
+
+
+def connect(file):
+    """
+    Connects to a server
+    :param file: Path to the socket
+    :return: Connected socket or None if no server is listening
+    """
+    if not os.path.exists(file):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(file)
+    except (IOError, OSError):  # left behind by a server that was killed
+        sock.close()
+        return None
+    return sock
+
+
+def forward(argv):
+    """
+    Runs a command line by the server if one is running
+    :param argv: Command line arguments
+    :return: Exit status or None if the command line has to be run directly
+    """
+    mode, options = global_options(argv)
+    if mode not in SERVED_MODES or '--no-server' in options:
+        return None
+    sock = connect(socket_file(options))
+    if sock is None:
+        return None
+    try:
+        reader = sock.makefile('rb')
+        send(sock, {'argv': argv, 'cwd': os.getcwd(), 'env': dict(os.environ)})
+        while True:
+            message = receive(reader)
+            if message is None:
+                print('ERROR: The server closed the connection.', file=sys.stderr)
+                return 1
+            if 'out' in message:
+                sys.stdout.write(message['out'])
+                sys.stdout.flush()
+            elif 'err' in message:
+                sys.stderr.write(message['err'])
+                sys.stderr.flush()
+            elif 'stdin' in message:
+                send(sock, {'stdin': sys.stdin.read()})
+            elif 'fallback' in message:
+                return None
+            else:
+                return message['exit']
+    finally:
+        sock.close()
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    status = forward(argv)
+    if status is None:
+        from job_combine import job_combine  # loads the modules and the storage file
+        job_combine.read_args(argv)
+    elif status != 0:
+        sys.exit(status)
@@ -1 +1,2 @@
-__all__ = ['job', 'managers']
+__all__ = ['cache', 'collection', 'dispatch', 'equivalence', 'job', 'ledger', 'managers', 'parser', 'scripts',
+           'taskqueue']
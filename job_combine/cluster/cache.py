@@ -0,0 +1,163 @@
+"""Persistent cache of parsed job files"""
+import os
+import pickle
+import sqlite3
+
+from job_combine.cluster import job as cjob
+from job_combine.utils import paths
+
+PICKLE_PROTOCOL = 2  # Highest protocol supported by all python versions >= 2.3
+QUERY_SIZE = 500  # job files looked up per query; below the limit of SQLite for query parameters
+
+
+def identity(st):
+    """
+    Identity of a file version; changes when the file is modified or replaced
+    :param st: Result of os.stat
+    :return: Tuple of modification time, size and inode
+    """
+    return getattr(st, 'st_mtime_ns', st.st_mtime), st.st_size, st.st_ino
+
+
+class ParseCache(object):
+    """
+    Least recently used cache of parsed jobs keyed by the absolute path of the job file. An entry is only used while
+    the modification time, size and inode of the file are unchanged, so a hit does not read the file at all. The entries
+    are kept in an SQLite database; only the entries of the requested files are read and only changed entries are
+    written, so the cost of an invocation does not depend on the size of the cache.
+    """
+
+    timeout = 60  # seconds to wait for other writers
+
+    def __init__(self, file=None, max_entries=100000):
+        """
+        Opens the cache
+        :param file: Path to the file the cache is persisted in; None to keep it in memory only
+        :param max_entries: Number of entries to keep; 0 disables the cache
+        """
+        self.file = None if file is None else paths.abs_path(file)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._db = None
+        if max_entries > 0:
+            try:
+                self._db = self._connect()
+            except sqlite3.DatabaseError:  # unreadable cache files are rebuilt
+                os.remove(self.file)
+                self._db = self._connect()
+
+    def _connect(self):
+        db = sqlite3.connect(self.file or ':memory:', timeout=self.timeout, isolation_level=None)
+        try:
+            db.execute('CREATE TABLE IF NOT EXISTS entries (file TEXT PRIMARY KEY, mtime INTEGER NOT NULL,'
+                       ' size INTEGER NOT NULL, inode INTEGER NOT NULL, used INTEGER NOT NULL, data BLOB NOT NULL)')
+            db.execute('CREATE INDEX IF NOT EXISTS entries_used ON entries (used)')
+        except sqlite3.DatabaseError:
+            db.close()
+            raise
+        return db
+
+    def __len__(self):
+        if self._db is None:
+            return 0
+        return self._db.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+
+    def _entries(self, job_files):
+        """
+        Reads the entries of job files
+        :param job_files: Absolute paths to the job files
+        :return: Dictionary of (identity, pickled job) by job file
+        """
+        entries = {}
+        for i in range(0, len(job_files), QUERY_SIZE):
+            chunk = job_files[i:i + QUERY_SIZE]
+            for row in self._db.execute('SELECT file, mtime, size, inode, data FROM entries WHERE file IN (%s)'
+                                        % ', '.join('?' * len(chunk)), chunk):
+                entries[row[0]] = tuple(row[1:4]), row[4]
+        return entries
+
+    def _lookup(self, job_file, entry, workload_manager):
+        try:
+            ident = identity(os.stat(job_file))
+        except OSError:
+            return None, None
+        if entry is None or entry[0] != ident:
+            return ident, None
+        job = pickle.loads(bytes(entry[1]))
+        if workload_manager is not None and job.manager_name != workload_manager:
+            return ident, None
+        return ident, job
+
+    def _write(self, used, stored):
+        """
+        Marks entries as most recently used, adds entries and removes the least recently used entries above the limit
+        :param used: Job files of the hits in the order of use
+        :param stored: List of (job file, identity, job) of the parsed files
+        """
+        self._db.execute('BEGIN IMMEDIATE')
+        try:
+            counter = self._db.execute('SELECT MAX(used) FROM entries').fetchone()[0] or 0
+            for job_file in used:
+                counter += 1
+                self._db.execute('UPDATE entries SET used = ? WHERE file = ?', (counter, job_file))
+            for job_file, ident, job in stored:
+                counter += 1
+                data = sqlite3.Binary(pickle.dumps(job, PICKLE_PROTOCOL))
+                self._db.execute('INSERT OR REPLACE INTO entries (file, mtime, size, inode, used, data)'
+                                 ' VALUES (?, ?, ?, ?, ?, ?)', (job_file,) + tuple(ident) + (counter, data))
+            if len(stored) > 0:
+                self._db.execute('DELETE FROM entries WHERE file IN (SELECT file FROM entries ORDER BY used DESC'
+                                 ' LIMIT -1 OFFSET ?)', (self.max_entries,))
+            self._db.execute('COMMIT')
+        except Exception:
+            self._db.execute('ROLLBACK')
+            raise
+
+    def parse_files(self, job_files, workload_manager=None, processes=None):
+        """
+        Parses job files like `job.parse_files`, but serves unchanged files from the cache
+        :param job_files: Paths to the job files
+        :param workload_manager: Name of the workload manager the scripts are for
+        :param processes: Number of processes used to parse the files missing in the cache
+        :return: List of (path, job, error) tuples in the order of the paths; either job or error is None
+        """
+        job_files = [paths.abs_path(job_file) for job_file in job_files]
+        entries = self._entries(job_files) if self._db is not None else {}
+        results = []
+        missing = []
+        used = []
+        for job_file in job_files:
+            ident, job = self._lookup(job_file, entries.get(job_file), workload_manager) \
+                if self._db is not None else (None, None)
+            if job is None:
+                self.misses += 1
+                missing.append((len(results), ident))
+                results.append(job_file)
+            else:
+                self.hits += 1
+                used.append(job_file)
+                results.append((job_file, job, None))
+
+        parsed = cjob.parse_files([results[i] for i, _ in missing], workload_manager, processes)
+        stored = []
+        for (i, ident), result in zip(missing, parsed):
+            results[i] = result
+            if result[1] is not None and ident is not None:
+                stored.append((result[0], ident, result[1]))
+        if self._db is not None and (len(used) > 0 or len(stored) > 0):
+            self._write(used, stored)
+        return results
+
+    def clear(self):
+        if self._db is not None:
+            self._db.execute('DELETE FROM entries')
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def __str__(self):
+        return 'Parse cache: %i hits, %i misses, %i of %i entries used' \
+               % (self.hits, self.misses, len(self), self.max_entries)
@@ -0,0 +1,69 @@
+"""Ordered collection of jobs indexed by their file"""
+from collections import OrderedDict
+
+
+class JobCollection(object):
+    """
+    Jobs in insertion order with constant time lookup, replacement and removal by job file.
+    Adding a job whose file is already contained replaces the contained job at its position.
+    """
+
+    def __init__(self, jobs=()):
+        self._jobs = OrderedDict()
+        for job in jobs:
+            self.append(job)
+
+    def append(self, job):
+        self._jobs[job.file] = job
+
+    def extend(self, jobs):
+        for job in jobs:
+            self.append(job)
+
+    def get(self, file, default=None):
+        return self._jobs.get(file, default)
+
+    def discard(self, job):
+        """
+        Removes a job if it is contained
+        :param job: Job or path to the job file
+        :return: True if the job was removed
+        """
+        return self._jobs.pop(getattr(job, 'file', job), None) is not None
+
+    def remove(self, job):
+        if not self.discard(job):
+            raise ValueError('%s is not in the collection' % getattr(job, 'file', job))
+
+    def difference_update(self, jobs):
+        """
+        Removes all given jobs that are contained
+        :param jobs: Iterable of jobs or paths to job files
+        :return: Number of removed jobs
+        """
+        removed = 0
+        for job in jobs:
+            if self.discard(job):
+                removed += 1
+        return removed
+
+    def first(self):
+        return next(iter(self._jobs.values()))
+
+    def __contains__(self, job):
+        return getattr(job, 'file', job) in self._jobs
+
+    def __iter__(self):
+        return iter(self._jobs.values())
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def __eq__(self, other):
+        return isinstance(other, JobCollection) and list(self._jobs.items()) == list(other._jobs.items())
+
+    def __ne__(self, other):
+        return not (self == other)
+
+    def __repr__(self):
+        return 'JobCollection(%r)' % list(self._jobs.values())
@@ -0,0 +1,172 @@
+"""Submission of combined job files to the workload manager"""
+import re
+import shlex
+import subprocess
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+from os import path
+
+from job_combine.cluster import job as cjob
+from job_combine.utils import metrics
+
+
+def supports_array(manager):
+    return manager.array_args is not None and manager.array_index_var is not None
+
+
+def array_job(jobs, file, directory):
+    """
+    Creates an array job running each of the given job files as one of its tasks
+    :param jobs: Combined jobs with the same parameters; task i runs the i-th job file in its directory
+    :param file: Path the array job file is written to
+    :param directory: Working directory of the array job
+    :return: (array job, script)
+    """
+    assert len(jobs) > 0
+    first = jobs[0]
+    m = first.manager()
+    if not supports_array(m):
+        raise ValueError('Workload manager does not support array jobs: %s' % m.name)
+
+    # every task gets the time limit of the longest combined job
+    time = max(job.time for job in jobs)
+    a_job = cjob.Job(file, first.name, directory, time, None, None, first.params, first.manager_name)
+
+    for ai, arg in enumerate(m.array_args):
+        if arg is not None:
+            array_directive = m.directive + ' ' + (m.arg_format[ai] % (arg, '0-%i' % (len(jobs) - 1))) + '\n'
+            break
+
+    script = 'case "$%s" in\n' % m.array_index_var
+    for i, job in enumerate(jobs):
+        script += '%i) cd "%s" && exec bash "%s" >%s 2>%s ;;\n' % (i, job.directory, job.file, job.stdout, job.stderr)
+    script += '*) echo "No job file for task $%s" >&2; exit 1 ;;\n' % m.array_index_var
+    script += 'esac\n'
+
+    return a_job, a_job.to_string() + array_directive + '\n' + script
+
+
+class Dispatcher(object):
+    """Submits job files concurrently with the dispatch command of their workload manager"""
+
+    def __init__(self, workers=4, rate=None, retries=5, backoff=1.0, command=None, verbose=0):
+        """
+        :param workers: Number of submissions running at the same time
+        :param rate: Maximum number of submissions started per second; None for no limit
+        :param retries: Number of times a submission rejected by a busy workload manager is repeated
+        :param backoff: Seconds to wait before the first retry; doubled for every further retry
+        :param command: Command used instead of the dispatch command of the workload manager, e.g. to run the job files
+        locally
+        :param verbose: Verbosity level
+        """
+        self.workers = max(1, workers)
+        self.interval = 1.0 / rate if rate else 0
+        self.retries = retries
+        self.backoff = backoff
+        self.command = command
+        self.verbose = verbose
+        self._lock = threading.Lock()
+        self._next_start = 0
+
+    def _wait_turn(self):
+        # reserve the next start time so submissions are spaced by at least the interval
+        with self._lock:
+            now = time.time()
+            start = max(now, self._next_start)
+            self._next_start = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+    def submit(self, job):
+        """
+        Submits a job file and records the job id returned by the workload manager in an `.id` file next to it
+        :param job: Job to submit
+        :return: (job, job id or None, error message or None)
+        """
+        m = job.manager()
+        command = shlex.split(self.command or m.dispatch_command) + [job.file]
+        for attempt in range(self.retries + 1):
+            self._wait_turn()
+            start = time.time()
+            try:
+                proc = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                        universal_newlines=True)
+            except OSError as e:
+                return job, None, str(e)
+            output = proc.communicate()[0]
+            metrics.observe('dispatch_latency', time.time() - start)
+            metrics.count('dispatch_attempts')
+
+            if proc.returncode == 0:
+                match = re.search(m.job_id_regex, output) if m.job_id_regex else None
+                job_id = match.group('id') if match else None
+                if job_id is not None:
+                    with open(path.splitext(job.file)[0] + '.id', 'w') as f:
+                        f.write(job_id + '\n')
+                return job, job_id, None
+
+            busy = m.busy_regex is not None and re.search(m.busy_regex, output)
+            if not busy or attempt == self.retries:
+                break
+            delay = self.backoff * 2 ** attempt
+            if self.verbose >= 1:
+                print('Workload manager busy; retrying %s in %.1f s' % (job.file, delay))
+            time.sleep(delay)
+
+        return job, None, output.strip() or 'exit status %i' % proc.returncode
+
+    def submit_all(self, jobs):
+        """
+        Submits job files concurrently
+        :param jobs: Jobs to submit
+        :return: List of (job, job id or None, error message or None) in the order of the jobs
+        """
+        if len(jobs) == 0:
+            return []
+        pool = ThreadPool(min(self.workers, len(jobs)))
+        try:
+            results = pool.map(self.submit, jobs)
+        finally:
+            pool.close()
+            pool.join()
+
+        for job, job_id, error in results:
+            if error is not None:
+                print('ERROR: Dispatching failed for %s: %s' % (job.file, error))
+            elif self.verbose >= 1:
+                print('Dispatching successful for: %s%s' % (job.file, '' if job_id is None else ' (%s)' % job_id))
+        return results
+
+
+def prepare(jobs, mode='each', directory='.', index=0, verbose=0):
+    """
+    Selects the job files to submit for combined job files of the same group; in array mode, an array job running them
+    as its tasks is written
+    :param jobs: Written combined jobs with the same parameters
+    :param mode: 'each' to submit every job file, 'array' to submit one array job
+    :param directory: Directory the array job file is written to
+    :param index: Index of the group, used to name the array job file
+    :param verbose: Verbosity level
+    :return: Jobs to submit
+    """
+    if mode not in available_modes():
+        raise ValueError('Dispatch mode not supported: %s' % mode)
+
+    if mode == 'array' and len(jobs) > 1:
+        if supports_array(jobs[0].manager()):
+            a_file = path.join(directory, 'array-%02i.job' % index)
+            a_job, script = array_job(jobs, a_file, directory)
+            with open(a_file, 'w+') as f:
+                f.write(script)
+            if verbose >= 1:
+                print('Written array job with %i tasks to %s' % (len(jobs), a_file))
+            return [a_job]
+        print('WARNING: %s does not support array jobs; submitting the %i job files one by one.'
+              % (jobs[0].manager_name, len(jobs)))
+
+    return list(jobs)
+
+
+def available_modes():
+    return ['each', 'array']
@@ -0,0 +1,113 @@
+"""
+Equivalence of job parameters
+
+Jobs are combinable if their keys are equal. By default the key contains every parameter, so jobs that only differ in
+e.g. their mail address or the order of a list end up in different groups. Rules read from a JSON config file make
+such parameters equivalent, separately for every workload manager:
+
+    {
+        "Slurm": {
+            "ignore": ["mail-user", "comment"],
+            "sort": ["export"],
+            "alias": {"A": "account", "mail": "mail-user"},
+            "rename": {"account": {"proj-old": "proj"}}
+        }
+    }
+
+`ignore` drops parameters from the key, `sort` sorts the comma separated values of a parameter, `alias` treats
+parameters as the same parameter, e.g. a short and a long option, and `rename` treats values as the same value. The
+combined job uses the parameters of its first job.
+"""
+import json
+
+from job_combine.cluster.managers import managers
+
+RULES = ('ignore', 'sort', 'alias', 'rename')
+
+
+class Rules(object):
+
+    def __init__(self, ignore=(), sort=(), alias=None, rename=None):
+        """
+        Rules of the equivalent parameters of a workload manager
+        :param ignore: Parameters that do not affect the key
+        :param sort: Parameters with comma separated values whose order does not matter
+        :param alias: Dictionary of the parameter standing for another parameter
+        :param rename: Dictionary of the value standing for another value by parameter
+        """
+        self.ignore = set(ignore)
+        self.sort = set(sort)
+        self.alias = dict(alias or {})
+        self.rename = dict((key, dict(values)) for key, values in (rename or {}).items())
+        self._normalized = {}  # params are shared by the jobs of a group, so there are only few distinct ones
+
+    def normalize(self, params):
+        """
+        Normalizes parameters; parameters given as short or long option are only equal if aliased
+        :param params: Tuple of (key, arg index, value) sorted by key
+        :return: Tuple of (key, value) sorted by key and value
+        """
+        normalized = self._normalized.get(params)
+        if normalized is None:
+            result = []
+            for key, _, value in params:
+                key = self.alias.get(key, key)
+                if key in self.ignore:
+                    continue
+                if value is not None:
+                    if key in self.sort:
+                        value = ','.join(sorted(value.split(',')))
+                    value = self.rename.get(key, {}).get(value, value)
+                result.append((key, value))
+            normalized = self._normalized[params] = tuple(sorted(result, key=lambda p: (p[0], p[1] or '')))
+        return normalized
+
+
+rules = {}  # rules by workload manager name; jobs of managers without rules keep all their parameters
+
+
+def key(manager_name, params):
+    """
+    Key of the jobs that can be combined
+    :param manager_name: Name of the workload manager
+    :param params: Parameters of the job
+    :return: Tuple of manager name and the normalized params
+    """
+    manager_rules = rules.get(manager_name)
+    if manager_rules is None:
+        return manager_name, params
+    return manager_name, manager_rules.normalize(params)
+
+
+def parse(config):
+    """
+    Creates the rules of a config
+    :param config: Dictionary of the rules by workload manager name
+    :return: Dictionary of Rules by workload manager name
+    """
+    result = {}
+    for manager_name, values in config.items():
+        if manager_name not in managers:
+            raise ValueError('Workload manager not supported: %s' % manager_name)
+        unknown = sorted(set(values) - set(RULES))
+        if len(unknown) > 0:
+            raise ValueError('Unknown equivalence rules for %s: %s' % (manager_name, ', '.join(unknown)))
+        result[manager_name] = Rules(**values)
+    return result
+
+
+def load(file):
+    """
+    Reads the rules from a JSON config file and uses them for all job keys
+    :param file: Path to the config file
+    :return: Dictionary of Rules by workload manager name
+    """
+    global rules
+    with open(file) as f:
+        rules = parse(json.load(f))
+    return rules
+
+
+def reset():
+    global rules
+    rules = {}
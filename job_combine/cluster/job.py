@@ -1,14 +1,35 @@
 """Job that can be dispatched on a cluster"""
-from collections import namedtuple
-import re
+import heapq
+import multiprocessing
 from datetime import timedelta
 from os import path
 
+from job_combine.cluster import equivalence, parser
 from job_combine.cluster.managers import managers
 from job_combine.utils import paths, time_parser
 
 
-class Job:
+try:
+    from sys import intern
+except ImportError:  # builtin in python 2
+    pass
+
+# Output files of a combined job; the jobs requesting output files of their own write to files of these names in their
+# working directory
+STDOUT = 'job.out'
+STDERR = 'job.err'
+
+# Canonical instance of every params tuple; the jobs of a group share one tuple
+_params = {}
+
+
+def intern_params(params):
+    return _params.setdefault(params, params)
+
+
+class Job(object):
+    # no per instance dictionary; a million jobs would otherwise need gigabytes
+    __slots__ = ('file', 'name', 'directory', 'seconds', 'stdout', 'stderr', 'params', 'manager_name')
 
     def __init__(self, file, name, directory, time, stdout, stderr, params, manager_name):
         """
@@ -16,7 +37,7 @@ class Job:
         :param file: Path to the job file
         :param name: Name of the job
         :param directory: Path to the job file directory
-        :param time: Reserved time for this job as timedelta
+        :param time: Reserved time for this job as timedelta or in seconds
         :param stdout: File to pipe the standard out stream into
         :param stderr: File to pipe the standard error stream into
         :param params: list of (key, value) tuples for every other job parameter
@@ -24,15 +45,36 @@ class Job:
         """
         self.file = file
         self.name = name
-        self.directory = directory
+        self.directory = intern(directory) if directory is not None else None
         self.time = time
         self.stdout = stdout
         self.stderr = stderr
-        self.params = tuple(sorted(params, key=lambda x: x[0]))
-        self.manager_name = manager_name
+        self.params = intern_params(tuple(sorted(params, key=lambda x: x[0])))
+        self.manager_name = intern(manager_name) if manager_name is not None else None
+
+    @property
+    def time(self):
+        """Reserved time for this job as timedelta; kept in whole seconds"""
+        return timedelta(seconds=self.seconds) if self.seconds is not None else None
+
+    @time.setter
+    def time(self, time):
+        if isinstance(time, timedelta):
+            time = time.total_seconds()
+        self.seconds = int(round(time)) if time is not None else None
+
+    def __getstate__(self):
+        return (self.file, self.name, self.directory, self.seconds, self.stdout, self.stderr, self.params,
+                self.manager_name)
+
+    def __setstate__(self, state):
+        if isinstance(state, dict):  # pickled before jobs had slots
+            state = (state['file'], state['name'], state['directory'], state['time'], state['stdout'],
+                     state['stderr'], state['params'], state['manager_name'])
+        self.__init__(*state)
 
     def key(self):
-        return self.manager_name, self.params
+        return equivalence.key(self.manager_name, self.params)
 
     def __hash__(self):
         return hash(self.file)
@@ -77,17 +119,19 @@ class Job:
         return ret
 
     @classmethod
-    def from_file(cls, job_file, workload_manager=None):
+    def from_file(cls, job_file, workload_manager=None, verbose=True):
         """
         Parses a job file to a Job object
         :param job_file: Path to the job file
         :param workload_manager: Name of the workload manager this script is for
+        :param verbose: Print the used workload manager
         :return: Job object
         """
         if workload_manager is not None:
             try:
                 manager = managers[workload_manager]
-                print('Using workload manager: %s' % manager.name)
+                if verbose:
+                    print('Using workload manager: %s' % manager.name)
             except KeyError:
                 raise ValueError('Workload manager not supported: %s' % workload_manager)
         else:
@@ -101,69 +145,48 @@ class Job:
         params = []
 
         with open(job_file, 'r') as f:
-            for line in f:
+            for line in parser.header(f):  # stop reading at the first script line
                 if line.startswith('#!'):  # shebang
-                    pass
+                    continue
                 elif line.startswith('# '):  # comment, can not be a job directive
-                    pass
-                elif line.startswith('#'):  # directive
-
-                    # infer workload manager via directive
-                    if manager is None:
-                        for wm in managers.values():
-                            if line.startswith(wm.directive):
-                                manager = wm
+                    continue
+
+                # infer workload manager via directive
+                if manager is None:
+                    for wm in managers.values():
+                        if line.startswith(wm.directive):
+                            manager = wm
+                            if verbose:
                                 print('Inferred workload manager: %s' % manager.name)
-                                break
-
-                    if not line.startswith(manager.directive):
-                        # assume line is a comment as it is no shebang and is not matching the current directive
-                        continue
-
-                    # apply all arg and flag regex' to the line
-                    matches = [re.search(regex, line) for regex in manager.arg_regex + manager.flag_regex]
-
-                    match = None
-                    arg_index = None
-                    # get the first successful match
-                    for i, m in enumerate(matches):
-                        if m is not None:
-                            match = m
-                            arg_index = i % len(manager.arg_regex)
                             break
-
-                    # no valid match -> can not continue
-                    if match is None:
-                        raise RuntimeError('Can not process directive `%s`' % line)
-
-                    # get matching results from capture groups; val is None for flags
-                    arg = match.group('arg')
-                    try:
-                        val = match.group('val')
-                    except IndexError:
-                        val = None
-
-                    if arg == manager.time_args[arg_index]:
-                        time = time_parser.str_to_timedelta(val, *manager.time_formats)
-                    elif arg == manager.stdout_args[arg_index]:
-                        stdout = val
-                    elif arg == manager.stderr_args[arg_index]:
-                        stderr = val
-                    elif arg == manager.directory_args[arg_index]:
-                        # working dir could be given relative to job file
-                        d = path.expandvars(path.expanduser(arg))  # expand ~/ or env. variables
-                        if path.isabs(d):  # TODO Replace path with utils.paths functions
-                            directory = d
-                        else:
-                            directory = path.join(directory, d)
-                    elif arg in manager.name_args:
-                        name = val
                     else:
-                        # Store argument, value pair to be able to decide which scripts can be combined
-                        params.append((arg, arg_index, val))
+                        continue
 
-                else:  # script lines
-                    pass
+                if not line.startswith(manager.directive):
+                    # assume line is a comment as it is no shebang and is not matching the current directive
+                    continue
+
+                # get matching results from capture groups; val is None for flags
+                arg, arg_index, val, role = parser.parser(manager).parse(line)
+
+                if role == parser.TIME:
+                    time = time_parser.str_to_timedelta(val, *manager.time_formats)
+                elif role == parser.STDOUT:
+                    stdout = val
+                elif role == parser.STDERR:
+                    stderr = val
+                elif role == parser.DIRECTORY:
+                    # working dir could be given relative to job file
+                    d = path.expandvars(path.expanduser(val))  # expand ~/ or env. variables
+                    if path.isabs(d):  # TODO Replace path with utils.paths functions
+                        directory = d
+                    else:
+                        directory = path.join(directory, d)
+                elif role == parser.NAME:
+                    name = val
+                else:
+                    # Store argument, value pair to be able to decide which scripts can be combined
+                    params.append((arg, arg_index, val))
 
         if manager is None:
             raise ValueError('`%s` is not a supported job file' % job_file)
@@ -171,11 +194,63 @@ class Job:
         return cls(paths.abs_path(job_file), name, directory, time, stdout, stderr, params, manager.name)
 
 
+def _parse(item):
+    job_file, workload_manager = item
+    try:
+        return job_file, Job.from_file(job_file, workload_manager, verbose=False), None
+    except (IOError, OSError, ValueError, RuntimeError) as e:
+        return job_file, None, str(e)
+
+
+def parse_files(job_files, workload_manager=None, processes=None):
+    """
+    Parses many job files, using a pool of processes for larger numbers of files
+    :param job_files: Paths to the job files
+    :param workload_manager: Name of the workload manager the scripts are for
+    :param processes: Number of processes to use; defaults to the number of CPUs
+    :return: List of (path, job, error) tuples in the order of the paths; either job or error is None
+    """
+    items = [(f, workload_manager) for f in job_files]
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    if processes <= 1 or len(items) < 64:  # starting the pool costs more than parsing a few files
+        return [_parse(item) for item in items]
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        return pool.map(_parse, items, chunksize=max(1, min(256, len(items) // (4 * processes))))
+    finally:
+        pool.close()
+        pool.join()
+
+
+def redirects(job):
+    """
+    Files the output of a job is redirected to in a combined script
+    :param job: Job
+    :return: Tuple of the stdout and stderr file; None if the job does not request the stream to be redirected
+    """
+    return STDOUT if job.stdout is not None else None, STDERR if job.stderr is not None else None
+
+
 def sum_times(job_list):
-    time = timedelta()
+    return timedelta(seconds=sum(job.seconds for job in job_list))
+
+
+def slot_time(job_list, slots=1):
+    """
+    Time needed to run the jobs in the given order with up to `slots` jobs at the same time, starting every job as soon
+    as a slot is free
+    :param job_list: Jobs
+    :param slots: Number of jobs running at the same time
+    :return: Time as timedelta
+    """
+    if slots <= 1:
+        return sum_times(job_list)
+    finish = [timedelta()] * slots
     for job in job_list:
-        time += job.time
-    return time
+        heapq.heapreplace(finish, finish[0] + job.time)
+    return max(finish)
 
 
 def available_managers():
@@ -0,0 +1,99 @@
+"""Ledger of the jobs a combined script has run"""
+import os
+from collections import namedtuple
+from os import path
+
+# File next to the combined script with one tab-separated record per finished job:
+# <job file> <exit status or TIMEOUT> <elapsed seconds> <end timestamp>
+DONE = 'done'
+# Ledgers of the previous combined scripts written to the same directory, oldest first; not read by `records`
+PREVIOUS = DONE + '.previous'
+# Status of a job that was terminated, e.g. because the combined job reached its time limit
+TIMEOUT = 'TIMEOUT'
+
+Record = namedtuple('Record', 'file status elapsed timestamp')
+
+
+def parse(line):
+    """
+    Parses a line of the ledger; lines written by older versions only contain the job file and count as success
+    :param line: Line of the ledger
+    :return: Record or None for empty or incomplete lines
+    """
+    fields = line.rstrip('\n').split('\t')
+    if fields[0].strip() == '':
+        return None
+    if len(fields) == 1:
+        return Record(fields[0].strip(), 0, None, None)
+    if len(fields) != 4:
+        return None
+    try:
+        status = fields[1] if fields[1] == TIMEOUT else int(fields[1])
+        return Record(fields[0], status, int(fields[2]), int(fields[3]))
+    except ValueError:
+        return None
+
+
+def read(file):
+    """
+    Reads the records of a ledger
+    :param file: Path to the ledger
+    :return: List of records in the order the jobs finished
+    """
+    with open(file) as f:
+        return [record for record in map(parse, f) if record is not None]
+
+
+def records(directory, previous=False):
+    """
+    Reads the records of all ledgers below a directory
+    :param directory: Directory of the combined scripts
+    :param previous: Also read the ledgers of the previous scripts, e.g. for the run times of the jobs
+    :return: List of records
+    """
+    names = (PREVIOUS, DONE) if previous else (DONE,)
+    result = []
+    for root, dirs, files in os.walk(directory):
+        for name in names:
+            if name in files:
+                result += read(path.join(root, name))
+    return result
+
+
+def rotate(directory):
+    """
+    Moves the ledger of a directory aside before a new combined script is written there, so the new script does not
+    skip its jobs because of an earlier run of another script; the records are appended to the previous ledgers, so
+    the run times of all earlier scripts are kept until they are imported into the history
+    :param directory: Directory of the combined script
+    :return: True if a ledger was moved
+    """
+    file = path.join(directory, DONE)
+    if not path.exists(file):
+        return False
+    with open(file, 'rb') as f:
+        content = f.read()
+    content = content[:content.rfind(b'\n') + 1]  # without a partially written record
+    if len(content) > 0:
+        with open(path.join(directory, PREVIOUS), 'ab') as f:
+            f.write(content)
+    os.remove(file)
+    return True
+
+
+def latest(records_list):
+    """
+    Selects the latest record of every job; records without timestamp count as oldest
+    :param records_list: Records
+    :return: Dictionary of records by job file
+    """
+    result = {}
+    for record in records_list:
+        current = result.get(record.file)
+        if current is None or (record.timestamp or 0) >= (current.timestamp or 0):
+            result[record.file] = record
+    return result
+
+
+def succeeded(record):
+    return record.status == 0
@@ -2,13 +2,27 @@
 from collections import namedtuple
 
 WorkloadManager = namedtuple('WorkloadManager',
-                             'name dispatch_command directive name_args time_args time_formats stdout_args'
-                             ' stderr_args directory_args arg_regex flag_regex arg_format flag_format')
+                             'name dispatch_command job_id_regex busy_regex requeue_command requeue_flag step_command'
+                             ' array_args array_index_var resource_args resource_step step_rank_var directive name_args'
+                             ' time_args time_formats stdout_args stderr_args directory_args arg_regex flag_regex'
+                             ' arg_format flag_format')
 
 managers = {
     'Slurm': WorkloadManager(
         name='Slurm',
         dispatch_command='sbatch',
+        job_id_regex='Submitted batch job (?P<id>\\d+)',
+        busy_regex='(?i)(temporarily unavailable|timed out|try again|too many)',
+        requeue_command='scontrol requeue $SLURM_JOB_ID',
+        requeue_flag='requeue',
+        step_command='srun --exclusive --nodes=1 --ntasks=1',
+        array_args=['array', 'a'],
+        array_index_var='SLURM_ARRAY_TASK_ID',
+        resource_args={'nodes': ['nodes', 'N'], 'tasks': ['ntasks', 'n'], 'cpus': ['cpus-per-task', 'c'],
+                       'tasks_per_node': ['ntasks-per-node', None]},
+        resource_step='srun --exclusive --nodes=%(nodes)i --ntasks=%(nodes)i --ntasks-per-node=1'
+                      ' --cpus-per-task=%(cores)i',
+        step_rank_var='SLURM_PROCID',
         directive='#SBATCH',
         name_args=['job-name', 'J'],
         time_args=['time', 't'],
@@ -24,6 +38,16 @@ managers = {
     'LoadLeveler': WorkloadManager(
         name='LoadLeveler',
         dispatch_command='llsubmit',
+        job_id_regex='The job "(?P<id>[^"]+)" has been submitted',
+        busy_regex='(?i)(not available|timed out|try again|too many)',
+        requeue_command=None,
+        requeue_flag=None,
+        step_command=None,
+        array_args=None,
+        array_index_var=None,
+        resource_args=None,
+        resource_step=None,
+        step_rank_var=None,
         directive='#@',
         name_args=['job_name'],
         time_args=['wall_clock_limit'],
@@ -41,5 +65,15 @@ managers = {
     # Regex expressions are applied to the complete line including the directive
     # Capture groups must be named 'arg' and 'val' for the arg_regex and 'arg' for the flag_regex
     # Time formats can contain %D, %H, %M, %S for days, hours, minutes and seconds.
+    # The job id regex captures the id of a submitted job as 'id' from the output of the dispatch command and the busy
+    # regex matches its output if a submission was rejected temporarily and should be retried
+    # The requeue command is run by a combined job to be queued again and the requeue flag is the directive flag that
+    # allows a job to be requeued; use None for both if not supported
+    # The step command launches a single job as a separate step inside an allocation; use None if not supported
+    # Array args select the index range of an array job and the array index variable holds the index of a task; use None
+    # for both if array jobs are not supported
+    # Resource args are the args of the number of nodes, tasks, cpus per task and tasks per node in the order of the arg
+    # formats. The resource step reserves the nodes and the cores per node of a job inside a larger allocation with one
+    # task per node, only the task whose step rank variable is 0 runs the job; use None for all three if not supported
     # The first time format must contain s, m + s, h + m + s or d + h + m + s
 }
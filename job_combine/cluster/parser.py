@@ -0,0 +1,83 @@
+"""Compiled parsers for the directives of job files"""
+import re
+
+# roles of the arguments with a special meaning for combining jobs
+NAME = 'name'
+TIME = 'time'
+STDOUT = 'stdout'
+STDERR = 'stderr'
+DIRECTORY = 'directory'
+
+_group_regex = re.compile(r'\(\?P<(arg|val)>')
+
+
+class DirectiveParser(object):
+    """
+    Parses directive lines of a single workload manager. All arg and flag regex' are compiled once into a single
+    alternation; the first regex matching anywhere in the line takes precedence, as if they were applied in order.
+    """
+
+    def __init__(self, manager):
+        self.manager = manager
+        alternatives = []
+        for i, regex in enumerate(manager.arg_regex + manager.flag_regex):
+            regex = _group_regex.sub(lambda m: '(?P<%s%i>' % (m.group(1), i), regex)
+            alternatives.append('.*?(?P<r%i>%s)' % (i, regex))
+        self.regex = re.compile('|'.join(alternatives))
+        self.has_val = [i < len(manager.arg_regex) for i in range(len(alternatives))]
+
+        # role of every argument by arg index; earlier roles take precedence
+        self.roles = []
+        for arg_index in range(len(manager.arg_regex)):
+            roles = dict((arg, NAME) for arg in manager.name_args if arg is not None)
+            for role, args in ((DIRECTORY, manager.directory_args), (STDERR, manager.stderr_args),
+                               (STDOUT, manager.stdout_args), (TIME, manager.time_args)):
+                if args[arg_index] is not None:
+                    roles[args[arg_index]] = role
+            self.roles.append(roles)
+
+    def parse(self, line):
+        """
+        Parses a directive line
+        :param line: Line starting with the directive of the workload manager
+        :return: Tuple of the argument, the arg index, its value (None for flags) and its role (None for other args)
+        """
+        match = self.regex.match(line)
+        if match is None:
+            raise RuntimeError('Can not process directive `%s`' % line)
+
+        i = int(match.lastgroup[1:])
+        arg = match.group('arg%i' % i)
+        val = match.group('val%i' % i) if self.has_val[i] else None
+        arg_index = i % len(self.manager.arg_regex)
+        return arg, arg_index, val, self.roles[arg_index].get(arg)
+
+
+_parsers = {}
+
+
+def parser(manager):
+    """
+    Returns the compiled parser of a workload manager
+    :param manager: Workload manager
+    :return: DirectiveParser
+    """
+    try:
+        return _parsers[manager.name]
+    except KeyError:
+        _parsers[manager.name] = DirectiveParser(manager)
+        return _parsers[manager.name]
+
+
+def header(lines):
+    """
+    Yields the lines of the header of a job script; the header ends with the first line that is neither empty nor starts
+    with `#`, as directives after the first command are ignored by the workload managers
+    :param lines: Iterable of lines
+    :return: Generator of header lines
+    """
+    for line in lines:
+        if line.startswith('#'):
+            yield line
+        elif line.strip() != '':
+            return
@@ -0,0 +1,242 @@
+"""Bash code of the combined job scripts"""
+from job_combine.cluster import job as cjob, ledger, taskqueue
+
+# Exit status of a combined script that stopped because its next job would not fit into the remaining time
+REQUEUE_EXIT = 99
+
+# Prelude of all combined scripts. A job terminated by a TERM signal, e.g. because the combined job reached its time
+# limit, is recorded as timed out and no further jobs are started. Jobs that already succeeded in an earlier run of the
+# script are skipped; the ledger is read once when the script starts.
+PRELUDE = '''cwd=$(pwd)
+jc_begin=$(date +%%s)
+trap 'jc_status=%(timeout)s' TERM
+
+# jc_record <job file> <exit status> <start>
+jc_record() {
+    jc_end=$(date +%%s)
+    printf '%%s\\t%%s\\t%%s\\t%%s\\n' "$1" "${jc_status:-$2}" $((jc_end - $3)) "$jc_end" >> "$cwd/%(done)s"
+}
+
+# jobs that succeeded in an earlier run of the script; lines of older versions only contain the job file
+declare -A jc_done
+if [ -f "$cwd/%(done)s" ]; then
+    while IFS=$'\\t' read -r jc_done_file jc_done_status jc_rest; do
+        if [ -n "$jc_done_file" ] && [ "${jc_done_status:-0}" = 0 ]; then jc_done["$jc_done_file"]=1; fi
+    done < "$cwd/%(done)s"
+fi
+
+# jc_succeeded <job file>: whether an earlier run of the job succeeded
+jc_succeeded() {
+    [ -n "${jc_done["$1"]}" ]
+}
+
+'''
+
+# Functions of scripts that stop before a job that would not fit into the remaining time of the allocation and have
+# themselves queued again
+REQUEUE_PRELUDE = '''jc_walltime=%(walltime)i
+
+# jc_fits <seconds>: whether a job of the given time fits into the remaining time
+jc_fits() {
+    [ $((jc_walltime - $(date +%%s) + jc_begin)) -ge "$1" ]
+}
+
+# jc_requeue: waits for the running jobs and stops the script so it is run again
+jc_requeue() {
+    while [ -n "$(jobs -pr)" ]; do wait; done
+    echo "Not enough time left for the next job; requeueing" >&2
+    cd "$cwd"
+    %(requeue)s
+    exit %(requeue_exit)i
+}
+
+'''
+
+# Prelude of scripts running up to `slots` jobs concurrently. Every job runs in a background subshell; output the job
+# does not redirect itself is buffered and printed in one piece under a lock, so the output of jobs does not interleave.
+SLOTS_PRELUDE = '''jc_slots=%(slots)i
+jc_launch="%(launcher)s"
+
+# jc_run <index> <directory> <job file>; the output is buffered and printed in one piece, so concurrent jobs neither
+# interleave nor truncate the output files of each other
+jc_run() {
+    trap 'jc_status=%(timeout)s' TERM  # subshells do not inherit the trap
+    jc_out="$cwd/.job-$1.out"
+    jc_err="$cwd/.job-$1.err"
+    cd "$2" || return
+    jc_start=$(date +%%s)
+    jc_exec "$3" >"$jc_out" 2>"$jc_err"
+    jc_exit=$?
+    (
+        if command -v flock >/dev/null; then flock 9; fi
+        if [ -f "$jc_out" ]; then cat "$jc_out"; fi
+        if [ -f "$jc_err" ]; then cat "$jc_err" >&2; fi
+        rm -f "$jc_out" "$jc_err"
+        jc_record "$3" "$jc_exit" "$jc_start"
+    ) 9>>"$cwd/.lock"
+}
+
+jc_exec() {
+    $jc_launch "$1"
+}
+
+# waits until all running jobs finished; exits if the script was terminated
+jc_finish() {
+    while [ -n "$(jobs -pr)" ]; do wait; done
+    if [ -n "$jc_status" ]; then exit 143; fi
+}
+
+# waits until a slot is free; polls if `wait -n` is not supported by this bash
+jc_wait() {
+    while [ "$(jobs -pr | wc -l)" -ge "$jc_slots" ]; do
+        wait -n 2>/dev/null
+        if [ $? -eq 2 ]; then sleep 1; fi
+    done
+    if [ -n "$jc_status" ]; then jc_finish; fi
+}
+
+'''
+
+# Packed jobs are launched as job steps with one task per node, only the first task runs the job
+PACKED_PRELUDE = '''jc_exec() {
+    $jc_launch bash -c '[ "${%(rank)s:-0}" != 0 ] || exec "$0"' "$1"
+}
+
+'''
+
+# Worker of the dynamic mode: claims the tasks of a shared task queue one after another until no pending task fits into
+# the remaining time of the allocation
+DYNAMIC = '''jc_queue="%(queue)s"
+jc_walltime=%(walltime)i
+
+# jc_claim: claims the next pending task that fits into the remaining time and reads it
+jc_claim() {
+    for jc_task in "$jc_queue/%(pending)s/"*; do
+        [ -e "$jc_task" ] || return 1
+        { read -r jc_seconds; read -r jc_dir; read -r jc_file; read -r jc_out; read -r jc_err; } < "$jc_task" \\
+            || continue
+        [ $((jc_walltime - $(date +%%s) + jc_begin)) -ge "$jc_seconds" ] || continue
+        jc_task="${jc_task##*/}"
+        if mv "$jc_queue/%(pending)s/$jc_task" "$jc_queue/%(running)s/$jc_task" 2>/dev/null; then
+            touch "$jc_queue/%(running)s/$jc_task"  # time of the claim
+            return 0
+        fi
+    done
+    return 1
+}
+
+while [ -z "$jc_status" ] && jc_claim; do
+    cd "$jc_dir"
+    jc_start=$(date +%%s)
+    (
+        if [ -n "$jc_out" ]; then exec >"$jc_out"; fi
+        if [ -n "$jc_err" ]; then exec 2>"$jc_err"; fi
+        exec "$jc_file"
+    )
+    jc_record "$jc_file" $? $jc_start
+    mv "$jc_queue/%(running)s/$jc_task" "$jc_queue/%(finished)s/$jc_task"
+done
+if [ -n "$jc_status" ]; then exit 143; fi
+'''
+
+
+def prelude(walltime=None, requeue=None, **values):
+    """
+    Creates the prelude of a combined script
+    :param walltime: Time of the combined job in seconds; None to start every job regardless of the remaining time
+    :param requeue: Command queueing the combined job again if the next job does not fit; None to only exit
+    :param values: Further values of the prelude templates
+    :return: Prelude
+    """
+    values.update(timeout=ledger.TIMEOUT, done=ledger.DONE, walltime=walltime or 0, requeue=requeue or ':',
+                  requeue_exit=REQUEUE_EXIT)
+    script = PRELUDE % values
+    if walltime is not None:
+        script += REQUEUE_PRELUDE % values
+    return script
+
+
+def fit_check(job, walltime):
+    if walltime is None:
+        return ''
+    return 'jc_fits %i || jc_requeue\n' % int(job.time.total_seconds())
+
+
+def sequential(jobs, walltime=None, requeue=None):
+    """
+    Generates a script running the jobs one after another, each in its working directory
+    :param jobs: Jobs to run
+    :param walltime: Time of the combined job in seconds; if given, the script stops before a job that would not fit
+    into the remaining time
+    :param requeue: Command queueing the combined job again
+    :return: Generator of the parts of the script; one part per job
+    """
+    yield prelude(walltime, requeue)
+    for job in jobs:
+        stdout, stderr = cjob.redirects(job)
+        yield ('if ! jc_succeeded "%s"; then\n'
+               '%s'
+               'cd "%s"\n'  # change to working directory
+               'jc_start=$(date +%%s)\n'
+               '"%s"%s%s\n'  # execute script (file path is absolute) and pipe stdout and stderr
+               'jc_record "%s" $? $jc_start\n'
+               'if [ -n "$jc_status" ]; then exit 143; fi\n'
+               'fi\n\n') % (job.file, fit_check(job, walltime), job.directory, job.file,
+                             ' >%s' % stdout if stdout is not None else '',
+                             ' 2>%s' % stderr if stderr is not None else '', job.file)
+
+
+def parallel(jobs, slots, launcher=None, walltime=None, requeue=None):
+    """
+    Generates a script running up to `slots` jobs concurrently, each in its working directory; the output of a job is
+    written to the output of the combined job when it finished, also for jobs redirecting their output
+    :param jobs: Jobs to run; they are started in this order
+    :param slots: Number of jobs running at the same time
+    :param launcher: Command prefix launching a job, e.g. as a separate job step; None to run jobs directly
+    :param walltime: Time of the combined job in seconds; if given, the script stops before a job that would not fit
+    into the remaining time
+    :param requeue: Command queueing the combined job again
+    :return: Generator of the parts of the script; one part per job
+    """
+    values = {'timeout': ledger.TIMEOUT, 'slots': slots, 'launcher': launcher or ''}
+    yield prelude(walltime, requeue, **values) + SLOTS_PRELUDE % values
+    for i, job in enumerate(jobs):
+        yield ('if ! jc_succeeded "%s"; then\n'
+               'jc_wait\n'
+               '%s'
+               'jc_run %i "%s" "%s" &\n'
+               'fi\n') % (job.file, fit_check(job, walltime), i, job.directory, job.file)
+    yield 'jc_finish\n'
+
+
+def packed(shelves, rank_var):
+    """
+    Generates a script running shelves of jobs one after another; the jobs of a shelf run at the same time, each as a
+    job step with its own resources
+    :param shelves: List of shelves, each a list of (job, command launching the job step)
+    :param rank_var: Variable holding the rank of a task of a job step; a single copy of a job runs in its step
+    :return: Generator of the parts of the script; one part per job
+    """
+    values = {'timeout': ledger.TIMEOUT, 'slots': max(len(shelf) for shelf in shelves), 'launcher': '',
+              'rank': rank_var}
+    yield prelude(**values) + SLOTS_PRELUDE % values + PACKED_PRELUDE % values
+    i = 0
+    for shelf in shelves:
+        for job, step in shelf:
+            yield ('if ! jc_succeeded "%s"; then\n'
+                   'jc_launch="%s" jc_run %i "%s" "%s" &\n'
+                   'fi\n') % (job.file, step, i, job.directory, job.file)
+            i += 1
+        yield 'jc_finish\n'
+
+
+def dynamic(queue, walltime):
+    """
+    Generates a script running the jobs of a task queue until no pending job fits into the remaining time
+    :param queue: Absolute path to the task queue
+    :param walltime: Time of the combined job in seconds
+    :return: Generator of the parts of the script
+    """
+    yield prelude()
+    yield DYNAMIC % {'queue': queue, 'walltime': walltime, 'pending': taskqueue.PENDING,
+                     'running': taskqueue.RUNNING, 'finished': taskqueue.FINISHED}
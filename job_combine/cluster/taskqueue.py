@@ -0,0 +1,83 @@
+"""Task queue on the file system shared by the combined jobs of a group in dynamic mode"""
+import os
+import shutil
+import time
+from os import path
+
+from job_combine.cluster import job as cjob
+
+PENDING = 'pending'
+RUNNING = 'running'
+FINISHED = 'finished'
+ABANDONED_MARGIN = 600  # seconds a running task may exceed its time before it counts as abandoned
+
+
+def task(job):
+    # read by the worker script line by line: time in seconds, directory, job file, stdout and stderr
+    stdout, stderr = cjob.redirects(job)
+    return '%i\n%s\n%s\n%s\n%s\n' % (int(job.time.total_seconds()), job.directory, job.file, stdout or '',
+                                     stderr or '')
+
+
+def create(jobs, directory, reset=False):
+    """
+    Creates a task queue with a task for every job; an existing queue in the directory is replaced if none of its tasks
+    is pending or running, after abandoned tasks are pending again. Workers claim a task by renaming it from `pending`
+    to `running`, which succeeds for only one of them, and move it to `finished` when the job ended.
+    :param jobs: Jobs to queue
+    :param directory: Directory of the queue
+    :param reset: Replace an existing queue even if tasks are pending or running
+    :return: Absolute path to the queue
+    """
+    if path.exists(directory):
+        recover(directory)
+        in_use = dict((d, n) for d, n in count(directory).items() if d != FINISHED and n > 0)
+        if len(in_use) > 0 and not reset:
+            raise ValueError('The task queue %s is still in use (%s); wait for its combined jobs or use --reset-queue'
+                             % (directory, ', '.join('%i %s' % (in_use[d], d) for d in sorted(in_use))))
+        shutil.rmtree(directory)
+    for d in (PENDING, RUNNING, FINISHED):
+        os.makedirs(path.join(directory, d))
+
+    # longest jobs first, so the short jobs fill the remaining time of the workers
+    ordered = sorted(jobs, key=lambda j: j.time, reverse=True)
+    width = len(str(len(ordered)))
+    for i, job in enumerate(ordered):
+        with open(path.join(directory, PENDING, '%0*i' % (width, i)), 'w') as f:
+            f.write(task(job))
+    return path.abspath(directory)
+
+
+def count(directory):
+    """
+    Counts the tasks of a queue by state
+    :param directory: Directory of the queue
+    :return: Dictionary of the number of tasks by state
+    """
+    return dict((d, len(os.listdir(path.join(directory, d)))) for d in (PENDING, RUNNING, FINISHED))
+
+
+def recover(directory, margin=ABANDONED_MARGIN, now=None):
+    """
+    Moves the abandoned tasks of a queue back to pending; a running task is abandoned if its worker was killed, which
+    is assumed once the time of the task and the margin passed since it was claimed. Workers touch a task when they
+    claim it, so its modification time is the time of the claim.
+    :param directory: Directory of the queue
+    :param margin: Seconds a task may run longer than its time
+    :param now: Current time in seconds since the epoch; None for the time of the call
+    :return: Names of the tasks moved back to pending
+    """
+    now = time.time() if now is None else now
+    recovered = []
+    for name in sorted(os.listdir(path.join(directory, RUNNING))):
+        running = path.join(directory, RUNNING, name)
+        try:
+            with open(running) as f:
+                seconds = int(f.readline())
+            if os.stat(running).st_mtime + seconds + margin >= now:
+                continue
+            os.rename(running, path.join(directory, PENDING, name))
+        except (OSError, IOError, ValueError):  # finished meanwhile or not written completely
+            continue
+        recovered.append(name)
+    return recovered
@@ -0,0 +1,366 @@
+"""
+Daemon combining and dispatching the job files dropped into a spool directory
+
+New job files are added to the store in batches. A group of combinable jobs is flushed, i.e. partitioned, combined,
+written and dispatched, once its jobs reach the minimum time or its oldest job waited for the maximum latency. Flushed
+jobs are removed from the store, so the store only holds the pending jobs.
+
+The state file records the versions of the spool files already seen, the arrival times of the pending jobs and the
+partitions of a flush before its scripts are written. A file written again under the same name is accepted again. A
+daemon restarted after a crash continues with the files it has not seen and completes interrupted flushes with the
+recorded partitions, skipping scripts that were already submitted.
+"""
+from __future__ import absolute_import, division, print_function
+
+import ctypes
+import ctypes.util
+import errno
+import fcntl
+import json
+import os
+import select
+import signal
+import time
+from datetime import timedelta
+from os import path
+
+from job_combine import job_combine as cli
+from job_combine.cluster import cache, dispatch
+from job_combine.storage import backends
+from job_combine.utils import metrics, names, paths, time_parser
+
+STATE_VERSION = 2
+
+
+def _drain(fd):
+    try:
+        while os.read(fd, 65536):
+            pass
+    except OSError as e:
+        if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+            raise
+
+
+def _select(fds, timeout):
+    """
+    Waits until one of the descriptors is readable and drains them
+    :param fds: File descriptors
+    :param timeout: Maximum seconds to wait
+    """
+    try:
+        readable = select.select(fds, [], [], max(0, timeout))[0]
+    except (select.error, OSError) as e:  # interrupted by a signal on python 2
+        if getattr(e, 'errno', e.args[0]) != errno.EINTR:
+            raise
+        return
+    for fd in readable:
+        _drain(fd)
+
+
+class Inotify(object):
+    """Wakes the daemon when a file is written to or moved into the spool directory; Linux only"""
+    IN_CLOSE_WRITE = 0x8
+    IN_MOVED_TO = 0x80
+
+    def __init__(self, directory, wake_fd):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError(errno.ENOSYS, 'inotify is not available')
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | getattr(os, 'O_CLOEXEC', 0))
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        if libc.inotify_add_watch(self.fd, directory.encode('utf-8'), self.IN_CLOSE_WRITE | self.IN_MOVED_TO) < 0:
+            os.close(self.fd)
+            raise OSError(ctypes.get_errno(), 'inotify_add_watch failed for %s' % directory)
+        self.wake_fd = wake_fd
+
+    def wait(self, timeout):
+        """
+        Waits for changes of the spool directory or a signal; the directory is scanned afterwards, so the events are
+        discarded
+        :param timeout: Maximum seconds to wait
+        """
+        _select([self.fd, self.wake_fd], timeout)
+
+    def close(self):
+        os.close(self.fd)
+
+
+class Polling(object):
+    """Wakes the daemon periodically or on a signal"""
+
+    def __init__(self, interval, wake_fd):
+        self.interval = interval
+        self.wake_fd = wake_fd
+
+    def wait(self, timeout):
+        _select([self.wake_fd], min(self.interval, timeout))
+
+    def close(self):
+        pass
+
+
+def watcher(directory, interval, wake_fd, use_inotify=True):
+    """
+    Creates the watcher of the spool directory
+    :param directory: Spool directory
+    :param interval: Seconds between two scans if inotify is not used
+    :param wake_fd: Descriptor that becomes readable when the daemon receives a signal
+    :param use_inotify: Use inotify if available
+    :return: Inotify or Polling
+    """
+    if use_inotify:
+        try:
+            return Inotify(directory, wake_fd)
+        except (OSError, AttributeError) as e:
+            print('WARNING: Could not watch the spool directory with inotify (%s); polling every %s s.' % (e, interval))
+    return Polling(interval, wake_fd)
+
+
+def scan(directory):
+    """
+    Lists the job files of the spool directory; hidden and `.tmp` files are still being written
+    :param directory: Spool directory
+    :return: Sorted list of absolute paths
+    """
+    files = []
+    for name in os.listdir(directory):
+        if name.startswith('.') or name.endswith('.tmp'):
+            continue
+        file = path.join(directory, name)
+        if path.isfile(file):
+            files.append(file)
+    return sorted(files)
+
+
+class State(object):
+
+    def __init__(self, file):
+        """
+        Reads the state of the daemon; a missing file is an empty state
+        :param file: Path to the state file
+        """
+        self.file = file
+        self.seen = {}  # spool file -> [mtime, size, inode] of the version seen; kept while the file is in the spool
+        self.pending = {}  # job file -> arrival time of the jobs in the store
+        self.flushes = {}  # flush id -> {'directory': script directory, 'partitions': [[job file]]}
+        self.next_flush = 0
+        if path.exists(file):
+            with open(file) as f:
+                data = json.load(f)
+            if data.get('version') != STATE_VERSION:
+                raise ValueError('State file %s was written by another version' % file)
+            self.seen = data['seen']
+            self.pending = data['pending']
+            self.flushes = data['flushes']
+            self.next_flush = data['next_flush']
+
+    def save(self):
+        data = {'version': STATE_VERSION, 'seen': self.seen, 'pending': self.pending, 'flushes': self.flushes,
+                'next_flush': self.next_flush}
+        paths.write_atomic(self.file, [json.dumps(data, indent=1, sort_keys=True)])
+
+
+class Daemon(object):
+
+    def __init__(self, args):
+        """
+        :param args: Parsed arguments of the `daemon` mode
+        """
+        self.args = args
+        self.spool = paths.abs_path(args.spool)
+        self.directory = paths.abs_path(args.directory)
+        self.state = State(args.state_file or args.storage_file + '.daemon')
+        self.max_time = timedelta.max if args.max_time is None else \
+            time_parser.str_to_timedelta(args.max_time, '%H:%M:%S')
+        self.min_time = timedelta() if args.min_time is None else \
+            time_parser.str_to_timedelta(args.min_time, '%H:%M:%S')
+        self.naming = names.Naming(args.naming, args.name_template)
+        self.dispatcher = None
+        if not args.no_dispatch:
+            self.dispatcher = dispatch.Dispatcher(args.dispatch_workers, args.dispatch_rate, args.dispatch_retries,
+                                                  args.dispatch_backoff, args.submit_command, int(args.verbose))
+        self.stopped = False
+
+    def stop(self, signum=None, frame=None):
+        self.stopped = True
+
+    def accept(self):
+        """
+        Adds the new job files of the spool directory to the store
+        :return: Number of added jobs
+        """
+        current = {}
+        for file in scan(self.spool):
+            try:
+                current[file] = list(cache.identity(os.stat(file)))
+            except OSError:  # removed since the scan
+                pass
+        # forget files removed from the spool so the state does not grow
+        for file in [f for f in self.state.seen if f not in current]:
+            del self.state.seen[file]
+        # a file written again under the same name is accepted again
+        new = sorted(f for f, identity in current.items() if self.state.seen.get(f) != identity)
+        if len(new) == 0:
+            return 0
+
+        with metrics.phase('parse'):
+            jobs = cli.parse_jobs(self.args, new, self.args.processes)
+        for job in jobs:
+            os.chmod(job.file, os.stat(job.file).st_mode | 0o111)
+        with metrics.phase('store'), cli.open_store(self.args) as storage:
+            storage.add(jobs)
+
+        now = time.time()
+        for file in new:
+            self.state.seen[file] = current[file]  # files that can not be parsed are not tried again until rewritten
+        for job in jobs:
+            self.state.pending.setdefault(job.file, now)
+        self.state.save()
+        metrics.count('jobs', len(jobs))
+        print('Accepted %i of %i new job files.' % (len(jobs), len(new)))
+        return len(jobs)
+
+    def deadline(self, jobs):
+        """Time the oldest pending job of a group waited for the maximum latency"""
+        now = time.time()
+        return min(self.state.pending.get(job.file, now) for job in jobs) + self.args.max_latency
+
+    def due(self, flush_all=False):
+        """
+        Selects the groups to flush
+        :param flush_all: Flush every group regardless of its time and latency
+        :return: (list of due groups as lists of jobs, seconds until the next group is due or None)
+        """
+        due = []
+        next_deadline = None
+        with cli.open_store(self.args) as storage:
+            groups = [list(v) for v in storage.groups().values() if len(v) > 0]
+        # forget jobs removed from the store by other invocations
+        stored = set(job.file for jobs in groups for job in jobs)
+        for file in [f for f in self.state.pending if f not in stored]:
+            del self.state.pending[file]
+        for jobs in groups:
+            deadline = self.deadline(jobs)
+            if flush_all or deadline <= time.time() or timedelta(seconds=sum(j.seconds for j in jobs)) >= self.min_time:
+                due.append(jobs)
+            elif next_deadline is None or deadline < next_deadline:
+                next_deadline = deadline
+        return due, None if next_deadline is None else max(0, next_deadline - time.time())
+
+    def flush(self, jobs):
+        """
+        Partitions a group and records the partitions before the scripts are written
+        :param jobs: Pending jobs of a group
+        """
+        with metrics.phase('partition'):
+            part = cli.partition(jobs, self.max_time, timedelta(), self.args.parallel, self.args.break_max,
+                                 self.args.strategy, self.args.strategy_budget)
+        flush_id = 'flush-%05i' % self.state.next_flush
+        self.state.next_flush += 1
+        self.state.flushes[flush_id] = {'directory': path.join(self.directory, flush_id),
+                                        'partitions': [[job.file for job in p] for p in part]}
+        self.state.save()
+        self.complete(flush_id, jobs)
+
+    def complete(self, flush_id, jobs, resume=False):
+        """
+        Writes and dispatches the scripts of a recorded flush and removes its jobs from the store
+        :param flush_id: Id of the flush
+        :param jobs: Jobs of the flush
+        :param resume: The flush was interrupted; its scripts may already have run and keep their ledgers
+        """
+        record = self.state.flushes[flush_id]
+        by_file = dict((job.file, job) for job in jobs)
+        part = [[by_file[f] for f in p if f in by_file] for p in record['partitions']]
+        part = [p for p in part if len(p) > 0]
+
+        with metrics.phase('combine'):
+            combined = [cli.combine(p, naming=self.naming, counter=i) for i, p in enumerate(part)]
+        with metrics.phase('write'):
+            written = cli.write_scripts(combined, record['directory'], 0, self.args.write_workers,
+                                        int(self.args.verbose), rotate=not resume)
+        metrics.count('partitions', len(written))
+
+        if self.dispatcher is not None:
+            # scripts submitted before an interruption have a job id file
+            to_submit = [job for job in written if not path.exists(path.splitext(job.file)[0] + '.id')]
+            with metrics.phase('dispatch'):
+                results = self.dispatcher.submit_all(to_submit)
+            failed = len([error for _, _, error in results if error is not None])
+            print('Dispatched %i of %i combined jobs of %s.' % (len(results) - failed, len(results), flush_id))
+
+        files = [job.file for p in part for job in p]
+        with metrics.phase('store'), cli.open_store(self.args) as storage:
+            storage.remove(files)
+        for file in (f for p in record['partitions'] for f in p):
+            self.state.pending.pop(file, None)
+        del self.state.flushes[flush_id]
+        self.state.save()
+        print('Flushed %i jobs into %i combined jobs in %s.' % (len(files), len(written), record['directory']))
+
+    def recover(self):
+        """Completes the flushes interrupted by a crash"""
+        if len(self.state.flushes) == 0:
+            return
+        with cli.open_store(self.args) as storage:
+            stored = dict((job.file, job) for v in storage.groups().values() for job in v)
+        for flush_id in sorted(self.state.flushes):
+            files = [f for p in self.state.flushes[flush_id]['partitions'] for f in p]
+            print('Completing interrupted %s.' % flush_id)
+            self.complete(flush_id, [stored[f] for f in files if f in stored], resume=True)
+
+    def run(self):
+        """Processes the spool directory until the daemon is stopped"""
+        if not path.isdir(self.spool):
+            os.makedirs(self.spool)
+        handlers = dict((signum, signal.signal(signum, self.stop)) for signum in (signal.SIGTERM, signal.SIGINT))
+        # signals interrupt waiting for the spool directory
+        wake_r, wake_w = os.pipe()
+        for fd in (wake_r, wake_w):
+            fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+        signal.set_wakeup_fd(wake_w)
+        watch = watcher(self.spool, self.args.poll_interval, wake_r, not self.args.no_inotify)
+        try:
+            self.recover()
+            print('Watching %s for job files.' % self.spool)
+            while not self.stopped:
+                self.accept()
+                due, wait = self.due()
+                for jobs in due:
+                    self.flush(jobs)
+                if self.args.once or self.stopped:
+                    break
+                watch.wait(self.args.poll_interval if wait is None else min(wait, self.args.poll_interval))
+            if self.args.flush_on_exit:
+                for jobs in self.due(flush_all=True)[0]:
+                    self.flush(jobs)
+        finally:
+            self.state.save()
+            watch.close()
+            signal.set_wakeup_fd(-1)
+            os.close(wake_r)
+            os.close(wake_w)
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+        print('Stopped with %i pending jobs.' % len(self.state.pending))
+
+
+def run(args):
+    """
+    Runs the daemon; only one daemon may use a state file at the same time
+    :param args: Parsed arguments of the `daemon` mode
+    """
+    lock_file = (args.state_file or args.storage_file + '.daemon') + '.lock'
+    with open(lock_file, 'a') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except (IOError, OSError):
+            raise RuntimeError('Another daemon is running with the state file of %s' % lock_file[:-len('.lock')])
+        # a server keeping the storage file in memory would not see the jobs added by the daemon
+        served = backends.direct_lock(args.storage_file)
+        try:
+            Daemon(args).run()
+        finally:
+            if served is not None:
+                served.close()
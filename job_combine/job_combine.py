@@ -2,16 +2,23 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, division, print_function
 
+import copy
+import cProfile
+import itertools
 import os
-import pickle
 import sys
-from collections import defaultdict
+import time
+from collections import OrderedDict
 from datetime import timedelta
-from difflib import SequenceMatcher
+from multiprocessing.pool import ThreadPool
 from os import path
 
-from job_combine.cluster import job as cjob
-from job_combine.utils import paths, time_parser
+from job_combine import client
+from job_combine.cluster import cache, dispatch, equivalence, job as cjob, ledger, scripts, taskqueue
+from job_combine.cluster.collection import JobCollection
+from job_combine.partitioning import engine, packing, strategies
+from job_combine.storage import backends, history, manifest as cmanifest
+from job_combine.utils import metrics, names, paths, time_parser
 
 try:
     import argparse
@@ -22,7 +29,7 @@ except ImportError:
     sys.exit(1)
 
 
-def read_args():
+def build_parser():
     parser = argparse.ArgumentParser(description='Combines multiple job files into a single job.')
     subparsers = parser.add_subparsers(help='Select the operation to perform')
 
@@ -36,6 +43,10 @@ def read_args():
     parser_status = subparsers.add_parser('status', help='Displays information about the currently stored jobs and'
                                                          ' which can be combined')
     parser_clear = subparsers.add_parser('clear', help='Removes all currently stored jobs')
+    parser_daemon = subparsers.add_parser('daemon', help='Watches a spool directory and continuously combines and'
+                                                         ' dispatches the job files dropped into it')
+    parser_serve = subparsers.add_parser('serve', help='Keeps the stored jobs in memory and runs the modes using them'
+                                                       ' for the invocations of this command until stopped')
 
     parser_queue.set_defaults(func=queue)
     parser_add.set_defaults(func=add)
@@ -43,88 +54,299 @@ def read_args():
     parser_restart.set_defaults(func=remove_completed)
     parser_status.set_defaults(func=status)
     parser_clear.set_defaults(func=clear)
+    parser_daemon.set_defaults(func=run_daemon)
+    parser_serve.set_defaults(func=run_server)
 
     # Arguments for all modes
     parser.add_argument('-s', '--storage-file', default='job_combine.storage',
                         help='Path to the file the added scripts are stored [default: %(default)s]')
+    parser.add_argument('-b', '--backend', default='sqlite', choices=backends.available_backends(),
+                        help='Storage backend used for the storage file; pickle storage files are migrated to sqlite'
+                             ' automatically [default: %(default)s]')
+    parser.add_argument('--cache-size', default=100000, type=int,
+                        help='Number of parsed job files kept in the parse cache next to the storage file; 0 disables'
+                             ' the cache [default: %(default)i]')
+    parser.add_argument('-e', '--equivalence', default=None, metavar='PATH',
+                        help='JSON file of parameters to ignore, sort, alias or rename when grouping combinable jobs;'
+                             ' applies to every mode that groups the stored jobs')
     parser.add_argument('-v', '--verbose', action='count', help='Increases verbosity level')
-
-    # Arguments for 'add'
-    parser_add.add_argument('job_file', help='Job file containing a single task')
+    parser.add_argument('--metrics-json', default=None, metavar='PATH',
+                        help='Write the durations of the phases, counts and dispatch latencies as JSON to this file')
+    parser.add_argument('--profile', nargs='?', const='job-combine.prof', default=None, metavar='PATH',
+                        help='Profile the invocation with cProfile and save the stats to this file'
+                             ' [default: job-combine.prof]')
+    parser.add_argument('--socket', default=None, metavar='PATH',
+                        help='Unix domain socket of the server started by `serve`; the modes add, remove, restart,'
+                             ' status, queue and clear are run by the server if it is running'
+                             ' [default: <storage file>.sock]')
+    parser.add_argument('--no-server', action='store_true',
+                        help='Load the storage file directly even if a server is running')
+
+    # Arguments for 'add' and 'remove'
+    for p, verb in ((parser_add, 'add'), (parser_remove, 'remove')):
+        p.add_argument('job_files', nargs='*', metavar='job_file',
+                       help='Job files containing a single task each; shell-style globs and directories (with'
+                            ' `--recursive`) are expanded')
+        p.add_argument('-r', '--recursive', action='store_true',
+                       help='%s all files below the given directories' % verb.capitalize())
+        p.add_argument('-f', '--from-file', help='File listing one job file per line; `-` reads the list from stdin')
     parser_add.add_argument('-w', '--workload-manager', help='Specifies the type of the job file. Will be inferred from'
                                                              ' the directives in the file, if not set. Valid values are'
                                                              ': [%s]' % (', '.join(cjob.available_managers())))
+    parser_add.add_argument('-j', '--processes', type=int,
+                            help='Number of processes parsing the job files [default: number of CPUs]')
 
-    # Arguments for 'remove'
-    parser_remove.add_argument('job_file', help='Job file containing a single task')
-    parser_remove.add_argument('-w', '--workload-manager',
-                               help='Specifies the type of the job file. Will be inferred from'
-                                    ' the directives in the file, if not set. Valid values are'
-                                    ': [%s]' % (', '.join(cjob.available_managers())))
+    # Arguments for 'remove' and 'restart'
+    for p in (parser_remove, parser_restart):
+        p.add_argument('-w', '--workload-manager', help='Ignored; stored jobs are removed by the path of their file')
 
     # Arguments for 'restart'
-    parser_restart.add_argument('-w', '--workload-manager',
-                                help='Specifies the type of the job files. Will be inferred from'
-                                     ' the directives in the files, if not set. Valid values are'
-                                     ': [%s]' % (', '.join(cjob.available_managers())))
     parser_restart.add_argument('-d', '--directory', default='scripts',
                                 help='Directory the combined scripts are stored in'
                                      ' [default: %(default)s]')
-    parser_restart.add_argument('--adapt-time', default=1, type=float,
-                                help='Value to multiply the original time restraints with. [default: %(default)f]')
+    parser_restart.add_argument('--adapt-time', default=1, type=parse_adapt_time,
+                                help='Value to multiply the original time restraints with, or `auto` to only extend'
+                                     ' the times of jobs that reached their time limit based on the observed run'
+                                     ' times [default: %(default)s]')
 
     # Arguments for 'queue'
     parser_queue.add_argument('--dispatch', action='store_true', help='Dispatch the combined scripts immediately after'
                                                                       ' creating them')
-    parser_queue.add_argument('-d', '--directory', default='scripts', help='Directory to store the combined scripts in'
-                                                                           ' [default: %(default)s]')
-    parser_queue.add_argument('-t', '--max-time', help='No combined job will have a runtime longer than this value')
-    parser_queue.add_argument('-m', '--min-time', help='No combined job will have a runtime with less than this value')
-    parser_queue.add_argument('-p', '--parallel', default=1, type=int,
-                              help='Tries to distribute the jobs equally to `p` scripts. Constraints may increase or '
-                                   'reduce the number of created script files. [default: %(default)i]')
-    parser_queue.add_argument('--break-max', action='store_true',
-                              help='Break the max_time constraint instead of the min_time constraint if not both can be'
-                                   ' fulfilled at the same time.')
+    parser_queue.add_argument('--dispatch-mode', default='each', choices=dispatch.available_modes(),
+                              help='Submit every combined job file on its own (each) or the combined job files of a'
+                                   ' group as tasks of a single array job (array); falls back to each for workload'
+                                   ' managers without array jobs [default: %(default)s]')
+    parser_queue.add_argument('--pack', action='store_true',
+                              help='Pack jobs that only differ in their numbers of nodes, tasks and cpus per task into'
+                                   ' allocations of the same size; the jobs run side by side as job steps with their'
+                                   ' own resources. The allocation utilization is compared with submitting the jobs'
+                                   ' separately.')
+    parser_queue.add_argument('--pack-nodes', default=None, type=int,
+                              help='Nodes of a packed allocation [default: nodes of the largest job]')
+    parser_queue.add_argument('--pack-cores', default=None, type=int,
+                              help='Cores per node [default: most cores a job uses per node]')
+    parser_queue.add_argument('--incremental', action='store_true',
+                              help='Only write the combined scripts of groups that changed since the last run with'
+                                   ' this option; the scripts of every group are kept in a sub folder named after the'
+                                   ' parameters of the group, unchanged groups are neither written nor dispatched'
+                                   ' again')
+    parser_queue.add_argument('--use-predicted', action='store_true',
+                              help='Partition on the times predicted from the recorded run times of the jobs instead'
+                                   ' of their requested times; the requested time stays the upper bound')
+    parser_queue.add_argument('--predict-method', default='mean', choices=history.available_methods(),
+                              help='Predict from the moving average (mean) or a quantile of the recent run times'
+                                   ' [default: %(default)s]')
+    parser_queue.add_argument('--predict-quantile', default=0.9, type=float,
+                              help='Quantile used by the quantile method [default: %(default)s]')
+    parser_queue.add_argument('--predict-margin', default=0.2, type=float,
+                              help='Safety margin added to the predicted times as a fraction [default: %(default)s]')
+    parser_queue.add_argument('--requeue', action='store_true',
+                              help='Combined jobs stop before a job that would not fit into their remaining time and'
+                                   ' are queued again by the workload manager, e.g. with `scontrol requeue` for Slurm;'
+                                   ' otherwise they exit with status %i so they can be resubmitted'
+                                   % scripts.REQUEUE_EXIT)
+    parser_queue.add_argument('--dynamic', action='store_true',
+                              help='The combined jobs of a group share a queue of the jobs and each runs the next'
+                                   ' pending job until none is left or fits into its remaining time; the partitioning'
+                                   ' only determines the number and times of the combined jobs')
+    parser_queue.add_argument('--reset-queue', action='store_true',
+                              help='Replace the task queue of the dynamic mode even if jobs are pending or running,'
+                                   ' e.g. after its combined jobs were cancelled')
+    parser_queue.add_argument('--slots', default=1, type=int,
+                              help='Number of jobs a combined script runs at the same time; the time of a combined'
+                                   ' script is the time until its last job finished if every job starts as soon as'
+                                   ' a slot is free [default: %(default)i]')
+    parser_queue.add_argument('--slot-launcher', default='shell', choices=['shell', 'step'],
+                              help='Run the concurrent jobs as background processes of the combined script (shell) or'
+                                   ' as separate job steps of the workload manager, e.g. `srun --exclusive` for Slurm'
+                                   ' (step) [default: %(default)s]')
+
+    # Arguments for 'daemon'
+    parser_daemon.add_argument('spool', help='Directory the job files are dropped into; write them under a hidden or'
+                                             ' `.tmp` name and rename them when complete')
+    parser_daemon.add_argument('-w', '--workload-manager',
+                               help='Specifies the type of the job files. Will be inferred from the directives in the'
+                                    ' file, if not set.')
+    parser_daemon.add_argument('-j', '--processes', type=int,
+                               help='Number of processes parsing the job files [default: number of CPUs]')
+    parser_daemon.add_argument('--max-latency', default=600, type=float,
+                               help='Seconds after which the pending jobs of a group are combined and dispatched even'
+                                    ' if they do not reach the min time [default: %(default)s]')
+    parser_daemon.add_argument('--poll-interval', default=5, type=float,
+                               help='Seconds between two scans of the spool directory if inotify is not available'
+                                    ' [default: %(default)s]')
+    parser_daemon.add_argument('--no-inotify', action='store_true', help='Poll the spool directory')
+    parser_daemon.add_argument('--state-file', default=None,
+                               help='File the daemon keeps its state in to recover after a crash'
+                                    ' [default: <storage file>.daemon]')
+    parser_daemon.add_argument('--no-dispatch', action='store_true', help='Only write the combined scripts')
+    parser_daemon.add_argument('--flush-on-exit', action='store_true',
+                               help='Combine and dispatch all pending jobs when the daemon is stopped')
+    parser_daemon.add_argument('--once', action='store_true',
+                               help='Process the spool directory once and exit, e.g. when run by cron')
+
+    # Arguments for 'queue' and 'daemon'
+    for p in (parser_queue, parser_daemon):
+        p.add_argument('-d', '--directory', default='scripts', help='Directory to store the combined scripts in'
+                                                                    ' [default: %(default)s]')
+        p.add_argument('-t', '--max-time', help='No combined job will have a runtime longer than this value')
+        p.add_argument('-m', '--min-time', help='No combined job will have a runtime with less than this value')
+        p.add_argument('-p', '--parallel', default=1, type=int,
+                       help='Tries to distribute the jobs equally to `p` scripts. Constraints may increase or '
+                            'reduce the number of created script files. [default: %(default)i]')
+        p.add_argument('--break-max', action='store_true',
+                       help='Break the max_time constraint instead of the min_time constraint if not both can be'
+                            ' fulfilled at the same time.')
+        p.add_argument('--write-workers', default=8, type=int,
+                       help='Number of combined scripts written at the same time [default: %(default)i]')
+        p.add_argument('--dispatch-workers', default=4, type=int,
+                       help='Number of job files submitted at the same time [default: %(default)i]')
+        p.add_argument('--dispatch-rate', default=10, type=float,
+                       help='Maximum number of submissions per second; 0 for no limit [default: %(default)s]')
+        p.add_argument('--dispatch-retries', default=5, type=int,
+                       help='Number of retries if the workload manager is busy [default: %(default)i]')
+        p.add_argument('--dispatch-backoff', default=1, type=float,
+                       help='Seconds to wait before the first retry; doubled for every further retry'
+                            ' [default: %(default)s]')
+        p.add_argument('--submit-command', default=None,
+                       help='Command used to submit the job files instead of the dispatch command of the'
+                            ' workload manager, e.g. `bash` to run them locally')
+        p.add_argument('--naming', default='substring', choices=names.available_policies(),
+                       help='Name a combined job after the longest common substring (substring) or prefix'
+                            ' (prefix) of the names of its jobs or after the --name-template (template)'
+                            ' [default: %(default)s]')
+        p.add_argument('--name-template', default='{name}-{counter}', type=parse_name_template,
+                       help='Format of the names with the --naming template; {name} is the longest common'
+                            ' substring, {prefix} the longest common prefix and {counter} the number of the'
+                            ' combined job [default: %(default)s]')
+        p.add_argument('--strategy', default='greedy', choices=strategies.available_strategies(),
+                       help='Strategy used to balance the jobs between the combined scripts'
+                            ' [default: %(default)s]')
+        p.add_argument('--strategy-budget', default=10, type=float,
+                       help='Wall-clock time in seconds the partitioning strategy may spend on each group of'
+                            ' combinable scripts [default: %(default)s]')
+
+    # Arguments for 'serve'
+    parser_serve.add_argument('--flush-interval', default=5, type=float,
+                              help='Seconds the changes of the stored jobs are kept in memory before they are written'
+                                   ' to the storage file; 0 writes them after every invocation [default: %(default)s]')
 
     # Arguments for 'status'
 
     # Arguments for 'clear'
 
-    mode = parser.parse_args()
+    return parser
+
+
+def read_args(argv=None):
+    mode = build_parser().parse_args(argv)
+    if mode.equivalence is not None:
+        equivalence.load(mode.equivalence)
+    run(mode)
+
 
+def run(mode):
+    """
+    Runs the selected mode
+    :param mode: Parsed command line arguments
+    """
     if mode.verbose is None:
         mode.verbose = 0
 
+    if mode.metrics_json is not None:
+        metrics.enable()
     try:
-        mode.func(mode)
+        if mode.profile is not None:
+            profiler = cProfile.Profile()
+            try:
+                profiler.runcall(mode.func, mode)
+            finally:
+                profiler.dump_stats(mode.profile)
+                print('Saved profile to %s; inspect it with `python -m pstats %s`.' % (mode.profile, mode.profile))
+        else:
+            mode.func(mode)
     except AttributeError:
         print("Illegal mode. Use -h to get a list of possible options.")
+    finally:
+        if mode.metrics_json is not None:
+            metrics.save(mode.metrics_json, mode=getattr(getattr(mode, 'func', None), '__name__', None))
+            metrics.disable()
+
+
+# store and parse cache kept in memory by `serve`; every invocation opens its own in direct mode
+shared_store = None
+shared_cache = None
+
+
+def open_store(args, writing=True):
+    """
+    :param args: Parsed command line arguments
+    :param writing: Whether the stored jobs are changed; changing a storage file served by another process is refused
+    :return: Store kept in memory by `serve` or the storage file opened directly
+    """
+    if shared_store is not None:
+        return shared_store
+    lock = backends.direct_lock(args.storage_file) if writing else None
+    try:
+        storage = backends.open_store(args.storage_file, args.backend)
+    except Exception:
+        if lock is not None:
+            lock.close()
+        raise
+    storage.lock = lock
+    return storage
+
+
+def open_cache(args):
+    if shared_cache is not None:
+        return shared_cache
+    return cache.ParseCache(args.storage_file + '.cache', args.cache_size)
+
+
+def open_history(args):
+    return history.History(args.storage_file + '.history')
+
+
+def record_history(args, current_jobs):
+    """
+    Adds the run times recorded by the current and previous combined scripts in the script directory to the history
+    :param args: Parsed command line arguments
+    :param current_jobs: Stored jobs by job key; used to look up the job names
+    """
+    names = dict((job.file, job.name) for similar_jobs in current_jobs.values() for job in similar_jobs)
+    records = ledger.records(args.directory, previous=True)
+    with open_history(args) as runs:
+        added = runs.record(history.runs_of(records), names)
+    if int(args.verbose) >= 1:
+        print('Recorded %i runs in the history.' % added)
+
+
+def predict_times(args, current_jobs):
+    """
+    Replaces the times of the jobs by the times predicted from the history; jobs without enough recorded runs keep their
+    requested time. The stored jobs are not changed, the predicted ones are copies.
+    :param args: Parsed command line arguments
+    :param current_jobs: Stored jobs by job key
+    :return: Jobs with the predicted times by job key
+    """
+    record_history(args, current_jobs)
+    predicted_jobs = OrderedDict()
+    predicted = 0
+    with open_history(args) as runs:
+        for key, similar_jobs in current_jobs.items():
+            group = predicted_jobs[key] = JobCollection()
+            for job in similar_jobs:
+                time_predicted = runs.predict(job, args.predict_method, args.predict_quantile, args.predict_margin)
+                if time_predicted is not None:
+                    job = copy.copy(job)
+                    job.time = time_predicted
+                    predicted += 1
+                group.append(job)
+    print('Predicted the times of %i of %i jobs.' % (predicted, sum(len(v) for v in current_jobs.values())))
+    return predicted_jobs
 
 
-def load(file):
-    if not path.isabs(file):
-        file_abs = path.join(paths.abs_folder(), file)
-    else:
-        file_abs = file
-    with open(file_abs, 'ab+') as f:
-        try:
-            f.seek(0)
-            return pickle.load(f)
-        except EOFError:
-            return defaultdict(list)
-
-
-def store(file, dic):
-    if not path.isabs(file):
-        file_abs = path.join(paths.abs_folder(), file)
-    else:
-        file_abs = file
-    with open(file_abs, 'wb+') as f:
-        pickle.dump(dic, f, protocol=2)  # Highest protocol supported by all python versions >= 2.3
-
-
-def combine(jobs):
+def combine(jobs, slots=1, launcher=None, requeue=False, task_queue=None, naming=None, counter=0):
     assert len(jobs) > 0
 
     # all scripts have params and manager in common or they would not be combinable
@@ -132,99 +354,254 @@ def combine(jobs):
     manager = jobs[0].manager_name
 
     # properties of the combined job
-    time = cjob.sum_times(jobs)
-    stdout = 'job.out'
-    stderr = 'job.err'
-
-    # find longest common substring of the names
-    best_match = jobs[0].name
-    for job in jobs:
-        match = SequenceMatcher(None, job.name, best_match) \
-            .find_longest_match(0, len(job.name), 0, len(best_match))
-        best_match = jobs[0].name[match.a:match.a + match.size]
-    name = best_match if best_match.strip() != '' else 'Job'
+    time = cjob.slot_time(jobs, slots)
+    stdout = cjob.STDOUT
+    stderr = cjob.STDERR
+
+    # name the combined job after the names of its jobs
+    with metrics.phase('combine.names'):
+        name = (naming or names.Naming()).name([job.name for job in jobs], counter)
+
+    walltime = None
+    requeue_command = None
+    if requeue:
+        # stop before a job that does not fit into the remaining time and have the combined job queued again
+        m = jobs[0].manager()
+        walltime = int(time.total_seconds())
+        requeue_command = m.requeue_command
+        if m.requeue_flag is not None:
+            params = params + ((m.requeue_flag, 0, None),)
 
     c_job = cjob.Job(None, name, None, time, stdout, stderr, params, manager)
 
     # create script for combined job that calls every original script in its working directory
-    c_script = 'cwd=$(pwd)\n'
-    for job in jobs:
-        c_script += 'cd "%s"\n' % job.directory  # change to working directory
-        c_script += '"%s"' % job.file  # execute script (file path is absolute)
-        if job.stdout is not None:
-            c_script += ' >%s' % stdout  # pipe stdout
-        if job.stderr is not None:
-            c_script += ' 2>%s' % stderr  # pipe stderr
-        c_script += '\n'
-        c_script += 'echo %s >> $cwd/done\n\n' % job.file
+    if task_queue is not None:
+        # the jobs only determine the time; the script runs any job of the queue
+        c_script = scripts.dynamic(task_queue, int(time.total_seconds()))
+    elif slots > 1:
+        c_script = scripts.parallel(jobs, slots, launcher, walltime, requeue_command)
+    else:
+        c_script = scripts.sequential(jobs, walltime, requeue_command)
 
     return c_job, c_script
 
 
-def partition(jobs, max_time=timedelta.max, min_time=timedelta(), parallel=1, break_max=True):
+def partition(jobs, max_time=timedelta.max, min_time=timedelta(), parallel=1, break_max=True, strategy='greedy',
+              budget=None, slots=1):
     if max_time < min_time:
         raise ValueError('Max time has to be larger than min time')
 
     print('\nPartitioning results for %i combinable scripts:' % len(jobs))
 
-    # greedy balanced partitioning into n groups considering the time constraints
-    def do_partition(target_n, previous=-1):
-        part = []
-
-        desc_jobs = sorted(jobs, key=lambda x: x.time, reverse=True)
-
-        # create each partition and fill them with the n largest items
-        for _ in range(target_n):
-            part.append([desc_jobs.pop(0)])
-
-        # iterate over the remaining items and fill the largest item into the smallest partition
-        for j in desc_jobs:
-            smallest_part = min(part, key=cjob.sum_times)
-            smallest_part.append(j)
-
-        # validate time constraints
-        for p in part:
-            time = cjob.sum_times(p)
-            if time > max_time:
-                if target_n >= len(jobs):
-                    print('WARNING: Could not fulfill max_time = %s constraint as there exists a single script with a'
-                          ' longer time.' % max_time)
-                    break
-                if previous == target_n + 1 and break_max:  # fluctuating around target_n and target_n + 1
-                    print('WARNING: Could not fulfill both time constraints simultaneously.'
-                          ' Breaking the max_time = %s constraint.' % max_time)
-                    break
-                return do_partition(target_n + 1, target_n)  # need more partitions
-            elif time < min_time:
-                if target_n == 1:
-                    print(
-                        'WARNING: Could not fulfill min_time = %s constraint as there are not enough combinable scripts'
-                        ' to reach this time.' % min_time)
-                    break
-                if previous == target_n - 1 and not break_max:  # fluctuating around target_n and target_n + 1
-                    print('WARNING: Could not fulfill both time constraints simultaneously.'
-                          ' Breaking the min_time = %s constraint.' % min_time)
-                    break
-                return do_partition(target_n - 1, target_n)  # need fewer partitions
-
-        # constraint check successful
-        return part
-
-    target_number = min(parallel, len(jobs))
-    part_result = do_partition(target_number)
+    split = strategies.splitter(strategy, budget, len(jobs))
+    part_result, warnings = engine.search(jobs, max_time, min_time, parallel, break_max, split, slots)
+    for warning in warnings:
+        print('WARNING: %s' % warning)
+
     if len(part_result) > parallel > 1:
         print('WARNING: Could not partition the jobs to less than %i partitions. Try relaxing the max_time'
               ' constraint.' % parallel)
-    times = [str(cjob.sum_times(p)) for p in part_result]
-    print('%i partitions with times: %s' % (len(part_result), ', '.join(times)))
+    times = [cjob.slot_time(p, slots) for p in part_result]
+    print('%i partitions with times: %s' % (len(part_result), ', '.join(str(t) for t in times)))
+
+    if len(part_result) > 0:
+        makespan = max(times)
+        bound = strategies.lower_bound(jobs, len(part_result) * slots)  # every slot runs like a partition of its own
+        gap = time_parser.total_seconds(makespan - bound) / time_parser.total_seconds(bound) * 100 if bound else 0
+        print('Makespan %s with lower bound %s (gap %.2f%%) using the %s strategy.' % (makespan, bound, gap, strategy))
 
     return part_result
 
 
-def queue(args):
-    current_jobs = load(args.storage_file)
+# Options of `queue` affecting the combined scripts; a group is written again by --incremental if one of them changed
+INCREMENTAL_OPTIONS = ['max_time', 'min_time', 'parallel', 'break_max', 'strategy', 'strategy_budget', 'slots',
+                       'slot_launcher', 'requeue', 'dynamic', 'naming', 'name_template']
+
+
+def combine_packed(allocation, params, nodes, cores_per_node, naming=None, counter=0):
+    """
+    Combines the shelves of jobs of a packed allocation
+    :param allocation: Shelves of jobs that run one after another
+    :param params: Params of the jobs without their resources
+    :param nodes: Nodes of the allocation
+    :param cores_per_node: Cores per node
+    :param naming: Naming of the combined job
+    :param counter: Number of the combined job
+    :return: (combined job, generator of its script)
+    """
+    jobs = [job for shelf in allocation for job in shelf.jobs]
+    m = jobs[0].manager()
+    time = timedelta(seconds=sum(shelf.seconds for shelf in allocation))
+    with metrics.phase('combine.names'):
+        name = (naming or names.Naming()).name([job.name for job in jobs], counter)
+
+    # the allocation provides one task per core; the step of a job uses the cores it needs on each of its nodes
+    params = params + ((m.resource_args['nodes'][0], 0, str(nodes)),
+                       (m.resource_args['tasks'][0], 0, str(nodes * cores_per_node)),
+                       (m.resource_args['tasks_per_node'][0], 0, str(cores_per_node)))
+    c_job = cjob.Job(None, name, None, time, cjob.STDOUT, cjob.STDERR, params, m.name)
+    steps = [[(job, m.resource_step % packing.step_values(packing.resources(job))) for job in shelf.jobs]
+             for shelf in allocation]
+    return c_job, scripts.packed(steps, m.step_rank_var)
+
+
+def pack(args, current_jobs, max_time, min_time, naming):
+    """
+    Packs the jobs that only differ in their resources into allocations of the same size and writes the combined
+    scripts; reports the utilization of the allocations compared with submitting the groups separately. The jobs of
+    workload managers that do not support packing are combined like without packing.
+    :param args: Parsed arguments of `queue`
+    :param current_jobs: Dictionary of job collections by job key
+    :param max_time: Time limit of an allocation
+    :param min_time: Minimum time of a combined job of the jobs that are not packed
+    :param naming: Naming of the combined jobs
+    :return: Jobs to dispatch
+    """
+    groups = OrderedDict()
+    unsupported = OrderedDict()
+    for key, similar_jobs in current_jobs.items():
+        if len(similar_jobs) > 0 and not packing.supports_packing(similar_jobs.first().manager()):
+            unsupported[key] = similar_jobs
+            continue
+        for job in similar_jobs:
+            groups.setdefault(equivalence.key(*packing.pack_key(job)), []).append(job)
 
+    max_seconds = None if max_time == timedelta.max else int(max_time.total_seconds())
+    split = strategies.splitter('greedy')
     dir_counter = 0
+    to_submit = []
+    for group_index, jobs in enumerate(groups.values()):
+        m = jobs[0].manager()
+        params = packing.pack_key(jobs[0])[1]  # the params of the first job like in `combine`
+
+        with metrics.phase('partition'):
+            packed = packing.Packing(jobs, args.pack_nodes, args.pack_cores, max_seconds, args.parallel)
+            # allocations of the jobs partitioned by their own resources like without packing
+            by_key = OrderedDict()
+            for job in jobs:
+                by_key.setdefault(job.key(), []).append(job)
+            separate = sum(len(engine.search(same, max_time, timedelta(), args.parallel, args.break_max, split)[0])
+                           for same in by_key.values())
+        metrics.count('partitions', len(packed.allocations))
+
+        with metrics.phase('combine'):
+            combined = [combine_packed(a, params, packed.nodes, packed.cores_per_node, naming, dir_counter + i)
+                        for i, a in enumerate(packed.allocations)]
+        with metrics.phase('write'):
+            written = write_scripts(combined, args.directory, dir_counter, args.write_workers, int(args.verbose))
+        dir_counter += len(written)
+
+        print('\nPacked %i jobs into %i allocations of %i nodes with %i cores each: %.1f%% utilization'
+              % (len(jobs), len(packed.allocations), packed.nodes, packed.cores_per_node,
+                 100.0 * packed.used / packed.capacity()))
+        print('Submitted separately: %i allocations with %.1f%% utilization (whole nodes charged)'
+              % (separate, 100.0 * packed.used / packed.separate_capacity(jobs)))
+
+        if args.dispatch:
+            to_submit += dispatch.prepare(written, args.dispatch_mode, paths.abs_path(args.directory), group_index,
+                                          int(args.verbose))
+
+    if len(unsupported) > 0:
+        print('\nWARNING: %s does not support packing; combining its jobs without packing.'
+              % ', '.join(sorted(set(v.first().manager_name for v in unsupported.values()))))
+        to_submit += combine_groups(args, unsupported, max_time, min_time, naming, dir_counter, len(groups))
+    return to_submit
+
+
+def combine_groups(args, current_jobs, max_time, min_time, naming, first_dir=0, first_group=0):
+    """
+    Partitions every group of combinable jobs and writes the combined scripts
+    :param args: Parsed arguments of `queue`
+    :param current_jobs: Dictionary of job collections by job key
+    :param max_time: Time limit of a combined job
+    :param min_time: Minimum time of a combined job
+    :param naming: Naming of the combined jobs
+    :param first_dir: Number of the first script directory
+    :param first_group: Number of the first group, used for the names of its queue directory and array job
+    :return: Jobs to dispatch
+    """
+    dir_counter = first_dir
+    manifest = None
+    options = None
+    if args.incremental:
+        manifest = cmanifest.Manifest(args.directory)
+        options = dict((name, getattr(args, name)) for name in INCREMENTAL_OPTIONS)
+    group_ids = []
+    skipped = 0
+
+    to_submit = []
+    for group_index, (key, similar_jobs) in enumerate(current_jobs.items(), first_group):
+        if len(similar_jobs) == 0:
+            continue
+
+        # combined scripts of the group are written to script_dir/NN, numbered from `first`
+        script_dir = args.directory
+        first = dir_counter
+        array_index = group_index
+        queue_dir = path.join(args.directory, 'queue-%02i' % group_index)
+        if manifest is not None:
+            # every group has its own directory named after its key and is skipped if nothing changed
+            gid = cmanifest.group_id(key)
+            digest = cmanifest.content_hash(similar_jobs, options)
+            group_ids.append(gid)
+            if manifest.unchanged(gid, digest):
+                skipped += 1
+                continue
+            script_dir = path.join(args.directory, gid)
+            first = 0
+            array_index = 0
+            queue_dir = path.join(script_dir, 'queue')
+
+        # partition jobs based on constraints
+        with metrics.phase('partition'):
+            part = partition(similar_jobs, max_time, min_time, args.parallel, args.break_max, args.strategy,
+                             args.strategy_budget, args.slots)
+        metrics.count('partitions', len(part))
+        # combine scripts in same partition
+        launcher = None
+        if args.slots > 1 and args.slot_launcher == 'step':
+            launcher = similar_jobs.first().manager().step_command
+            if launcher is None:
+                print('WARNING: %s does not support job steps; running the jobs as background processes.'
+                      % similar_jobs.first().manager_name)
+        with metrics.phase('combine'):
+            task_queue = None
+            if args.dynamic:
+                task_queue = taskqueue.create(similar_jobs, queue_dir, args.reset_queue)
+            combined = [combine(p, args.slots, launcher, args.requeue, task_queue, naming, first + i)
+                        for i, p in enumerate(part)]
+
+        # create separate sub folder for each script and write them to files
+        with metrics.phase('write'):
+            written = write_scripts(combined, script_dir, first, args.write_workers, int(args.verbose))
+        dir_counter += len(written)
+        if manifest is not None:
+            remove_scripts(manifest.update(gid, digest, part, [job.file for job in written]))
+
+        if args.dispatch:
+            to_submit += dispatch.prepare(written, args.dispatch_mode, paths.abs_path(script_dir), array_index,
+                                          int(args.verbose))
+
+    if manifest is not None:
+        remove_scripts(manifest.retain(group_ids))
+        manifest.save()
+        metrics.count('groups_skipped', skipped)
+        print('Skipped %i of %i groups that did not change since the last run.' % (skipped, len(group_ids)))
+    return to_submit
+
+
+def queue(args):
+    if args.slots < 1:
+        raise ValueError('The number of slots has to be at least 1')
+    if args.dynamic and (args.slots > 1 or args.requeue):
+        raise ValueError('The dynamic mode can not be combined with --slots or --requeue')
+    if args.pack and (args.slots > 1 or args.requeue or args.dynamic or args.incremental):
+        raise ValueError('Packing can not be combined with --slots, --requeue, --dynamic or --incremental')
+
+    with metrics.phase('load'), open_store(args, writing=False) as storage:
+        current_jobs = storage.groups()
+    metrics.count('groups', len(current_jobs))
+    metrics.count('jobs', sum(len(v) for v in current_jobs.values()))
 
     time_format = '%H:%M:%S'
     if args.max_time is None:
@@ -236,102 +613,237 @@ def queue(args):
     else:
         min_time = time_parser.str_to_timedelta(args.min_time, time_format)
 
+    if args.use_predicted:
+        with metrics.phase('predict'):
+            current_jobs = predict_times(args, current_jobs)
+
     print('Combining scripts...')
+    naming = names.Naming(args.naming, args.name_template)
 
-    for similar_jobs in current_jobs.values():
-        if len(similar_jobs) == 0:
-            continue
+    if args.pack:
+        to_submit = pack(args, current_jobs, max_time, min_time, naming)
+    else:
+        to_submit = combine_groups(args, current_jobs, max_time, min_time, naming)
+    print('Done combining scripts.')
 
-        # partition jobs based on constraints
-        part = partition(similar_jobs, max_time, min_time, args.parallel, args.break_max)
-        # combine scripts in same partition
-        combined = map(combine, part)
+    if args.dispatch:
+        dispatcher = dispatch.Dispatcher(args.dispatch_workers, args.dispatch_rate, args.dispatch_retries,
+                                         args.dispatch_backoff, args.submit_command, int(args.verbose))
+        with metrics.phase('dispatch'):
+            results = dispatcher.submit_all(to_submit)
+        failed = len([error for _, _, error in results if error is not None])
+        print('Dispatched %i of %i job files.' % (len(results) - failed, len(results)))
+
+
+def remove_scripts(files):
+    """
+    Removes outdated combined scripts; their ledgers are kept
+    :param files: Script files
+    """
+    for file in files:
+        if path.exists(file):
+            os.remove(file)
+
+
+def write_scripts(combined, directory, first, workers=1, verbose=0, rotate=True):
+    """
+    Writes combined jobs to the files `submit.job` in numbered sub folders; every file is streamed from the generated
+    script to a temporary file and renamed, several files are written concurrently
+    :param combined: List of (combined job, generator of its script)
+    :param directory: Directory of the sub folders
+    :param first: Number of the first sub folder
+    :param workers: Number of files written at the same time
+    :param verbose: Verbosity
+    :param rotate: Move the ledgers of earlier scripts in the sub folders aside; False if the same scripts are written
+    again
+    :return: List of the written jobs
+    """
+    written = []
+    for i, (job, _) in enumerate(combined):
+        job.directory = paths.abs_path(path.join(directory, '%02i' % (first + i)))
+        job.file = path.join(job.directory, 'submit.job')
+        written.append(job)
+
+    def write(item):
+        job, script = item
+        os.makedirs(job.directory, exist_ok=True)
+        if rotate:
+            ledger.rotate(job.directory)
+        # directives followed by the combined script
+        return paths.write_atomic(job.file, itertools.chain([job.to_string(), '\n'], script))
+
+    if len(combined) == 0:
+        return written
+    pool = ThreadPool(max(1, min(workers, len(combined))))
+    try:
+        sizes = pool.map(write, combined)
+    finally:
+        pool.close()
+        pool.join()
+    metrics.count('bytes_written', sum(sizes))
+
+    if verbose >= 1:
+        for job in written:
+            print('Written script to %s' % job.file)
+    return written
+
+
+def expand_job_files(args):
+    """
+    Expands the job files given on the command line
+    :param args: Parsed command line arguments of `add` or `remove`
+    :return: List of absolute paths to the job files
+    """
+    patterns = list(args.job_files)
+    if args.from_file is not None:
+        patterns += paths.read_list(args.from_file)
+    files, unmatched = paths.expand(patterns, args.recursive)
+    for pattern in unmatched:
+        if path.isdir(pattern):
+            print('WARNING: Skipped directory `%s`; use --recursive to include the files below it.' % pattern)
+        else:
+            print('WARNING: No job files found for `%s`.' % pattern)
+    return files
+
+
+def parse_jobs(args, files, processes=None):
+    """
+    Parses job files, serving unchanged files from the parse cache; files that can not be parsed are reported
+    :param args: Parsed command line arguments
+    :param files: Paths to the job files
+    :param processes: Number of processes parsing the job files
+    :return: List of the successfully parsed jobs
+    """
+    parse_cache = open_cache(args)
+
+    jobs = []
+    for job_file, job, error in parse_cache.parse_files(files, args.workload_manager, processes):
+        if error is not None:
+            print('ERROR: Could not parse `%s`: %s' % (job_file, error))
+        else:
+            jobs.append(job)
+            if int(args.verbose) >= 2:
+                print('Parsed %s for workload manager %s' % (job_file, job.manager_name))
+
+    if int(args.verbose) >= 1:
+        print(parse_cache)
+    if parse_cache is not shared_cache:
+        parse_cache.close()
+    return jobs
 
-        # create separate sub folder for each script and write them to files
-        for job, script in combined:
-            script_dir = paths.abs_path(path.join(args.directory, '%02i' % dir_counter))
-            dir_counter += 1
-            os.makedirs(script_dir, exist_ok=True)
-
-            job.file = path.join(script_dir, 'submit.job')
-            job.directory = script_dir
-
-            # write directives and combined script to file
-            with open(job.file, 'w+') as f:
-                f.write(job.to_string())
-                f.write('\n')
-                f.write(script)
-
-            if int(args.verbose) >= 1:
-                print('Written script to %s' % job.file)
-            if args.dispatch:
-                if os.system(job.manager().dispatch_command + ' ' + job.file) == 0:
-                    if int(args.verbose) >= 1:
-                        print('Dispatching successful for: %s' % job.file)
-    print('Done combining scripts.')
+
+def print_summary(verb, n_jobs, n_files, start):
+    elapsed = time.time() - start
+    rate = n_files / elapsed if elapsed > 0 else float('inf')
+    print('%s %i of %i job files in %.2f s (%.1f files/s).' % (verb, n_jobs, n_files, elapsed, rate))
 
 
 def add(args):
-    current_jobs = load(args.storage_file)
+    start = time.time()
+    with metrics.phase('expand'):
+        files = expand_job_files(args)
+    with metrics.phase('parse'):
+        jobs = parse_jobs(args, files, args.processes)
+    metrics.count('files', len(files))
+    metrics.count('jobs', len(jobs))
+
+    for job in jobs:
+        os.chmod(job.file, os.stat(job.file).st_mode | 0o111)  # set script executable for everyone
 
-    job = cjob.Job.from_file(args.job_file, args.workload_manager)
-    os.chmod(job.file, os.stat(job.file).st_mode | 0o111)  # set script executable for everyone
-    current_jobs[job.key()].append(job)
+    with metrics.phase('store'), open_store(args) as storage:
+        storage.add(jobs)
 
-    store(args.storage_file, current_jobs)
-    print('Added job successfully.')
+    print_summary('Added', len(jobs), len(files), start)
 
 
 def remove(args):
-    current_jobs = load(args.storage_file)
+    start = time.time()
+    files = expand_job_files(args)
 
-    job = cjob.Job.from_file(args.job_file, args.workload_manager)
-    current_jobs[job.key()].remove(job)
+    with metrics.phase('store'), open_store(args) as storage:
+        removed = storage.remove(files)
 
-    store(args.storage_file, current_jobs)
-    print('Removed job successfully.')
+    if removed < len(files):
+        print('%i of the job files were not stored.' % (len(files) - removed))
+    print_summary('Removed', removed, len(files), start)
 
 
 def remove_completed(args):
-    current_jobs = load(args.storage_file)
-    script_dir = args.directory
-
-    completed_scripts = []
-    for root, dirs, files in os.walk(script_dir):
-        for f in files:
-            if f == 'done':
-                with open(path.join(root, f)) as file:
-                    completed_scripts += [line.strip() for line in file]
-
-    removed_counter = 0
-    for script_f in completed_scripts:
-        if script_f == '':
-            continue
-        job = cjob.Job.from_file(script_f, args.workload_manager)
-        try:
-            current_jobs[job.key()].remove(job)
-            removed_counter += 1
-        except ValueError:
-            pass  # Script was already removed
-
-    if args.adapt_time != 1:
-        for similar_jobs in current_jobs.values():
-            for job in similar_jobs:
+    with metrics.phase('read_ledgers'):
+        records = ledger.records(args.directory)
+    metrics.count('records', len(records))
+    latest = ledger.latest(records)
+    succeeded = [file for file, record in latest.items() if ledger.succeeded(record)]
+    timed_out = dict((file, record) for file, record in latest.items() if record.status == ledger.TIMEOUT)
+    n_failed = len(latest) - len(succeeded) - len(timed_out)
+
+    with metrics.phase('store'), open_store(args) as storage:
+        record_history(args, storage.groups())
+        # scripts already removed are not counted
+        removed_counter = storage.remove(succeeded)
+
+        remaining_jobs = [job for similar_jobs in storage.groups().values() for job in similar_jobs]
+        if args.adapt_time == 'auto':
+            adapted = [job for job in remaining_jobs if adapt_time(job, timed_out.get(job.file))]
+            storage.update(adapted)
+            print('Adapted the times of %i timed out jobs.' % len(adapted))
+        elif args.adapt_time != 1:
+            for job in remaining_jobs:
                 job.time *= args.adapt_time
+            storage.update(remaining_jobs)
+
+    print('Removed %i jobs successfully; %i jobs remaining.' % (removed_counter, len(remaining_jobs)))
+    if n_failed > 0 or len(timed_out) > 0:
+        print('%i jobs failed and %i jobs timed out in their last run.' % (n_failed, len(timed_out)))
+
+
+AUTO_ADAPT_FACTOR = 2  # factor applied to the observed time of jobs that reached their time limit
+
+
+def adapt_time(job, record):
+    """
+    Extends the time of a job that was terminated after it used up its time
+    :param job: Job
+    :param record: Latest ledger record of the job; None if it did not run
+    :return: True if the time of the job was changed
+    """
+    if record is None or record.status != ledger.TIMEOUT or record.elapsed is None:
+        return False
+    observed = timedelta(seconds=record.elapsed)
+    # a job terminated before using its time was stopped because of other jobs in the same combined job
+    if observed < job.time * 0.9:
+        return False
+    job.time = max(job.time, observed) * AUTO_ADAPT_FACTOR
+    return True
+
+
+def parse_adapt_time(value):
+    if value == 'auto':
+        return value
+    try:
+        return float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid value: '%s' (choose 'auto' or a number)" % value)
+
 
-    store(args.storage_file, current_jobs)
-    print('Removed %i jobs successfully; %i jobs remaining.' % (removed_counter, len(current_jobs)))
+def parse_name_template(value):
+    try:
+        names.check_template(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+    return value
 
 
 def status(args):
-    jobs = load(args.storage_file)
+    with open_store(args, writing=False) as storage:
+        jobs = storage.groups()
     n_jobs = sum([len(v) for v in jobs.values()])
 
     times = []
     for k, v in jobs.items():
         if len(v) == 0:
             continue
-        time_format = v[0].manager().time_formats[0]
+        time_format = v.first().manager().time_formats[0]
         time_sum = cjob.sum_times(v)
         times.append(time_parser.str_from_timedelta(time_sum, time_format))
 
@@ -340,17 +852,45 @@ def status(args):
     print('Stored %i jobs that can be combined to %i tasks with the times [%s].'
           % (n_jobs, min_combined_jobs, ', '.join(times)))
 
+    if len(equivalence.rules) > 0:
+        # groups the jobs would form if all their parameters had to be equal
+        exact = set((job.manager_name, job.params) for v in jobs.values() for job in v)
+        consolidated = [k for k, v in jobs.items() if len(set(job.params for job in v)) > 1]
+        print('The equivalence rules consolidated %i groups into %i; %i groups combine jobs with different parameters.'
+              % (len(exact), len([v for v in jobs.values() if len(v) > 0]), len(consolidated)))
+
     if int(args.verbose) >= 1:
         print('\n', jobs.items())
 
 
+def run_daemon(args):
+    from job_combine import daemon  # imports this module
+    daemon.run(args)
+
+
+def run_server(args):
+    from job_combine import server  # imports this module
+    server.run(args)
+
+
 def clear(args):
-    os.remove(args.storage_file)
+    if shared_store is not None:
+        # the server keeps the storage file open, so the jobs are removed instead of the file
+        shared_store.remove([job.file for similar_jobs in list(shared_store.groups().values()) for job in similar_jobs])
+        shared_cache.clear()
+        print('Removed all stored jobs.')
+        return
+    lock = backends.direct_lock(args.storage_file)
+    if lock is not None:
+        lock.close()
+    for suffix in ('', '-journal', '.lock', '.cache', backends.SERVED_SUFFIX):
+        if path.exists(args.storage_file + suffix):
+            os.remove(args.storage_file + suffix)
     print('Deleted storage file.')
 
 
 def main():
-    read_args()
+    client.main()
 
 
 if __name__ == "__main__":
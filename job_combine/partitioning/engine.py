@@ -0,0 +1,137 @@
+"""Balanced partitioning of jobs into combined jobs considering time constraints"""
+import heapq
+from datetime import timedelta
+
+from job_combine.cluster import job as cjob
+
+# Kinds of constraint violations of a partitioning
+TOO_LONG = 'max_time'
+TOO_SHORT = 'min_time'
+
+
+def greedy(desc_jobs, n):
+    """
+    Distributes the jobs greedily into n partitions by always adding the next job to the partition with the smallest
+    total time. The running totals are kept in a min-heap, ties are resolved in favour of the first partition.
+    :param desc_jobs: Jobs sorted by descending time
+    :param n: Number of partitions
+    :return: Tuple of the list of partitions and the list of their total times
+    """
+    part = [[job] for job in desc_jobs[:n]]
+    totals = [job.seconds for job in desc_jobs[:n]]
+
+    heap = [(total, i) for i, total in enumerate(totals)]
+    heapq.heapify(heap)
+    for job in desc_jobs[n:]:
+        total, i = heap[0]
+        total += job.seconds
+        part[i].append(job)
+        totals[i] = total
+        heapq.heapreplace(heap, (total, i))
+
+    return part, [timedelta(seconds=total) for total in totals]
+
+
+def violation(totals, max_time, min_time):
+    """
+    Finds the first partition violating a time constraint
+    :param totals: Total times of the partitions
+    :param max_time: Maximum time of a partition
+    :param min_time: Minimum time of a partition
+    :return: TOO_LONG, TOO_SHORT or None if all constraints are fulfilled
+    """
+    for total in totals:
+        if total > max_time:
+            return TOO_LONG
+        elif total < min_time:
+            return TOO_SHORT
+    return None
+
+
+def search(jobs, max_time=timedelta.max, min_time=timedelta(), parallel=1, break_max=True, split=greedy, slots=1):
+    """
+    Searches the number of partitions closest to `parallel` that fulfills the time constraints.
+    The jobs are sorted once and the partition count is bisected between `parallel` and the bounds implied by the total
+    time of all jobs and the time constraints.
+    :param jobs: Jobs to partition
+    :param max_time: Maximum time of a partition
+    :param min_time: Minimum time of a partition
+    :param parallel: Targeted number of partitions
+    :param break_max: Break the max_time instead of the min_time constraint if not both can be fulfilled
+    :param split: Function splitting the descending jobs into n partitions, see `greedy`
+    :param slots: Number of jobs running concurrently in a partition; the time constraints apply to the time needed to
+    run the jobs of a partition in its order, starting every job as soon as a slot is free
+    :return: Tuple of the list of partitions and a list of warnings
+    """
+    desc_jobs = sorted(jobs, key=lambda x: x.seconds, reverse=True)
+    n_jobs = len(desc_jobs)
+    total = timedelta(seconds=sum(job.seconds for job in desc_jobs)) / slots
+    warnings = []
+    attempts = {}
+
+    def attempt(n):
+        if n not in attempts:
+            part, totals = split(desc_jobs, n)
+            if slots > 1:
+                totals = [cjob.slot_time(p, slots) for p in part]
+            attempts[n] = part, violation(totals, max_time, min_time)
+        return attempts[n]
+
+    def result(n, warning=None):
+        if warning is not None:
+            warnings.append(warning)
+        return attempt(n)[0], warnings
+
+    target = min(parallel, n_jobs)
+    v = attempt(target)[1]
+
+    if v == TOO_LONG:
+        # need more partitions; fewer than total / max_time partitions always contain a too long partition
+        lo = target + 1
+        hi = n_jobs
+        bound = min(-(-total // max_time), hi)
+        if bound > lo and attempt(bound - 1)[1] == TOO_LONG:
+            lo = bound
+        if attempt(hi)[1] == TOO_LONG:
+            return result(hi, 'Could not fulfill max_time = %s constraint as there exists a single script with a'
+                              ' longer time.' % max_time)
+        while lo < hi:  # smallest number of partitions not exceeding max_time
+            mid = (lo + hi) // 2
+            if attempt(mid)[1] == TOO_LONG:
+                lo = mid + 1
+            else:
+                hi = mid
+        if attempt(lo)[1] == TOO_SHORT:  # fluctuating around lo - 1 and lo
+            if break_max:
+                return result(lo - 1, 'Could not fulfill both time constraints simultaneously.'
+                                      ' Breaking the max_time = %s constraint.' % max_time)
+            return result(lo, 'Could not fulfill both time constraints simultaneously.'
+                              ' Breaking the min_time = %s constraint.' % min_time)
+        return result(lo)
+
+    if v == TOO_SHORT:
+        # need fewer partitions; more than total / min_time partitions always contain a too short partition
+        lo = 1
+        hi = target - 1
+        if target == 1 or attempt(lo)[1] == TOO_SHORT:
+            return result(lo, 'Could not fulfill min_time = %s constraint as there are not enough combinable scripts'
+                              ' to reach this time.' % min_time)
+        bound = max(total // min_time, lo)
+        if bound < hi and attempt(bound + 1)[1] == TOO_SHORT:
+            hi = bound
+        while lo < hi:  # largest number of partitions not falling below min_time
+            mid = (lo + hi + 1) // 2
+            if attempt(mid)[1] == TOO_SHORT:
+                hi = mid - 1
+            else:
+                lo = mid
+        if attempt(lo)[1] == TOO_LONG:  # fluctuating around lo and lo + 1
+            if break_max:
+                return result(lo, 'Could not fulfill both time constraints simultaneously.'
+                                  ' Breaking the max_time = %s constraint.' % max_time)
+            return result(lo + 1, 'Could not fulfill both time constraints simultaneously.'
+                                  ' Breaking the min_time = %s constraint.' % min_time)
+        return result(lo)
+
+    # constraint check successful
+    return result(target)
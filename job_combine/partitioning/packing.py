@@ -0,0 +1,191 @@
+"""
+Packing of jobs with different resource requests into larger allocations
+
+Jobs are packed as rectangles of cores x time with first fit decreasing height: sorted by time, every job is put on the
+first shelf with enough free cores on as many nodes as the job needs, the height of a shelf is the time of its longest
+job. The jobs of a shelf run at the same time as separate job steps, the shelves of an allocation one after another.
+"""
+import heapq
+import re
+from collections import namedtuple
+
+from job_combine.cluster.managers import managers
+
+Resources = namedtuple('Resources', 'nodes tasks cpus')
+
+_number = re.compile(r'\d+')
+
+
+def supports_packing(manager):
+    """Whether jobs of the workload manager can be packed; the manager needs resource args, a resource step and a step
+    rank variable"""
+    return None not in (manager.resource_args, manager.resource_step, manager.step_rank_var)
+
+
+def _resource_of(manager, key, arg_index):
+    for resource, args in manager.resource_args.items():
+        if args[arg_index] == key:
+            return resource
+    return None
+
+
+def resources(job):
+    """
+    Resources requested by a job; missing resources default to 1. Without a number of tasks, the tasks per node times
+    the nodes are used.
+    :param job: Job of a workload manager supporting packing
+    :return: Resources
+    """
+    m = managers[job.manager_name]
+    values = {}
+    for key, arg_index, value in job.params:
+        resource = _resource_of(m, key, arg_index)
+        if resource is not None:
+            # the minimum of a range like `--nodes=2-4`
+            match = _number.match(value or '')
+            if match is None:
+                raise ValueError('Can not pack %s: invalid number of %s `%s`' % (job.file, resource, value))
+            values[resource] = int(match.group())
+    if 'tasks' not in values and 'tasks_per_node' in values:
+        values['tasks'] = values['tasks_per_node'] * values.get('nodes', 1)
+    return Resources(*(values.get(resource, 1) for resource in Resources._fields))
+
+
+def cores(r):
+    """Cores used by a job with the given resources; every node runs at least one task"""
+    return max(r.tasks * r.cpus, r.nodes)
+
+
+def node_cores(r):
+    """Cores a job with the given resources needs on each of its nodes if its tasks are distributed evenly"""
+    return max(-(-r.tasks // r.nodes), 1) * r.cpus
+
+
+def step_values(r):
+    """
+    Values of the resource step of a job: a task on each of its nodes with the cores the job needs on the node
+    :param r: Resources of the job
+    :return: Dictionary of the number of nodes and the cores per node
+    """
+    return {'nodes': r.nodes, 'cores': node_cores(r)}
+
+
+def pack_key(job):
+    """
+    Key of the jobs that can be packed together; like `Job.key` but without the resource params
+    :param job: Job
+    :return: Tuple of manager name and params
+    """
+    m = managers[job.manager_name]
+    return job.manager_name, tuple(p for p in job.params if _resource_of(m, p[0], p[1]) is None)
+
+
+class Shelf(object):
+
+    def __init__(self, nodes, cores_per_node, seconds):
+        self.jobs = []
+        self.free = [cores_per_node] * nodes  # free cores by node
+        self.seconds = seconds
+
+    def place(self, job, nodes, cores_per_node):
+        """
+        Puts a job on the nodes with the fewest free cores that still fit it, so the job steps never wait for each other
+        :param job: Job
+        :param nodes: Number of nodes the job needs
+        :param cores_per_node: Cores the job needs on each of its nodes
+        :return: True if the job was put on the shelf
+        """
+        fitting = sorted((free, i) for i, free in enumerate(self.free) if free >= cores_per_node)
+        if len(fitting) < nodes:
+            return False
+        for _, i in fitting[:nodes]:
+            self.free[i] -= cores_per_node
+        self.jobs.append(job)
+        return True
+
+
+def shelves(jobs, nodes, cores_per_node, demand):
+    """
+    Packs jobs into shelves with first fit decreasing height
+    :param jobs: Jobs; none may need more than `nodes` nodes or `cores_per_node` cores on a node
+    :param nodes: Nodes of the allocation
+    :param cores_per_node: Cores of a node
+    :param demand: Dictionary of the nodes and the cores per node needed by job file
+    :return: List of shelves in decreasing height
+    """
+    result = []
+    for job in sorted(jobs, key=lambda j: (-j.seconds, j.file)):
+        need = demand[job.file]
+        if not any(shelf.place(job, *need) for shelf in result):
+            shelf = Shelf(nodes, cores_per_node, job.seconds)
+            shelf.place(job, *need)
+            result.append(shelf)
+    return result
+
+
+def allocate(shelf_list, max_seconds=None, parallel=1):
+    """
+    Distributes shelves to allocations
+    :param shelf_list: Shelves in decreasing height
+    :param max_seconds: Time limit of an allocation; first fit decreasing is used to get the fewest allocations. A
+    shelf exceeding the limit gets its own allocation.
+    :param parallel: Number of allocations if there is no time limit; the shelves are balanced with longest processing
+    time first
+    :return: List of allocations, each a list of shelves
+    """
+    if max_seconds is None:
+        allocations = [[] for _ in range(min(parallel, len(shelf_list)))]
+        heap = [(0, i) for i in range(len(allocations))]
+        for shelf in shelf_list:
+            total, i = heapq.heappop(heap)
+            allocations[i].append(shelf)
+            heapq.heappush(heap, (total + shelf.seconds, i))
+        return allocations
+
+    allocations = []
+    totals = []
+    for shelf in shelf_list:
+        for i, total in enumerate(totals):
+            if total + shelf.seconds <= max_seconds:
+                allocations[i].append(shelf)
+                totals[i] += shelf.seconds
+                break
+        else:
+            allocations.append([shelf])
+            totals.append(shelf.seconds)
+    return allocations
+
+
+class Packing(object):
+
+    def __init__(self, jobs, nodes=None, cores_per_node=None, max_seconds=None, parallel=1):
+        """
+        Packs jobs with different resources into allocations of the same size
+        :param jobs: Jobs with the same pack key
+        :param nodes: Nodes of an allocation; at least the nodes of the largest job, which is the default
+        :param cores_per_node: Cores of a node; defaults to the most cores a job uses per node
+        :param max_seconds: Time limit of an allocation; None for no limit
+        :param parallel: Number of allocations if there is no time limit
+        """
+        self.resources = dict((job.file, resources(job)) for job in jobs)
+        largest = max(r.nodes for r in self.resources.values())
+        if nodes is not None and nodes < largest:
+            print('WARNING: Jobs need up to %i nodes; packing into allocations of %i nodes.' % (largest, largest))
+        self.nodes = max(nodes or 0, largest)
+        demand = dict((file, (r.nodes, node_cores(r))) for file, r in self.resources.items())
+        self.cores_per_node = cores_per_node or max(need for _, need in demand.values())
+        too_large = [file for file, (_, need) in demand.items() if need > self.cores_per_node]
+        if len(too_large) > 0:
+            raise ValueError('%i jobs need more cores per node than %i, e.g. %s'
+                             % (len(too_large), self.cores_per_node, too_large[0]))
+
+        self.allocations = allocate(shelves(jobs, self.nodes, self.cores_per_node, demand), max_seconds, parallel)
+        self.used = sum(cores(self.resources[job.file]) * job.seconds for job in jobs)
+
+    def capacity(self):
+        """Core seconds of the allocations"""
+        return sum(self.nodes * self.cores_per_node * shelf.seconds for a in self.allocations for shelf in a)
+
+    def separate_capacity(self, jobs):
+        """Core seconds the jobs would allocate when submitted with their own resources, charged by whole nodes"""
+        return sum(self.resources[job.file].nodes * self.cores_per_node * job.seconds for job in jobs)
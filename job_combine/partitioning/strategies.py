@@ -0,0 +1,279 @@
+"""Partitioning strategies that can be plugged into the partitioning engine"""
+import heapq
+import time
+from bisect import bisect_left
+from datetime import timedelta
+from operator import itemgetter
+
+from job_combine.partitioning import engine
+
+
+def _ticks(td):
+    """Converts a time delta to an integer number of microseconds"""
+    return (td.days * 86400 + td.seconds) * 1000000 + td.microseconds
+
+
+def _expired(deadline):
+    return deadline is not None and time.time() >= deadline
+
+
+def _totals(part):
+    return [sum((job.time for job in p), timedelta()) for p in part]
+
+
+def lower_bound(jobs, n):
+    """
+    Lower bound for the makespan of any partitioning of the jobs into n partitions
+    :param jobs: Jobs to partition
+    :param n: Number of partitions
+    :return: Lower bound as time delta
+    """
+    if len(jobs) == 0 or n == 0:
+        return timedelta()
+    total = sum((job.time for job in jobs), timedelta())
+    return max(max(job.time for job in jobs), total / n)
+
+
+def greedy(desc_jobs, n, deadline=None):
+    """Longest processing time first; see `engine.greedy`"""
+    return engine.greedy(desc_jobs, n)
+
+
+def karmarkar_karp(desc_jobs, n, deadline=None):
+    """
+    Multi-way Karmarkar-Karp largest differencing method. Every job starts as an n-tuple of subsets; the two tuples with
+    the largest spread are merged repeatedly by combining the largest subset of one with the smallest of the other.
+    Falls back to the greedy result if the deadline expires or if it is better.
+    """
+    g_part, g_totals = engine.greedy(desc_jobs, n)
+    if n <= 1 or len(desc_jobs) <= n or _expired(deadline):
+        return g_part, g_totals
+
+    # subsets are (sum, nested tuple of jobs) sorted by descending sum, missing subsets are empty
+    heap = [(-_ticks(job.time), i, [(_ticks(job.time), job)]) for i, job in enumerate(desc_jobs)]
+    heapq.heapify(heap)
+
+    while len(heap) > 1:
+        if _expired(deadline):
+            return g_part, g_totals
+        _, i, a = heapq.heappop(heap)
+        _, _, b = heapq.heappop(heap)
+        if len(a) + len(b) <= n:
+            merged = a + b  # every non-empty subset is combined with an empty one
+        else:
+            a = a + [(0, ())] * (n - len(a))
+            b = [(0, ())] * (n - len(b)) + b[::-1]
+            merged = [(sa + sb, (ja, jb)) for (sa, ja), (sb, jb) in zip(a, b)]
+        merged.sort(key=itemgetter(0), reverse=True)
+        smallest = merged[-1][0] if len(merged) == n else 0
+        heapq.heappush(heap, (smallest - merged[0][0], i, merged))
+
+    part = [[] for _ in range(n - len(heap[0][2]))]
+    for _, nested in heap[0][2]:
+        jobs = []
+        stack = [nested]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, tuple):
+                stack.extend(reversed(item))
+            else:
+                jobs.append(item)
+        part.append(sorted(jobs, key=lambda x: x.time, reverse=True))
+
+    totals = _totals(part)
+    if max(totals) < max(g_totals):
+        return part, totals
+    return g_part, g_totals
+
+
+def complete_greedy(desc_jobs, n, deadline=None):
+    """
+    Complete greedy algorithm: depth-first branch and bound over all assignments of the descending jobs, trying the
+    partition with the smallest total first. Starts from the greedy result and returns the best partitioning found when
+    it is proven optimal, reaches the lower bound or the deadline expires.
+    """
+    part, totals = engine.greedy(desc_jobs, n)
+    times = [_ticks(job.time) for job in desc_jobs]
+    m = len(times)
+    best = _ticks(max(totals)) if totals else 0
+    bound = _ticks(lower_bound(desc_jobs, n))
+    if n <= 1 or m <= n or best <= bound or _expired(deadline):
+        return part, totals
+
+    sums = [0] * n
+    assign = [-1] * m
+    best_assign = None
+    cands = [None] * m
+    pos = [0] * m
+
+    def candidates(d):
+        # partitions by ascending total; partitions with equal totals are symmetric and tried once
+        result = []
+        seen = set()
+        for p in sorted(range(n), key=sums.__getitem__):
+            s = sums[p]
+            if s + times[d] >= best:
+                break
+            if s not in seen:
+                seen.add(s)
+                result.append(p)
+        return result
+
+    steps = 0
+    d = 0
+    cands[0] = candidates(0)
+    while d >= 0:
+        steps += 1
+        if steps % 1024 == 0 and _expired(deadline):
+            break
+        if assign[d] >= 0:
+            sums[assign[d]] -= times[d]
+            assign[d] = -1
+        if pos[d] == len(cands[d]):
+            d -= 1
+            continue
+        p = cands[d][pos[d]]
+        pos[d] += 1
+        sums[p] += times[d]
+        assign[d] = p
+        if d == m - 1:
+            makespan = max(sums)
+            if makespan < best:
+                best = makespan
+                best_assign = assign[:]
+                if best <= bound:
+                    break
+            continue
+        d += 1
+        cands[d] = candidates(d)
+        pos[d] = 0
+
+    if best_assign is None:
+        return part, totals
+
+    part = [[] for _ in range(n)]
+    for job, p in zip(desc_jobs, best_assign):
+        part[p].append(job)
+    return part, _totals(part)
+
+
+def local_search(desc_jobs, n, deadline=None, part=None):
+    """
+    Improves a partitioning by moving single jobs out of or swapping jobs with the partition with the largest total,
+    as long as this narrows the gap between the two partitions involved. Starts from the greedy result if no
+    partitioning is given.
+    """
+    if part is None:
+        part, _ = engine.greedy(desc_jobs, n)
+    if n <= 1:
+        return part, _totals(part)
+
+    # partitions as ascending lists of times and the matching jobs
+    times = []
+    items = []
+    for p in part:
+        pairs = sorted(((_ticks(job.time), i, job) for i, job in enumerate(p)), key=itemgetter(0, 1))
+        times.append([t for t, _, _ in pairs])
+        items.append([job for _, _, job in pairs])
+    sums = [sum(t) for t in times]
+
+    def take(p, k):
+        t = times[p].pop(k)
+        sums[p] -= t
+        return t, items[p].pop(k)
+
+    def put(p, t, job):
+        k = bisect_left(times[p], t)
+        times[p].insert(k, t)
+        items[p].insert(k, job)
+        sums[p] += t
+
+    def closest(sorted_times, target):
+        k = bisect_left(sorted_times, target)
+        return [i for i in (k - 1, k) if 0 <= i < len(sorted_times)]
+
+    while not _expired(deadline):
+        p = max(range(n), key=sums.__getitem__)
+        improvement = None
+        for q in sorted(range(n), key=sums.__getitem__):
+            gap = sums[p] - sums[q]
+            if gap <= 0:
+                break
+            half = gap / 2.0
+            best = None  # (distance of the transferred time to half the gap, index in p, index in q or None)
+            for k in closest(times[p], half):
+                d = times[p][k]
+                if 0 < d < gap and (best is None or abs(d - half) < best[0]):
+                    best = (abs(d - half), k, None)
+            for k, a in enumerate(times[p]):
+                for l in closest(times[q], a - half):
+                    d = a - times[q][l]
+                    if 0 < d < gap and (best is None or abs(d - half) < best[0]):
+                        best = (abs(d - half), k, l)
+            if best is not None:
+                improvement = q, best[1], best[2]
+                break
+        if improvement is None:
+            break
+        q, k, l = improvement
+        if l is None:
+            put(q, *take(p, k))
+        else:
+            a = take(p, k)
+            put(p, *take(q, l))
+            put(q, *a)
+
+    part = [list(reversed(p)) for p in items]
+    return part, _totals(part)
+
+
+strategies = {
+    'greedy': greedy,
+    'karmarkar-karp': karmarkar_karp,
+    'complete-greedy': complete_greedy,
+    'local-search': local_search,
+}
+# strategies whose result is improved by the local search in the remaining time; greedy stays the plain baseline
+REFINED = ['karmarkar-karp', 'complete-greedy']
+
+
+def splitter(name, budget=None, n_jobs=1):
+    """
+    Creates a split function for `engine.search` using the named strategy. The wall-clock budget is shared by all
+    partition counts probed by the search, each probe getting a fair share of the remaining budget. The result of a
+    strategy in `REFINED` is passed on to `local_search` if its share of the budget is not used up.
+    :param name: Name of the strategy
+    :param budget: Wall-clock budget in seconds or None for no limit
+    :param n_jobs: Number of jobs to partition, used to estimate the number of probes
+    :return: Split function
+    """
+    try:
+        strategy = strategies[name]
+    except KeyError:
+        raise ValueError('Partitioning strategy not supported: %s' % name)
+
+    refine = name in REFINED
+
+    def run(desc_jobs, n, deadline=None):
+        part, totals = strategy(desc_jobs, n, deadline)
+        if refine and not _expired(deadline):
+            part, totals = local_search(desc_jobs, n, deadline, part)
+        return part, totals
+
+    if budget is None:
+        return run
+
+    end = time.time() + budget
+    probes = [n_jobs.bit_length() + 2]
+
+    def split(desc_jobs, n):
+        now = time.time()
+        deadline = now + max(end - now, 0) / probes[0]
+        probes[0] = max(probes[0] - 1, 1)
+        return run(desc_jobs, n, deadline)
+
+    return split
+
+
+def available_strategies():
+    return sorted(strategies.keys())
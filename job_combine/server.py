@@ -0,0 +1,237 @@
+"""
+Server keeping the stored jobs in memory for the invocations of the command line interface
+
+`serve` loads the storage file once and listens on a Unix domain socket next to it. The modes using the stored jobs are
+sent there by `client` and run on the jobs in memory in the working directory and environment of the invocation, one
+invocation at a time. Changes are written behind: the store is written every `--flush-interval` seconds and when the
+server stops, so the changes of the last seconds are lost if the server is killed. Invocations with another storage
+file, backend or equivalence rules and invocations with `--no-server` use the storage file directly; the server holds
+a lock on the storage file, so they may read it but changing it is refused.
+"""
+from __future__ import absolute_import, division, print_function
+
+import errno
+import fcntl
+import io
+import os
+import select
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+
+from job_combine import client, job_combine as cli
+from job_combine.cluster import cache
+from job_combine.storage import backends
+from job_combine.utils import paths
+
+REQUEST_TIMEOUT = 30  # seconds a client may take to send its command line
+
+
+class Stream(object):
+    """Output stream sending everything written to it to the client"""
+
+    def __init__(self, sock, name):
+        self.sock = sock
+        self.name = name
+        self._lock = threading.Lock()  # also written by the dispatch threads
+
+    def write(self, text):
+        if len(text) > 0:
+            with self._lock:
+                client.send(self.sock, {self.name: text})
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
+
+
+class Server(object):
+
+    def __init__(self, args):
+        """
+        Loads the stored jobs
+        :param args: Parsed arguments of the `serve` mode
+        """
+        self.args = args
+        self.socket_file = paths.abs_path(args.socket or args.storage_file + '.sock')
+        self.store = backends.WriteBehindStore(backends.open_store(args.storage_file, args.backend))
+        self.cache = cache.ParseCache(args.storage_file + '.cache', args.cache_size)
+        self.equivalence = None if args.equivalence is None else paths.abs_path(args.equivalence)
+        self.served = (cli.add, cli.remove, cli.remove_completed, cli.status, cli.queue, cli.clear)
+        self.parser = cli.build_parser()
+        self.next_flush = None
+        self.stopped = False
+
+    def stop(self, signum=None, frame=None):
+        self.stopped = True
+
+    def flush(self):
+        """Writes the changes of the stored jobs"""
+        written = self.store.flush()
+        self.next_flush = None
+        if int(self.args.verbose) >= 1 and written > 0:
+            print('Wrote %i changed jobs to %s.' % (written, self.store.file))
+
+    def fallback(self, mode):
+        """
+        :param mode: Parsed command line of an invocation
+        :return: Reason the invocation has to be run directly or None if it is run by the server
+        """
+        if getattr(mode, 'func', None) not in self.served:
+            return 'mode is not served'
+        if paths.abs_path(mode.storage_file) != self.store.file or mode.backend != self.args.backend:
+            return 'served storage file is %s with the %s backend' % (self.store.file, self.args.backend)
+        equivalence = None if mode.equivalence is None else paths.abs_path(mode.equivalence)
+        if equivalence != self.equivalence:
+            return 'served equivalence rules are %s' % self.equivalence
+        return None
+
+    def handle(self, sock):
+        """
+        Runs the command line of an invocation
+        :param sock: Connected socket
+        """
+        reader = sock.makefile('rb')
+        sock.settimeout(REQUEST_TIMEOUT)
+        request = client.receive(reader)
+        if request is None:
+            return
+        sock.settimeout(None)
+        cwd = os.getcwd()
+        env = dict(os.environ)
+        streams = sys.stdin, sys.stdout, sys.stderr
+        sys.stdout, sys.stderr = Stream(sock, 'out'), Stream(sock, 'err')
+        status = 0
+        try:
+            os.chdir(request['cwd'])
+            os.environ.clear()
+            os.environ.update(request['env'])
+            try:
+                mode = self.parser.parse_args(request['argv'])
+            except SystemExit as e:  # usage error or help
+                status = e.code or 0
+            else:
+                reason = self.fallback(mode)
+                if reason is not None:
+                    client.send(sock, {'fallback': reason})
+                    return
+                if getattr(mode, 'from_file', None) == '-':
+                    client.send(sock, {'stdin': True})
+                    sys.stdin = io.StringIO(client.receive(reader)['stdin'])
+                self.cache.hits = self.cache.misses = 0
+                try:
+                    cli.run(mode)
+                except SystemExit as e:
+                    status = e.code or 0
+                except Exception:
+                    traceback.print_exc()
+                    status = 1
+                if self.store.pending() > 0 and self.next_flush is None:
+                    self.next_flush = time.time() + self.args.flush_interval
+            client.send(sock, {'exit': status})
+        finally:
+            sys.stdin, sys.stdout, sys.stderr = streams
+            os.environ.clear()
+            os.environ.update(env)
+            os.chdir(cwd)
+
+    def listen(self):
+        """
+        Creates the socket; only the user running the server may connect to it
+        :return: Listening socket
+        """
+        if os.path.exists(self.socket_file):
+            os.remove(self.socket_file)  # left behind by a server that was killed
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        umask = os.umask(0o077)
+        try:
+            sock.bind(self.socket_file)
+        finally:
+            os.umask(umask)
+        sock.listen(16)
+        return sock
+
+    def wait(self, fds):
+        """
+        Waits until a client connects, the server is stopped or the changes have to be written
+        :param fds: File descriptors of the socket and the wakeup pipe
+        :return: True if a client is connecting
+        """
+        timeout = None if self.next_flush is None else max(0, self.next_flush - time.time())
+        try:
+            readable = select.select(fds, [], [], timeout)[0]
+        except (select.error, OSError) as e:  # interrupted by a signal on python 2
+            if getattr(e, 'errno', e.args[0]) != errno.EINTR:
+                raise
+            return False
+        if fds[1] in readable:
+            try:
+                os.read(fds[1], 512)
+            except OSError:
+                pass
+        return fds[0] in readable
+
+    def run(self):
+        """Serves invocations until the server is stopped"""
+        n_jobs = sum(len(v) for v in self.store.groups().values())
+        handlers = dict((signum, signal.signal(signum, self.stop)) for signum in (signal.SIGTERM, signal.SIGINT))
+        # signals interrupt waiting for clients
+        wake_r, wake_w = os.pipe()
+        for fd in (wake_r, wake_w):
+            fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+        signal.set_wakeup_fd(wake_w)
+        listener = self.listen()
+        cli.shared_store, cli.shared_cache = self.store, self.cache
+        try:
+            print('Serving %i stored jobs of %s on %s.' % (n_jobs, self.store.file, self.socket_file))
+            sys.stdout.flush()
+            while not self.stopped:
+                if self.wait([listener.fileno(), wake_r]):
+                    sock = listener.accept()[0]
+                    try:
+                        self.handle(sock)
+                    except (IOError, OSError, ValueError) as e:  # the client went away
+                        print('WARNING: Invocation aborted: %s' % e)
+                    finally:
+                        sock.close()
+                    if self.args.flush_interval <= 0:
+                        self.flush()
+                if self.next_flush is not None and time.time() >= self.next_flush:
+                    self.flush()
+        finally:
+            listener.close()
+            os.remove(self.socket_file)
+            signal.set_wakeup_fd(-1)
+            os.close(wake_r)
+            os.close(wake_w)
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+            cli.shared_store = cli.shared_cache = None
+            self.store.shutdown()
+            self.cache.close()
+        print('Stopped serving %s.' % self.store.file)
+
+
+def run(args):
+    """
+    Runs the server; only one server may use a socket at the same time
+    :param args: Parsed arguments of the `serve` mode
+    """
+    lock_file = paths.abs_path(args.socket or args.storage_file + '.sock') + '.lock'
+    with open(lock_file, 'a') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except (IOError, OSError):
+            raise RuntimeError('Another server is listening on %s' % lock_file[:-len('.lock')])
+        served = backends.serve_lock(args.storage_file)
+        try:
+            Server(args).run()
+        finally:
+            if served is not None:
+                served.close()
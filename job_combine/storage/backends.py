@@ -0,0 +1,415 @@
+"""Storage backends keeping the added jobs between invocations"""
+import os
+import pickle
+import sqlite3
+from collections import OrderedDict, defaultdict
+
+from job_combine.cluster.collection import JobCollection
+from job_combine.utils import paths
+
+try:
+    import fcntl
+except ImportError:  # not available on every platform; migration is then not guarded against concurrent access
+    fcntl = None
+
+SQLITE_HEADER = b'SQLite format 3\x00'
+PICKLE_PROTOCOL = 2  # Highest protocol supported by all python versions >= 2.3
+SERVED_SUFFIX = '.served'  # lock file of a storage file kept in memory by a server
+
+
+def is_sqlite(file):
+    """
+    Checks whether a file is an SQLite database
+    :param file: Path to the file
+    :return: True if the file starts with the SQLite header
+    """
+    try:
+        with open(file, 'rb') as f:
+            return f.read(len(SQLITE_HEADER)) == SQLITE_HEADER
+    except (IOError, OSError):
+        return False
+
+
+def path_has_data(file):
+    return os.path.isfile(file) and os.path.getsize(file) > 0
+
+
+def load(file):
+    """
+    Loads the jobs of a pickle storage file
+    :param file: Path to the storage file
+    :return: Dictionary of job lists by job key
+    """
+    with open(paths.abs_path(file), 'ab+') as f:
+        try:
+            f.seek(0)
+            return pickle.load(f)
+        except EOFError:
+            return defaultdict(list)
+
+
+def serve_lock(file):
+    """
+    Locks a storage file for a server keeping its jobs in memory; direct changes are refused until the lock is closed
+    :param file: Path to the storage file
+    :return: Open lock file or None if locking is not supported
+    """
+    if fcntl is None:
+        return None
+    lock = open(paths.abs_path(file) + SERVED_SUFFIX, 'a')
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except (IOError, OSError):
+        lock.close()
+        raise RuntimeError('`%s` is already served or changed directly by another process' % file)
+    return lock
+
+
+def direct_lock(file):
+    """
+    Locks a storage file against servers while it is changed directly. A server would overwrite the changes with the
+    jobs it keeps in memory or never see them.
+    :param file: Path to the storage file
+    :return: Open lock file or None if locking is not supported
+    """
+    if fcntl is None:
+        return None
+    lock = open(paths.abs_path(file) + SERVED_SUFFIX, 'a')
+    try:
+        fcntl.flock(lock, fcntl.LOCK_SH | fcntl.LOCK_NB)
+    except (IOError, OSError):
+        lock.close()
+        raise RuntimeError('`%s` is kept in memory by `job-combine serve`; run the mode through the server with the'
+                           ' same storage file, backend and equivalence rules, or stop the server to change it'
+                           ' directly' % file)
+    return lock
+
+
+def store(file, dic):
+    """
+    Writes the jobs to a pickle storage file
+    :param file: Path to the storage file
+    :param dic: Dictionary of job lists by job key
+    """
+    with open(paths.abs_path(file), 'wb+') as f:
+        pickle.dump(dic, f, protocol=PICKLE_PROTOCOL)
+
+
+class Store(object):
+    """Base class of the storage backends; changes become persistent with `commit`"""
+
+    def __init__(self, file):
+        self.file = paths.abs_path(file)
+        self.lock = None  # lock file released when the store is closed by `with`
+        self._groups = None
+        self._keys = None  # job key by job file
+
+    def groups(self):
+        """
+        Returns the stored jobs grouped by their key. The result is loaded once and kept up to date by the store.
+        :return: Dictionary of job collections by job key
+        """
+        if self._groups is None:
+            self._groups = defaultdict(JobCollection)
+            self._keys = {}
+            for job in self._load():
+                self._put(job)
+        return self._groups
+
+    def add(self, jobs):
+        """
+        Adds jobs to the store; a job whose file is already stored replaces the stored one
+        :param jobs: Iterable of jobs
+        """
+        raise NotImplementedError
+
+    def remove(self, files):
+        """
+        Removes jobs from the store
+        :param files: Iterable of absolute paths to the job files
+        :return: Number of jobs that were stored and got removed
+        """
+        raise NotImplementedError
+
+    def update(self, jobs):
+        """
+        Persists changes to the attributes of stored jobs
+        :param jobs: Iterable of jobs
+        """
+        raise NotImplementedError
+
+    def commit(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def _load(self):
+        raise NotImplementedError
+
+    def _put(self, job):
+        groups = self.groups()
+        key = job.key()
+        if self._keys.get(job.file, key) != key:  # stored with different parameters
+            self._forget(job.file)
+        groups[key].append(job)
+        self._keys[job.file] = key
+
+    def _forget(self, file):
+        key = self._keys.pop(file, None)
+        if key is None:
+            return False
+        group = self._groups[key]
+        group.discard(file)
+        if len(group) == 0:
+            del self._groups[key]
+        return True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        try:
+            if exc_type is None:
+                self.commit()
+        finally:
+            try:
+                self.close()
+            finally:
+                if self.lock is not None:
+                    self.lock.close()
+
+
+class PickleStore(Store):
+    """Keeps all jobs in a single pickle file that is rewritten on every commit"""
+
+    def __init__(self, file):
+        super(PickleStore, self).__init__(file)
+        if is_sqlite(self.file):
+            raise ValueError('`%s` is an SQLite storage file; select the sqlite backend to use it' % file)
+        self._dirty = False
+
+    def _load(self):
+        for group in load(self.file).values():
+            for job in group:
+                yield job
+
+    def add(self, jobs):
+        for job in jobs:
+            self._put(job)
+            self._dirty = True
+
+    def remove(self, files):
+        self.groups()
+        removed = 0
+        for file in files:
+            if self._forget(file):
+                removed += 1
+                self._dirty = True
+        return removed
+
+    def update(self, jobs):
+        self._dirty = True  # the stored jobs are the ones modified
+
+    def commit(self):
+        if self._dirty:
+            store(self.file, self.groups())
+            self._dirty = False
+
+
+class SqliteStore(Store):
+    """
+    Keeps the jobs in an SQLite database indexed by file path. Writers lock the database for the duration
+    of their transaction, so concurrent invocations do not lose jobs. Pickle storage files are migrated on first use.
+    """
+
+    timeout = 60  # seconds to wait for other writers
+
+    def __init__(self, file):
+        super(SqliteStore, self).__init__(file)
+        self._migrate()
+        self._db = self._connect(self.file)
+
+    @staticmethod
+    def _connect(file):
+        db = sqlite3.connect(file, timeout=SqliteStore.timeout, isolation_level=None)
+        db.execute('CREATE TABLE IF NOT EXISTS jobs (seq INTEGER PRIMARY KEY AUTOINCREMENT, file TEXT NOT NULL UNIQUE,'
+                   ' data BLOB NOT NULL)')
+        return db
+
+    def _migrate(self):
+        if not path_has_data(self.file) or is_sqlite(self.file):
+            return
+        lock = self._lock()
+        try:
+            if is_sqlite(self.file):  # migrated concurrently
+                return
+            migrating = self.file + '.migrating'
+            if os.path.exists(migrating):
+                os.remove(migrating)
+            db = self._connect(migrating)
+            try:
+                db.execute('BEGIN IMMEDIATE')
+                for group in load(self.file).values():
+                    self._insert(db, group)
+                db.execute('COMMIT')
+            finally:
+                db.close()
+            os.rename(self.file, self.file + '.pickle')
+            os.rename(migrating, self.file)
+            print('Migrated pickle storage file to SQLite; the original was kept as %s.pickle' % self.file)
+        finally:
+            self._unlock(lock)
+
+    def _lock(self):
+        if fcntl is None:
+            return None
+        lock = open(self.file + '.lock', 'a')
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        return lock
+
+    @staticmethod
+    def _unlock(lock):
+        if lock is not None:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+            lock.close()
+
+    @staticmethod
+    def _insert(db, jobs):
+        for job in jobs:
+            data = sqlite3.Binary(pickle.dumps(job, PICKLE_PROTOCOL))
+            cursor = db.execute('UPDATE jobs SET data = ? WHERE file = ?', (data, job.file))
+            if cursor.rowcount == 0:
+                db.execute('INSERT INTO jobs (file, data) VALUES (?, ?)', (job.file, data))
+
+    def _begin(self):
+        if not self._db.in_transaction:
+            self._db.execute('BEGIN IMMEDIATE')
+
+    def _load(self):
+        for data, in self._db.execute('SELECT data FROM jobs ORDER BY seq'):
+            yield pickle.loads(bytes(data))
+
+    def add(self, jobs):
+        jobs = list(jobs)
+        self._begin()
+        self._insert(self._db, jobs)
+        if self._groups is not None:
+            for job in jobs:
+                self._put(job)
+
+    def remove(self, files):
+        self._begin()
+        removed = 0
+        for file in files:
+            removed += self._db.execute('DELETE FROM jobs WHERE file = ?', (file,)).rowcount
+            if self._groups is not None:
+                self._forget(file)
+        return removed
+
+    def update(self, jobs):
+        self._begin()
+        self._insert(self._db, jobs)
+
+    def commit(self):
+        if self._db.in_transaction:
+            self._db.execute('COMMIT')
+
+    def close(self):
+        if self._db.in_transaction:
+            self._db.execute('ROLLBACK')
+        self._db.close()
+
+
+class WriteBehindStore(Store):
+    """
+    Keeps the jobs of another store in memory and writes the changes to it in a single transaction on `flush`. Used by
+    a long running process: `commit` and `close` of a mode do not write anything, so the changes since the last flush
+    are lost if the process is killed.
+    """
+
+    def __init__(self, store):
+        """
+        :param store: Store the jobs are loaded from and written to
+        """
+        super(WriteBehindStore, self).__init__(store.file)
+        self.store = store
+        self._added = OrderedDict()  # job by file; added or updated since the last flush
+        self._removed = set()
+
+    def _load(self):
+        return self.store._load()
+
+    def pending(self):
+        """
+        :return: Number of changed jobs that were not written yet
+        """
+        return len(self._added) + len(self._removed)
+
+    def add(self, jobs):
+        for job in jobs:
+            self._put(job)
+            self._removed.discard(job.file)
+            self._added[job.file] = job
+
+    def remove(self, files):
+        self.groups()
+        removed = 0
+        for file in files:
+            if self._forget(file):
+                removed += 1
+                self._added.pop(file, None)
+                self._removed.add(file)
+        return removed
+
+    def update(self, jobs):
+        for job in jobs:
+            self._added[job.file] = job
+
+    def commit(self):
+        pass
+
+    def flush(self):
+        """
+        Writes the changes to the store
+        :return: Number of changed jobs written
+        """
+        changed = self.pending()
+        if changed > 0:
+            self.store.remove(sorted(self._removed))
+            self.store.add(list(self._added.values()))
+            self.store.commit()
+            self._added.clear()
+            self._removed.clear()
+        return changed
+
+    def shutdown(self):
+        """Writes the changes and closes the store"""
+        try:
+            self.flush()
+        finally:
+            self.store.close()
+
+
+backends = {
+    'sqlite': SqliteStore,
+    'pickle': PickleStore,
+}
+
+
+def open_store(file, backend='sqlite'):
+    """
+    Opens the storage file with the given backend
+    :param file: Path to the storage file
+    :param backend: Name of the backend
+    :return: Store object
+    """
+    try:
+        cls = backends[backend]
+    except KeyError:
+        raise ValueError('Storage backend not supported: %s' % backend)
+    return cls(file)
+
+
+def available_backends():
+    return sorted(backends.keys())
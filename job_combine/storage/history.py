@@ -0,0 +1,133 @@
+"""Run time history of executed jobs used to predict the time a job needs"""
+import math
+import re
+import sqlite3
+from datetime import timedelta
+from os import path
+
+from job_combine.cluster import ledger
+from job_combine.utils import paths
+
+_digits = re.compile(r'\d+')
+
+TIMEOUT_EXIT = -1  # exit status recorded for jobs that were terminated
+
+
+def pattern(name):
+    """
+    Normalizes a job name so that jobs of the same series, e.g. differing in a parameter value, share one pattern
+    :param name: Job name
+    :return: Name with every number replaced by '#'
+    """
+    return _digits.sub('#', name or '')
+
+
+def runs_of(records):
+    """
+    Converts ledger records to runs; records written by older versions do not contain run times and are skipped
+    :param records: Ledger records
+    :return: List of (job file, start, end, exit status); timed out jobs have the exit status TIMEOUT_EXIT
+    """
+    return [(r.file, r.timestamp - r.elapsed, r.timestamp, TIMEOUT_EXIT if r.status == ledger.TIMEOUT else r.status)
+            for r in records if r.elapsed is not None]
+
+
+class History(object):
+    """
+    Keeps the start, end and exit status of the executed jobs in an SQLite database, indexed by job file and by the
+    pattern of the job name
+    """
+
+    timeout = 60  # seconds to wait for other writers
+
+    def __init__(self, file):
+        self.file = paths.abs_path(file)
+        self._db = sqlite3.connect(self.file, timeout=self.timeout, isolation_level=None)
+        self._db.execute('CREATE TABLE IF NOT EXISTS runs (file TEXT NOT NULL, pattern TEXT NOT NULL,'
+                         ' start INTEGER NOT NULL, elapsed INTEGER NOT NULL, exit INTEGER NOT NULL,'
+                         ' PRIMARY KEY (file, start))')
+        self._db.execute('CREATE INDEX IF NOT EXISTS runs_pattern ON runs (pattern)')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self._db.close()
+
+    def record(self, runs, names=None):
+        """
+        Adds runs to the history; runs already recorded are ignored
+        :param runs: Iterable of (job file, start, end, exit status)
+        :param names: Dictionary of job names by job file; jobs without a name use the name of their file
+        :return: Number of added runs
+        """
+        names = names or {}
+        rows = [(file, pattern(names.get(file) or path.basename(file)), start, end - start, exit_status)
+                for file, start, end, exit_status in runs]
+        self._db.execute('BEGIN IMMEDIATE')
+        try:
+            before = self._db.total_changes
+            self._db.executemany('INSERT OR IGNORE INTO runs VALUES (?, ?, ?, ?, ?)', rows)
+            added = self._db.total_changes - before
+            self._db.execute('COMMIT')
+        except BaseException:
+            self._db.execute('ROLLBACK')
+            raise
+        return added
+
+    def import_ledgers(self, directory, names=None):
+        """
+        Adds the runs recorded by the combined scripts below a directory
+        :param directory: Directory of the combined scripts
+        :param names: Dictionary of job names by job file
+        :return: Number of added runs
+        """
+        return self.record(runs_of(ledger.records(directory, previous=True)), names)
+
+    def elapsed(self, job, window=10, min_runs=3):
+        """
+        Elapsed seconds of the most recent successful runs of a job; runs of jobs with the same name pattern are used if
+        the job itself ran less than `min_runs` times
+        :param job: Job
+        :param window: Maximum number of runs
+        :param min_runs: Minimum number of runs of the job itself
+        :return: List of elapsed seconds, most recent first
+        """
+        rows = self._db.execute('SELECT elapsed FROM runs WHERE file = ? AND exit = 0 ORDER BY start DESC LIMIT ?',
+                                (job.file, window)).fetchall()
+        if len(rows) < min_runs:
+            rows = self._db.execute('SELECT elapsed FROM runs WHERE pattern = ? AND exit = 0 ORDER BY start DESC'
+                                    ' LIMIT ?', (pattern(job.name or path.basename(job.file)), window)).fetchall()
+        return [row[0] for row in rows]
+
+    def predict(self, job, method='mean', quantile=0.9, margin=0.2, window=10, min_runs=3):
+        """
+        Predicts the time a job needs from its history; the requested time of the job is an upper bound
+        :param job: Job
+        :param method: 'mean' for the moving average or 'quantile' for a quantile of the recent elapsed times
+        :param quantile: Quantile used by the 'quantile' method
+        :param margin: Safety margin added as a fraction of the prediction
+        :param window: Number of recent runs considered
+        :param min_runs: Minimum number of runs needed for a prediction
+        :return: Predicted time as timedelta or None if there are not enough runs
+        """
+        elapsed = self.elapsed(job, window, min_runs)
+        if len(elapsed) < min_runs:
+            return None
+        if method == 'mean':
+            seconds = sum(elapsed) / float(len(elapsed))
+        elif method == 'quantile':
+            ordered = sorted(elapsed)
+            seconds = ordered[max(0, int(math.ceil(quantile * len(ordered))) - 1)]
+        else:
+            raise ValueError('Prediction method not supported: %s' % method)
+        # round up to whole seconds so predictions of very short jobs are not zero
+        predicted = timedelta(seconds=int(seconds * (1 + margin)) + 1)
+        return min(predicted, job.time) if job.time > timedelta() else predicted
+
+
+def available_methods():
+    return ['mean', 'quantile']
@@ -0,0 +1,94 @@
+"""Manifest of the groups written by incremental `queue` runs; unchanged groups are not written again"""
+import hashlib
+import json
+import os
+from os import path
+
+from job_combine.utils import paths
+
+MANIFEST = 'manifest.json'  # name of the manifest in the directory of the combined scripts
+VERSION = 1
+
+
+def _sha1(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def group_id(key):
+    """
+    Identifies a group of combinable jobs independent of the order of the groups and of the run
+    :param key: Job key, see `Job.key`
+    :return: Name of the directory of the group
+    """
+    return 'g' + _sha1(repr(key))[:12]
+
+
+def content_hash(jobs, options):
+    """
+    Hashes everything that determines the combined scripts of a group
+    :param jobs: Jobs of the group
+    :param options: Values of the options affecting the combined scripts
+    :return: Hex digest
+    """
+    lines = sorted('%s\t%s\t%s\t%s\t%s\t%s' % (job.file, job.name, job.directory, job.seconds, job.stdout, job.stderr)
+                   for job in jobs)
+    return _sha1(repr(sorted(options.items())) + '\n' + '\n'.join(lines))
+
+
+class Manifest(object):
+
+    def __init__(self, directory):
+        """
+        Reads the manifest of a directory of combined scripts; a missing or outdated manifest is empty
+        :param directory: Directory of the combined scripts
+        """
+        self.file = path.join(directory, MANIFEST)
+        self.groups = {}  # group id -> {'hash': content hash, 'partitions': [[job file]], 'scripts': [script file]}
+        if path.exists(self.file):
+            with open(self.file) as f:
+                data = json.load(f)
+            if data.get('version') == VERSION:
+                self.groups = data['groups']
+
+    def unchanged(self, gid, digest):
+        """
+        Whether the scripts of a group were written for the same content and still exist
+        :param gid: Group id
+        :param digest: Content hash of the group
+        :return: True if the group can be skipped
+        """
+        entry = self.groups.get(gid)
+        return entry is not None and entry['hash'] == digest and all(path.exists(f) for f in entry['scripts'])
+
+    def update(self, gid, digest, partitions, scripts):
+        """
+        Records the scripts written for a group
+        :param gid: Group id
+        :param digest: Content hash of the group
+        :param partitions: Partitions of the jobs of the group
+        :param scripts: Files of the combined scripts
+        :return: Script files of the previous run of the group that were not written again
+        """
+        previous = self.groups.get(gid, {}).get('scripts', [])
+        self.groups[gid] = {'hash': digest, 'partitions': [[job.file for job in p] for p in partitions],
+                            'scripts': list(scripts)}
+        current = set(scripts)
+        return [f for f in previous if f not in current]
+
+    def retain(self, gids):
+        """
+        Forgets all groups but the given ones
+        :param gids: Ids of the current groups
+        :return: Script files of the forgotten groups
+        """
+        gids = set(gids)
+        stale = []
+        for gid in [gid for gid in self.groups if gid not in gids]:
+            stale += self.groups.pop(gid)['scripts']
+        return stale
+
+    def save(self):
+        if not path.isdir(path.dirname(self.file) or '.'):
+            os.makedirs(path.dirname(self.file))
+        data = {'version': VERSION, 'groups': self.groups}
+        paths.write_atomic(self.file, [json.dumps(data, indent=1, sort_keys=True)])
@@ -1 +1 @@
-__all__ = ['time_parser', 'paths']
+__all__ = ['metrics', 'names', 'paths', 'time_parser']
@@ -0,0 +1,139 @@
+"""Timers and counters of the phases of an invocation; recording is disabled unless `enable` was called"""
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+class _NoPhase(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+class NullRecorder(object):
+    """Recorder used while the metrics are disabled; every call returns immediately"""
+    enabled = False
+    _phase = _NoPhase()
+
+    def phase(self, name):
+        return self._phase
+
+    def count(self, name, n=1):
+        pass
+
+    def observe(self, name, value):
+        pass
+
+
+class _Phase(object):
+
+    def __init__(self, recorder, name):
+        self.recorder = recorder
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.recorder.add_duration(self.name, time.time() - self.start)
+        return False
+
+
+class Recorder(object):
+    """Records the durations of phases, counters and observed values like latencies"""
+    enabled = True
+
+    def __init__(self):
+        self.start = time.time()
+        self.phases = OrderedDict()  # name -> [total seconds, number of calls]
+        self.counters = OrderedDict()
+        self.observations = OrderedDict()
+        self._lock = threading.Lock()  # counters and observations are also recorded by worker threads
+
+    def phase(self, name):
+        """
+        Measures the duration of a phase; repeated phases of the same name are summed up
+        :param name: Name of the phase
+        :return: Context manager
+        """
+        return _Phase(self, name)
+
+    def add_duration(self, name, seconds):
+        with self._lock:
+            entry = self.phases.setdefault(name, [0.0, 0])
+            entry[0] += seconds
+            entry[1] += 1
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, name, value):
+        with self._lock:
+            self.observations.setdefault(name, []).append(value)
+
+    def to_dict(self):
+        observations = OrderedDict()
+        for name, values in self.observations.items():
+            ordered = sorted(values)
+            observations[name] = OrderedDict([
+                ('count', len(ordered)),
+                ('min', ordered[0]),
+                ('mean', sum(ordered) / float(len(ordered))),
+                ('median', ordered[len(ordered) // 2]),
+                ('max', ordered[-1]),
+            ])
+        return OrderedDict([
+            ('total_seconds', time.time() - self.start),
+            ('phases', OrderedDict((name, OrderedDict([('seconds', seconds), ('calls', calls)]))
+                                   for name, (seconds, calls) in self.phases.items())),
+            ('counters', self.counters),
+            ('observations', observations),
+        ])
+
+
+recorder = NullRecorder()
+
+
+def enable():
+    """
+    Starts recording the metrics of this invocation
+    :return: Recorder
+    """
+    global recorder
+    recorder = Recorder()
+    return recorder
+
+
+def disable():
+    global recorder
+    recorder = NullRecorder()
+
+
+def phase(name):
+    return recorder.phase(name)
+
+
+def count(name, n=1):
+    recorder.count(name, n)
+
+
+def observe(name, value):
+    recorder.observe(name, value)
+
+
+def save(file, **info):
+    """
+    Writes the recorded metrics as JSON
+    :param file: Path to the file
+    :param info: Further values to include, e.g. the mode
+    """
+    data = OrderedDict(sorted(info.items()))
+    data.update(recorder.to_dict() if recorder.enabled else {})
+    with open(file, 'w') as f:
+        json.dump(data, f, indent=2)
@@ -0,0 +1,172 @@
+"""Names of combined jobs derived from the names of their jobs"""
+from os import path
+
+DEFAULT_NAME = 'Job'  # used if the names have nothing in common
+
+
+class _Automaton(object):
+    """Suffix automaton of a string; every state stands for the substrings ending at the same positions"""
+
+    def __init__(self, s):
+        self.next = [{}]
+        self.link = [-1]
+        self.length = [0]
+        self.first_end = [-1]  # end position of the first occurrence of the substrings of a state
+        last = 0
+        for i, ch in enumerate(s):
+            cur = self._add(self.length[last] + 1, i)
+            p = last
+            while p != -1 and ch not in self.next[p]:
+                self.next[p][ch] = cur
+                p = self.link[p]
+            if p == -1:
+                self.link[cur] = 0
+            else:
+                q = self.next[p][ch]
+                if self.length[p] + 1 == self.length[q]:
+                    self.link[cur] = q
+                else:
+                    clone = self._add(self.length[p] + 1, self.first_end[q])
+                    self.next[clone] = dict(self.next[q])
+                    self.link[clone] = self.link[q]
+                    while p != -1 and self.next[p].get(ch) == q:
+                        self.next[p][ch] = clone
+                        p = self.link[p]
+                    self.link[q] = self.link[cur] = clone
+            last = cur
+
+        # states but the initial one by decreasing length; a counting sort as the lengths are at most len(s)
+        buckets = [0] * (len(s) + 2)
+        for n in self.length:
+            buckets[n] += 1
+        for n in range(len(s), -1, -1):
+            buckets[n] += buckets[n + 1]
+        order = [0] * len(self.length)
+        for v, n in enumerate(self.length):
+            buckets[n] -= 1
+            order[buckets[n]] = v
+        self.order = order[:-1]
+
+    def _add(self, length, first_end):
+        self.next.append({})
+        self.link.append(-1)
+        self.length.append(length)
+        self.first_end.append(first_end)
+        return len(self.length) - 1
+
+    def matches(self, s):
+        """
+        Longest match of every state in a string
+        :param s: String
+        :return: List of the length of the longest substring of each state that occurs in `s`
+        """
+        nxt, link, length = self.next, self.link, self.length
+        best = [0] * len(length)
+        cur, n = 0, 0
+        for ch in s:
+            t = nxt[cur].get(ch)
+            while t is None and cur:
+                cur = link[cur]
+                n = length[cur]
+                t = nxt[cur].get(ch)
+            if t is not None:
+                cur = t
+                n += 1
+                if n > best[cur]:
+                    best[cur] = n
+        # a substring occurring in `s` implies that all its suffixes of the parent states occur as well
+        for v in self.order:
+            if best[v] > 0:
+                p = link[v]
+                best[p] = length[p]
+        return best
+
+
+def longest_common_substring(names):
+    """
+    Longest substring of all names in time linear in the total length of the names. Of several common substrings of
+    the same length, the first in the shortest (then smallest) name is chosen, so the result does not depend on the
+    order of the names.
+    :param names: Strings
+    :return: Longest common substring
+    """
+    unique = sorted(set(names), key=lambda s: (len(s), s))
+    if len(unique) == 0:
+        return ''
+    base = unique[0]
+    if len(unique) == 1 or base == '':
+        return base
+
+    automaton = _Automaton(base)
+    common = list(automaton.length)
+    alive = list(range(1, len(common)))  # states with a common substring so far
+    for s in unique[1:]:
+        best = automaton.matches(s)
+        for v in alive:
+            if best[v] < common[v]:
+                common[v] = best[v]
+        alive = [v for v in alive if common[v] > 0]
+        if len(alive) == 0:
+            return ''
+
+    best = max(common[v] for v in alive)
+    end = min(automaton.first_end[v] for v in alive if common[v] == best)
+    return base[end - best + 1:end + 1]
+
+
+def common_prefix(names):
+    return path.commonprefix(list(names))
+
+
+class Naming(object):
+
+    def __init__(self, policy='substring', template='{name}-{counter}'):
+        """
+        Policy naming combined jobs
+        :param policy: 'substring' for the longest common substring of the job names, 'prefix' for their longest common
+        prefix or 'template' to fill in the template
+        :param template: Format string of the 'template' policy with the fields {name} (longest common substring),
+        {prefix} (longest common prefix) and {counter} (number of the combined job)
+        """
+        if policy not in available_policies():
+            raise ValueError('Naming policy not supported: %s' % policy)
+        check_template(template)
+        self.policy = policy
+        self.template = template
+
+    def name(self, job_names, counter=0):
+        """
+        Name of a combined job
+        :param job_names: Names of its jobs; missing names count as empty
+        :param counter: Number of the combined job
+        :return: Name; DEFAULT_NAME if the names have nothing in common
+        """
+        job_names = [n or '' for n in job_names]
+        if self.policy == 'prefix':
+            name = common_prefix(job_names)
+        elif self.policy == 'template':
+            fields = {'counter': counter}
+            if '{name' in self.template:
+                fields['name'] = longest_common_substring(job_names).strip() or DEFAULT_NAME
+            if '{prefix' in self.template:
+                fields['prefix'] = common_prefix(job_names).strip() or DEFAULT_NAME
+            name = self.template.format(**fields)
+        else:
+            name = longest_common_substring(job_names)
+        return name if name.strip() != '' else DEFAULT_NAME
+
+
+def check_template(template):
+    """
+    Checks that a template only uses the known fields
+    :param template: Format string
+    :raise ValueError: If the template is invalid
+    """
+    try:
+        template.format(name='', prefix='', counter=0)
+    except (KeyError, IndexError, ValueError) as e:
+        raise ValueError('Invalid name template `%s`: %s' % (template, e))
+
+
+def available_policies():
+    return ['substring', 'prefix', 'template']
@@ -1,5 +1,7 @@
-"""Helper functions to get absolute paths"""
+"""Helper functions to get absolute paths and to expand paths to files"""
+import glob
 import os
+import sys
 from os import path
 
 
@@ -11,3 +13,80 @@ def abs_folder(file=None):
 
 def abs_path(file):
     return path.realpath(path.expandvars(path.expanduser(file)))
+
+
+def expand(patterns, recursive=False):
+    """
+    Expands paths, shell-style glob patterns and directories to the files they denote
+    :param patterns: Paths or glob patterns
+    :param recursive: Include all files below directories; directories are skipped otherwise
+    :return: Tuple of the absolute paths of the files without duplicates and the patterns not matching any file
+    """
+    files = []
+    seen = set()
+    unmatched = []
+
+    def collect(file):
+        file = abs_path(file)
+        if file not in seen:
+            seen.add(file)
+            files.append(file)
+
+    for pattern in patterns:
+        pattern = path.expandvars(path.expanduser(pattern))
+        if glob.has_magic(pattern):
+            matches = sorted(glob.glob(pattern))
+        else:
+            matches = [pattern] if path.exists(pattern) else []
+
+        found = False
+        for match in matches:
+            if path.isdir(match):
+                if not recursive:
+                    continue
+                for root, dirs, names in os.walk(match):
+                    dirs.sort()
+                    for name in sorted(names):
+                        collect(path.join(root, name))
+                        found = True
+            else:
+                collect(match)
+                found = True
+        if not found:
+            unmatched.append(pattern)
+
+    return files, unmatched
+
+
+def read_list(file):
+    """
+    Reads a list of paths with one path per line; empty lines are ignored
+    :param file: Path to the list or `-` for the standard input
+    :return: List of paths
+    """
+    if file == '-':
+        return [line.strip() for line in sys.stdin if line.strip() != '']
+    with open(file) as f:
+        return [line.strip() for line in f if line.strip() != '']
+
+
+def write_atomic(file, parts):
+    """
+    Writes a file from its parts; the file is written to a temporary file next to it and renamed, so readers never see
+    a partially written file
+    :param file: Path to the file
+    :param parts: Iterable of strings, e.g. a generator
+    :return: Number of bytes written
+    """
+    tmp = '%s.%i.tmp' % (file, os.getpid())
+    try:
+        with open(tmp, 'w') as f:
+            for part in parts:
+                f.write(part)
+        size = path.getsize(tmp)  # the encoded size, characters may take several bytes
+        os.rename(tmp, file)
+    except BaseException:
+        if path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return size
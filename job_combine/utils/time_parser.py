@@ -12,40 +12,142 @@ import sys
 from datetime import timedelta
 
 
-def str_to_timedelta(time_str, *formats):
+_DIGITS = '0123456789'
+_NO_DIGITS = dict((ord(c), None) for c in _DIGITS)
+_SPECIFIERS = ('%D', '%H', '%M', '%S')
+_REGEX_CHARS = set('.^$*+?{}[]\\|()')
+
+_compiled = {}
+_dispatch = {}
+
+
+def compile_format(time_format):
     """
-    Converts a string representation to a time delta
-    :param time_str: Time string
-    :param formats: Time formats (first matching will be used)
-    :return: Time delta
+    Compiles a time format to a regex; compiled formats are cached
+    :param time_format: Time format
+    :return: Compiled regex with the named groups d, h, m and s for the used specifiers
     """
-
-    for f in formats:
-        pattern = f.replace('%D', '(?P<d>[0-9]+)')
+    try:
+        return _compiled[time_format]
+    except KeyError:
+        pattern = time_format.replace('%D', '(?P<d>[0-9]+)')
         pattern = pattern.replace('%H', '(?P<h>[0-9]+)')
         pattern = pattern.replace('%M', '(?P<m>[0-9]+)')
         pattern = pattern.replace('%S', '(?P<s>[0-9]+)')
-        match = re.match(r'^' + pattern + r'$', time_str)
+        _compiled[time_format] = re.compile(r'^' + pattern + r'$')
+        return _compiled[time_format]
+
+
+# Converters of a time format to seconds; they return None if the string does not match. The fast converters of the
+# common formats split the string instead of matching a regex and may only be applied to strings consisting of digits
+# and the separators of their format.
+
+def _split_hms(time_str):
+    h, m, s = time_str.split(':')
+    if h == '' or m == '' or s == '':
+        return None
+    return int(h) * 3600 + int(m) * 60 + int(s)
+
+
+def _split_dhms(time_str):
+    d, hms = time_str.split('-')
+    seconds = _split_hms(hms)
+    if d == '' or seconds is None:
+        return None
+    return int(d) * 86400 + seconds
+
+
+_fast_formats = {
+    '%H:%M:%S': _split_hms,
+    '%D-%H:%M:%S': _split_dhms,
+}
+
+
+def _match_regex(time_format):
+    regex = compile_format(time_format)
 
-        if match is None:
-            continue
+    def match(time_str):
+        m = regex.match(time_str)
+        if m is None:
+            return None
+        groups = m.groupdict()
+        return int(groups.get('d') or 0) * 86400 + int(groups.get('h') or 0) * 3600 + \
+            int(groups.get('m') or 0) * 60 + int(groups.get('s') or 0)
 
-        def get_group(grp):
-            try:
-                return match.group(grp)
-            except IndexError:
-                return 0
+    return match
 
-        days = int(get_group('d'))
-        hours = int(get_group('h'))
-        minutes = int(get_group('m'))
-        seconds = int(get_group('s'))
 
-        return timedelta(days=days, hours=hours, minutes=minutes, seconds=seconds)
+def _shape(time_format):
+    for specifier in _SPECIFIERS:
+        time_format = time_format.replace(specifier, '')
+    return time_format
+
+
+def compile_formats(formats):
+    """
+    Compiles time formats to a dispatch table. As the specifiers only match digits, a string can only match formats
+    with the same separators, i.e. the same string without the digits. Compiled tables are cached.
+    :param formats: Tuple of time formats
+    :return: Dictionary of lists of converters by separators; None if the formats contain regex characters
+    """
+    try:
+        return _dispatch[formats]
+    except KeyError:
+        table = {}
+        for f in formats:
+            shape = _shape(f)
+            if _REGEX_CHARS.intersection(shape):
+                table = None
+                break
+            table.setdefault(shape, []).append(_fast_formats.get(f) or _match_regex(f))
+        _dispatch[formats] = table
+        return table
+
+
+def _convert(time_str, formats):
+    table = compile_formats(formats)
+    if table is None:
+        converters = [_match_regex(f) for f in formats]
+    else:
+        converters = table.get(time_str.translate(_NO_DIGITS), ())
+
+    for converter in converters:
+        seconds = converter(time_str)
+        if seconds is not None:
+            return timedelta(0, seconds)
 
     raise ValueError('`%s` is not a supported time format: %s' % (time_str, ', '.join(formats)))
 
 
+def str_to_timedelta(time_str, *formats):
+    """
+    Converts a string representation to a time delta
+    :param time_str: Time string
+    :param formats: Time formats (first matching will be used)
+    :return: Time delta
+    """
+    return _convert(time_str, tuple(formats))
+
+
+def strs_to_timedeltas(time_strs, *formats):
+    """
+    Converts many string representations to time deltas; repeated strings are converted once
+    :param time_strs: Iterable of time strings
+    :param formats: Time formats (first matching will be used)
+    :return: List of time deltas
+    """
+    formats = tuple(formats)
+    converted = {}
+    result = []
+    for time_str in time_strs:
+        try:
+            result.append(converted[time_str])
+        except KeyError:
+            converted[time_str] = _convert(time_str, formats)
+            result.append(converted[time_str])
+    return result
+
+
 def str_from_timedelta(time_delta, time_format):
     """
     Converts a time delta to a string representation
@@ -3,7 +3,7 @@ from setuptools import setup, find_packages
 setup(
     name='job-combine',
     version='1.1.0',
-    packages=find_packages(),
+    packages=find_packages(exclude=['benchmarks', 'tests']),
     url='https://github.com/ssauermann/job-combine',
     license='MIT',
     author='Sascha Sauermann',
@@ -13,7 +13,7 @@ setup(
                 'scripts.',
     entry_points={
         'console_scripts': [
-            'job-combine = job_combine.job_combine:main',
+            'job-combine = job_combine.client:main',
         ],
     }, test_requires=['pytest'], install_requires=[]
 )
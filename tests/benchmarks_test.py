@@ -0,0 +1,30 @@
+import json
+
+from benchmarks import generators, suite
+from job_combine.cluster.job import Job
+
+
+def test_generate_repeatable(tmpdir):
+    a = generators.generate(str(tmpdir.join('a')), 20, 'LoadLeveler', n_groups=3, seed=7)
+    b = generators.generate(str(tmpdir.join('b')), 20, 'LoadLeveler', n_groups=3, seed=7)
+    assert [open(f).read() for f in a] == [open(f).read() for f in b]
+
+    jobs = [Job.from_file(f, verbose=False) for f in a]
+    assert len(set(job.key() for job in jobs)) == 3
+    assert all(job.manager_name == 'LoadLeveler' and job.time.total_seconds() >= 60 for job in jobs)
+
+
+def test_suite(tmpdir):
+    baseline = str(tmpdir.join('baseline.json'))
+    assert suite.main(['-n', '200', '-g', '2', '--memory', '--tmp', str(tmpdir), '-o', baseline]) == 0
+
+    with open(baseline) as f:
+        report = json.load(f)
+    assert list(report['stages']) == ['generate', 'from_file', 'add', 'add_cached', 'load', 'partition', 'combine',
+                                      'restart']
+    assert all(stage['items'] == 200 and stage['peak_bytes'] > 0 for stage in report['stages'].values())
+
+    faster = dict((name, dict(stage, seconds=stage['seconds'] / 10)) for name, stage in report['stages'].items())
+    rows = suite.compare(report['stages'], faster, 0.5)
+    assert all(regressed for _, _, _, _, regressed in rows)
+    assert not any(regressed for _, _, _, _, regressed in suite.compare(faster, report['stages'], 0.5))
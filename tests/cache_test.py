@@ -0,0 +1,71 @@
+from job_combine.cluster import job as cjob
+from job_combine.cluster.cache import *
+
+
+def write_job(tmpdir, name, minutes=10):
+    f = tmpdir.join(name)
+    f.write('#!/bin/bash\n#SBATCH --job-name=%s\n#SBATCH --time=%i:00\n' % (name, minutes))
+    return str(f)
+
+
+def test_hit_and_persist(tmpdir, monkeypatch):
+    parsed = []
+    parse_files = cjob.parse_files
+
+    def counting_parse_files(job_files, *args):
+        parsed.extend(job_files)
+        return parse_files(job_files, *args)
+
+    monkeypatch.setattr(cjob, 'parse_files', counting_parse_files)
+    a = write_job(tmpdir, 'a')
+    cache_file = str(tmpdir.join('cache'))
+    parse_cache = ParseCache(cache_file)
+    assert parse_cache.parse_files([a])[0][1].name == 'a'
+    parse_cache.close()
+    assert parsed == [a]
+
+    # a hit does not parse the file again
+    parse_cache = ParseCache(cache_file)
+    file, job, error = parse_cache.parse_files([a])[0]
+    assert parsed == [a]
+    assert (parse_cache.hits, parse_cache.misses) == (1, 0)
+    assert (file, job.name, error) == (a, 'a', None)
+
+
+def test_invalidate_changed_file(tmpdir):
+    a = write_job(tmpdir, 'a')
+    parse_cache = ParseCache()
+    parse_cache.parse_files([a])
+    write_job(tmpdir, 'a', minutes=200)
+    job = parse_cache.parse_files([a])[0][1]
+    assert (parse_cache.hits, parse_cache.misses) == (0, 2)
+    assert job.time.total_seconds() == 200 * 60
+
+
+def test_errors_not_cached(tmpdir):
+    parse_cache = ParseCache()
+    missing = str(tmpdir.join('missing'))
+    assert parse_cache.parse_files([missing])[0][2] is not None
+    assert len(parse_cache) == 0
+
+
+def test_lru_eviction(tmpdir):
+    files = [write_job(tmpdir, name) for name in 'abc']
+    parse_cache = ParseCache(max_entries=2)
+    parse_cache.parse_files(files[:2])
+    parse_cache.parse_files(files[:1])  # a is now more recently used than b
+    parse_cache.parse_files(files[2:])
+    parse_cache.parse_files([files[0], files[2]])
+    assert (parse_cache.hits, parse_cache.misses) == (3, 3)
+    parse_cache.parse_files(files[1:2])
+    assert (parse_cache.hits, parse_cache.misses) == (3, 4)
+
+
+def test_unreadable_file_rebuilt(tmpdir):
+    a = write_job(tmpdir, 'a')
+    cache_file = tmpdir.join('cache')
+    cache_file.write('not a database')
+    parse_cache = ParseCache(str(cache_file))
+    parse_cache.parse_files([a])
+    parse_cache.close()
+    assert len(ParseCache(str(cache_file))) == 1
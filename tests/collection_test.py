@@ -0,0 +1,33 @@
+import pytest
+
+from job_combine.cluster.collection import *
+from job_combine.cluster.job import Job
+
+
+def make_job(file):
+    return Job(file, 'job', 'dir', None, None, None, [], 'Slurm')
+
+
+def test_insertion_order_and_replace():
+    jobs = JobCollection([make_job('a'), make_job('b'), make_job('c')])
+    replacement = make_job('b')
+    jobs.append(replacement)
+    assert [j.file for j in jobs] == ['a', 'b', 'c']
+    assert jobs.get('b') is replacement
+    assert jobs.first().file == 'a'
+
+
+def test_remove():
+    jobs = JobCollection([make_job('a'), make_job('b')])
+    jobs.remove(make_job('a'))
+    assert 'a' not in jobs
+    assert make_job('b') in jobs
+    with pytest.raises(ValueError):
+        jobs.remove('a')
+
+
+def test_difference_update():
+    jobs = JobCollection(make_job(f) for f in 'abcde')
+    assert jobs.difference_update(['b', make_job('d'), 'x']) == 2
+    assert [j.file for j in jobs] == ['a', 'c', 'e']
+    assert len(jobs) == 3
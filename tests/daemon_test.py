@@ -0,0 +1,135 @@
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import pytest
+
+from job_combine import daemon
+from job_combine.cluster import cache, job as cjob
+from job_combine.storage import backends
+
+BIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bin')
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def drop_job(spool, i, minutes=20, nodes=1):
+    # written under a temporary name and renamed like a workflow engine should
+    tmp = spool.join('.job%i.tmp' % i)
+    tmp.write('#!/bin/bash\n#SBATCH --job-name=job%i\n#SBATCH --time=%i:00\n#SBATCH --nodes=%i\necho job%i > result%i\n'
+              % (i, minutes, nodes, i, i))
+    tmp.rename(spool.join('job%i.sh' % i))
+    return str(spool.join('job%i.sh' % i))
+
+
+def run_daemon(tmpdir, monkeypatch, *args):
+    from job_combine import job_combine
+    monkeypatch.setattr('sys.argv', ['job-combine', '-s', str(tmpdir.join('s')), 'daemon', str(tmpdir.join('spool')),
+                                     '-d', str(tmpdir.join('scripts')), '--no-inotify', '--once'] + list(args))
+    job_combine.main()
+
+
+def stored_files(tmpdir):
+    with backends.open_store(str(tmpdir.join('s'))) as storage:
+        return sorted(job.file for v in storage.groups().values() for job in v)
+
+
+def scripts(tmpdir):
+    return sorted(os.path.relpath(os.path.join(root, f), str(tmpdir.join('scripts')))
+                  for root, _, files in os.walk(str(tmpdir.join('scripts'))) for f in files if f == 'submit.job')
+
+
+def test_scan(tmpdir):
+    spool = tmpdir.mkdir('spool')
+    drop_job(spool, 1)
+    spool.join('.hidden').write('')
+    spool.join('job2.sh.tmp').write('')
+    spool.mkdir('sub')
+    assert daemon.scan(str(spool)) == [str(spool.join('job1.sh'))]
+
+
+def test_flush_on_min_time(tmpdir, monkeypatch):
+    spool = tmpdir.mkdir('spool')
+    drop_job(spool, 0)
+    drop_job(spool, 1, nodes=2)
+    run_daemon(tmpdir, monkeypatch, '-m', '0:30:00', '--no-dispatch')
+    assert scripts(tmpdir) == []
+    assert len(stored_files(tmpdir)) == 2
+
+    # the group of one node reaches the min time; files are only accepted once
+    drop_job(spool, 2)
+    run_daemon(tmpdir, monkeypatch, '-m', '0:30:00', '--no-dispatch')
+    assert scripts(tmpdir) == [os.path.join('flush-00000', '00', 'submit.job')]
+    assert stored_files(tmpdir) == [str(spool.join('job1.sh'))]
+
+    state = json.loads(tmpdir.join('s.daemon').read())
+    assert sorted(state['seen']) == [str(spool.join('job%i.sh' % i)) for i in range(3)]
+    assert list(state['pending']) == [str(spool.join('job1.sh'))]
+    assert state['flushes'] == {}
+
+    # a file written again under the same name is accepted again
+    drop_job(spool, 0, minutes=30)
+    run_daemon(tmpdir, monkeypatch, '-m', '0:30:00', '--no-dispatch')
+    assert scripts(tmpdir) == [os.path.join('flush-%05i' % i, '00', 'submit.job') for i in range(2)]
+    assert '--time=00-00:30:00' in tmpdir.join('scripts', 'flush-00001', '00', 'submit.job').read()
+
+    # the remaining job is flushed once it waited for the maximum latency
+    run_daemon(tmpdir, monkeypatch, '-m', '0:30:00', '--no-dispatch', '--max-latency', '0')
+    assert len(scripts(tmpdir)) == 3
+    assert stored_files(tmpdir) == []
+
+
+def test_recover_interrupted_flush(tmpdir, monkeypatch):
+    spool = tmpdir.mkdir('spool')
+    files = [drop_job(spool, i) for i in range(3)]
+    with backends.open_store(str(tmpdir.join('s'))) as storage:
+        storage.add([cjob.Job.from_file(f, verbose=False) for f in files])
+    flush_dir = str(tmpdir.join('scripts', 'flush-00007'))
+    tmpdir.join('s.daemon').write(json.dumps({
+        'version': daemon.STATE_VERSION, 'seen': dict((f, list(cache.identity(os.stat(f)))) for f in files),
+        'pending': dict.fromkeys(files, 0),
+        'flushes': {'flush-00007': {'directory': flush_dir, 'partitions': [files[:2], files[2:]]}}, 'next_flush': 8}))
+    # the first combined job was submitted before the crash
+    tmpdir.ensure('scripts', 'flush-00007', '00', 'submit.id')
+
+    log = tmpdir.join('submitted')
+    submit = tmpdir.join('submit.sh')
+    submit.write('#!/bin/bash\necho "$1" >> %s\n' % log)
+    run_daemon(tmpdir, monkeypatch, '--submit-command', 'bash %s' % submit)
+    assert scripts(tmpdir) == [os.path.join('flush-00007', '%02i' % i, 'submit.job') for i in range(2)]
+    assert log.read().split() == [os.path.join(flush_dir, '01', 'submit.job')]
+    assert stored_files(tmpdir) == []
+    assert json.loads(tmpdir.join('s.daemon').read())['flushes'] == {}
+
+
+@pytest.mark.parametrize('inotify', [True, False])
+def test_daemon_dispatches_and_stops(tmpdir, inotify):
+    spool = tmpdir.mkdir('spool')
+    env = dict(os.environ, PATH=BIN + os.pathsep + os.environ['PATH'], PYTHONPATH=ROOT,
+               SBATCH_LOG=str(tmpdir.join('sbatch.log')), SBATCH_RUN='1')
+    cmd = [sys.executable, '-m', 'job_combine.job_combine', '-s', str(tmpdir.join('s')), 'daemon', str(spool),
+           '-d', str(tmpdir.join('scripts')), '-m', '0:30:00', '--max-latency', '600', '--poll-interval', '0.2',
+           '--flush-on-exit'] + ([] if inotify else ['--no-inotify'])
+    proc = subprocess.Popen(cmd, cwd=str(tmpdir), env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    try:
+        time.sleep(1)
+        for i in range(2):
+            drop_job(spool, i)
+        for _ in range(50):
+            if spool.join('result0').check() and spool.join('result1').check():
+                break
+            time.sleep(0.2)
+        assert spool.join('result0').read() == 'job0\n'
+        drop_job(spool, 2)  # pending until the daemon stops
+        time.sleep(1)
+        proc.send_signal(signal.SIGTERM)
+        out = proc.communicate(timeout=30)[0].decode()
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+    assert proc.returncode == 0
+    assert 'Stopped with 0 pending jobs.' in out
+    assert spool.join('result2').read() == 'job2\n'
+    assert len(tmpdir.join('sbatch.log').read().splitlines()) == 2
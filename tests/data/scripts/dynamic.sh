@@ -0,0 +1,54 @@
+cwd=$(pwd)
+jc_begin=$(date +%s)
+trap 'jc_status=TIMEOUT' TERM
+
+# jc_record <job file> <exit status> <start>
+jc_record() {
+    jc_end=$(date +%s)
+    printf '%s\t%s\t%s\t%s\n' "$1" "${jc_status:-$2}" $((jc_end - $3)) "$jc_end" >> "$cwd/done"
+}
+
+# jobs that succeeded in an earlier run of the script; lines of older versions only contain the job file
+declare -A jc_done
+if [ -f "$cwd/done" ]; then
+    while IFS=$'\t' read -r jc_done_file jc_done_status jc_rest; do
+        if [ -n "$jc_done_file" ] && [ "${jc_done_status:-0}" = 0 ]; then jc_done["$jc_done_file"]=1; fi
+    done < "$cwd/done"
+fi
+
+# jc_succeeded <job file>: whether an earlier run of the job succeeded
+jc_succeeded() {
+    [ -n "${jc_done["$1"]}" ]
+}
+
+jc_queue="/data/queue-00"
+jc_walltime=3600
+
+# jc_claim: claims the next pending task that fits into the remaining time and reads it
+jc_claim() {
+    for jc_task in "$jc_queue/pending/"*; do
+        [ -e "$jc_task" ] || return 1
+        { read -r jc_seconds; read -r jc_dir; read -r jc_file; read -r jc_out; read -r jc_err; } < "$jc_task" \
+            || continue
+        [ $((jc_walltime - $(date +%s) + jc_begin)) -ge "$jc_seconds" ] || continue
+        jc_task="${jc_task##*/}"
+        if mv "$jc_queue/pending/$jc_task" "$jc_queue/running/$jc_task" 2>/dev/null; then
+            touch "$jc_queue/running/$jc_task"  # time of the claim
+            return 0
+        fi
+    done
+    return 1
+}
+
+while [ -z "$jc_status" ] && jc_claim; do
+    cd "$jc_dir"
+    jc_start=$(date +%s)
+    (
+        if [ -n "$jc_out" ]; then exec >"$jc_out"; fi
+        if [ -n "$jc_err" ]; then exec 2>"$jc_err"; fi
+        exec "$jc_file"
+    )
+    jc_record "$jc_file" $? $jc_start
+    mv "$jc_queue/running/$jc_task" "$jc_queue/finished/$jc_task"
+done
+if [ -n "$jc_status" ]; then exit 143; fi
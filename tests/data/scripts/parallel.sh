@@ -0,0 +1,96 @@
+cwd=$(pwd)
+jc_begin=$(date +%s)
+trap 'jc_status=TIMEOUT' TERM
+
+# jc_record <job file> <exit status> <start>
+jc_record() {
+    jc_end=$(date +%s)
+    printf '%s\t%s\t%s\t%s\n' "$1" "${jc_status:-$2}" $((jc_end - $3)) "$jc_end" >> "$cwd/done"
+}
+
+# jobs that succeeded in an earlier run of the script; lines of older versions only contain the job file
+declare -A jc_done
+if [ -f "$cwd/done" ]; then
+    while IFS=$'\t' read -r jc_done_file jc_done_status jc_rest; do
+        if [ -n "$jc_done_file" ] && [ "${jc_done_status:-0}" = 0 ]; then jc_done["$jc_done_file"]=1; fi
+    done < "$cwd/done"
+fi
+
+# jc_succeeded <job file>: whether an earlier run of the job succeeded
+jc_succeeded() {
+    [ -n "${jc_done["$1"]}" ]
+}
+
+jc_walltime=3600
+
+# jc_fits <seconds>: whether a job of the given time fits into the remaining time
+jc_fits() {
+    [ $((jc_walltime - $(date +%s) + jc_begin)) -ge "$1" ]
+}
+
+# jc_requeue: waits for the running jobs and stops the script so it is run again
+jc_requeue() {
+    while [ -n "$(jobs -pr)" ]; do wait; done
+    echo "Not enough time left for the next job; requeueing" >&2
+    cd "$cwd"
+    scontrol requeue $SLURM_JOB_ID
+    exit 99
+}
+
+jc_slots=2
+jc_launch="srun --exclusive --nodes=1 --ntasks=1"
+
+# jc_run <index> <directory> <job file>; the output is buffered and printed in one piece, so concurrent jobs neither
+# interleave nor truncate the output files of each other
+jc_run() {
+    trap 'jc_status=TIMEOUT' TERM  # subshells do not inherit the trap
+    jc_out="$cwd/.job-$1.out"
+    jc_err="$cwd/.job-$1.err"
+    cd "$2" || return
+    jc_start=$(date +%s)
+    jc_exec "$3" >"$jc_out" 2>"$jc_err"
+    jc_exit=$?
+    (
+        if command -v flock >/dev/null; then flock 9; fi
+        if [ -f "$jc_out" ]; then cat "$jc_out"; fi
+        if [ -f "$jc_err" ]; then cat "$jc_err" >&2; fi
+        rm -f "$jc_out" "$jc_err"
+        jc_record "$3" "$jc_exit" "$jc_start"
+    ) 9>>"$cwd/.lock"
+}
+
+jc_exec() {
+    $jc_launch "$1"
+}
+
+# waits until all running jobs finished; exits if the script was terminated
+jc_finish() {
+    while [ -n "$(jobs -pr)" ]; do wait; done
+    if [ -n "$jc_status" ]; then exit 143; fi
+}
+
+# waits until a slot is free; polls if `wait -n` is not supported by this bash
+jc_wait() {
+    while [ "$(jobs -pr | wc -l)" -ge "$jc_slots" ]; do
+        wait -n 2>/dev/null
+        if [ $? -eq 2 ]; then sleep 1; fi
+    done
+    if [ -n "$jc_status" ]; then jc_finish; fi
+}
+
+if ! jc_succeeded "/data/run0/job.sh"; then
+jc_wait
+jc_fits 600 || jc_requeue
+jc_run 0 "/data/run0" "/data/run0/job.sh" &
+fi
+if ! jc_succeeded "/data/run1/job.sh"; then
+jc_wait
+jc_fits 1200 || jc_requeue
+jc_run 1 "/data/run1" "/data/run1/job.sh" &
+fi
+if ! jc_succeeded "/data/run2/job.sh"; then
+jc_wait
+jc_fits 1800 || jc_requeue
+jc_run 2 "/data/run2" "/data/run2/job.sh" &
+fi
+jc_finish
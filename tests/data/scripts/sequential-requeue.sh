@@ -0,0 +1,66 @@
+cwd=$(pwd)
+jc_begin=$(date +%s)
+trap 'jc_status=TIMEOUT' TERM
+
+# jc_record <job file> <exit status> <start>
+jc_record() {
+    jc_end=$(date +%s)
+    printf '%s\t%s\t%s\t%s\n' "$1" "${jc_status:-$2}" $((jc_end - $3)) "$jc_end" >> "$cwd/done"
+}
+
+# jobs that succeeded in an earlier run of the script; lines of older versions only contain the job file
+declare -A jc_done
+if [ -f "$cwd/done" ]; then
+    while IFS=$'\t' read -r jc_done_file jc_done_status jc_rest; do
+        if [ -n "$jc_done_file" ] && [ "${jc_done_status:-0}" = 0 ]; then jc_done["$jc_done_file"]=1; fi
+    done < "$cwd/done"
+fi
+
+# jc_succeeded <job file>: whether an earlier run of the job succeeded
+jc_succeeded() {
+    [ -n "${jc_done["$1"]}" ]
+}
+
+jc_walltime=3600
+
+# jc_fits <seconds>: whether a job of the given time fits into the remaining time
+jc_fits() {
+    [ $((jc_walltime - $(date +%s) + jc_begin)) -ge "$1" ]
+}
+
+# jc_requeue: waits for the running jobs and stops the script so it is run again
+jc_requeue() {
+    while [ -n "$(jobs -pr)" ]; do wait; done
+    echo "Not enough time left for the next job; requeueing" >&2
+    cd "$cwd"
+    scontrol requeue $SLURM_JOB_ID
+    exit 99
+}
+
+if ! jc_succeeded "/data/run0/job.sh"; then
+jc_fits 600 || jc_requeue
+cd "/data/run0"
+jc_start=$(date +%s)
+"/data/run0/job.sh"
+jc_record "/data/run0/job.sh" $? $jc_start
+if [ -n "$jc_status" ]; then exit 143; fi
+fi
+
+if ! jc_succeeded "/data/run1/job.sh"; then
+jc_fits 1200 || jc_requeue
+cd "/data/run1"
+jc_start=$(date +%s)
+"/data/run1/job.sh" >job.out
+jc_record "/data/run1/job.sh" $? $jc_start
+if [ -n "$jc_status" ]; then exit 143; fi
+fi
+
+if ! jc_succeeded "/data/run2/job.sh"; then
+jc_fits 1800 || jc_requeue
+cd "/data/run2"
+jc_start=$(date +%s)
+"/data/run2/job.sh" 2>job.err
+jc_record "/data/run2/job.sh" $? $jc_start
+if [ -n "$jc_status" ]; then exit 143; fi
+fi
+
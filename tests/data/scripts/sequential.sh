@@ -0,0 +1,47 @@
+cwd=$(pwd)
+jc_begin=$(date +%s)
+trap 'jc_status=TIMEOUT' TERM
+
+# jc_record <job file> <exit status> <start>
+jc_record() {
+    jc_end=$(date +%s)
+    printf '%s\t%s\t%s\t%s\n' "$1" "${jc_status:-$2}" $((jc_end - $3)) "$jc_end" >> "$cwd/done"
+}
+
+# jobs that succeeded in an earlier run of the script; lines of older versions only contain the job file
+declare -A jc_done
+if [ -f "$cwd/done" ]; then
+    while IFS=$'\t' read -r jc_done_file jc_done_status jc_rest; do
+        if [ -n "$jc_done_file" ] && [ "${jc_done_status:-0}" = 0 ]; then jc_done["$jc_done_file"]=1; fi
+    done < "$cwd/done"
+fi
+
+# jc_succeeded <job file>: whether an earlier run of the job succeeded
+jc_succeeded() {
+    [ -n "${jc_done["$1"]}" ]
+}
+
+if ! jc_succeeded "/data/run0/job.sh"; then
+cd "/data/run0"
+jc_start=$(date +%s)
+"/data/run0/job.sh"
+jc_record "/data/run0/job.sh" $? $jc_start
+if [ -n "$jc_status" ]; then exit 143; fi
+fi
+
+if ! jc_succeeded "/data/run1/job.sh"; then
+cd "/data/run1"
+jc_start=$(date +%s)
+"/data/run1/job.sh" >job.out
+jc_record "/data/run1/job.sh" $? $jc_start
+if [ -n "$jc_status" ]; then exit 143; fi
+fi
+
+if ! jc_succeeded "/data/run2/job.sh"; then
+cd "/data/run2"
+jc_start=$(date +%s)
+"/data/run2/job.sh" 2>job.err
+jc_record "/data/run2/job.sh" $? $jc_start
+if [ -n "$jc_status" ]; then exit 143; fi
+fi
+
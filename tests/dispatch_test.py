@@ -0,0 +1,118 @@
+import os
+import subprocess
+import sys
+import time
+from datetime import timedelta
+
+import pytest
+
+from job_combine.cluster.dispatch import *
+from job_combine.cluster.job import Job
+
+BIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bin')
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def write_jobs(tmpdir, n, nodes=1):
+    files = []
+    for i in range(n):
+        d = tmpdir.ensure('jobs', 'job%02i' % i, dir=True)
+        f = d.join('job.sh')
+        f.write('#!/bin/bash\n#SBATCH --job-name=job%02i\n#SBATCH --time=30:00\n#SBATCH --nodes=%i\n'
+                'echo job%02i > result\n' % (i, nodes, i))
+        files.append(str(f))
+    return files
+
+
+def job_combine(tmpdir, *args, **env):
+    environ = dict(os.environ, PATH=BIN + os.pathsep + os.environ['PATH'], PYTHONPATH=ROOT,
+                   SBATCH_LOG=str(tmpdir.join('sbatch.log')), **env)
+    cmd = [sys.executable, '-m', 'job_combine.job_combine', '-s', str(tmpdir.join('job.storage'))] + list(args)
+    return subprocess.check_output(cmd, cwd=str(tmpdir), env=environ).decode()
+
+
+def submissions(tmpdir):
+    log = tmpdir.join('sbatch.log')
+    return log.read().splitlines() if log.exists() else []
+
+
+def test_array_job():
+    jobs = [Job('/s/%02i/submit.job' % i, 'job', '/s/%02i' % i, timedelta(minutes=10 * (i + 1)), 'job.out',
+                'job.err', [('nodes', 0, '1')], 'Slurm') for i in range(3)]
+    a_job, script = array_job(jobs, '/s/array-00.job', '/s')
+    assert a_job.time == timedelta(minutes=30)
+    assert '#SBATCH --array=0-2\n' in script
+    assert '#SBATCH -D /s\n' in script
+    assert '2) cd "/s/02" && exec bash "/s/02/submit.job" >job.out 2>job.err ;;\n' in script
+
+
+def test_array_job_not_supported():
+    job = Job('/s/submit.job', 'job', '/s', timedelta(minutes=10), None, None, [], 'LoadLeveler')
+    with pytest.raises(ValueError):
+        array_job([job], '/s/array.job', '/s')
+
+
+@pytest.mark.parametrize('mode,n_submissions', [('each', 4), ('array', 1)])
+def test_dispatch(tmpdir, mode, n_submissions):
+    job_combine(tmpdir, 'add', *write_jobs(tmpdir, 8))
+    job_combine(tmpdir, 'queue', '-p', '4', '--dispatch', '--dispatch-mode', mode, SBATCH_RUN='1')
+
+    assert len(submissions(tmpdir)) == n_submissions
+    # every original job ran in its directory and was recorded as done
+    for i in range(8):
+        assert tmpdir.join('jobs', 'job%02i' % i, 'result').read() == 'job%02i\n' % i
+    done = [line for d in tmpdir.join('scripts').listdir() if d.isdir() for line in d.join('done').readlines()]
+    assert len(done) == 8
+
+
+def test_dispatch_array_per_group(tmpdir):
+    job_combine(tmpdir, 'add', *write_jobs(tmpdir.mkdir('a'), 4, nodes=1) + write_jobs(tmpdir.mkdir('b'), 4, nodes=2))
+    job_combine(tmpdir, 'queue', '-p', '2', '--dispatch', '--dispatch-mode', 'array')
+    assert len(submissions(tmpdir)) == 2
+    assert sorted(f.basename for f in tmpdir.join('scripts').listdir('array-*.job')) == ['array-00.job',
+                                                                                         'array-01.job']
+
+
+def test_dispatch_records_job_ids(tmpdir):
+    job_combine(tmpdir, 'add', *write_jobs(tmpdir, 6))
+    out = job_combine(tmpdir, 'queue', '-p', '3', '--dispatch', '--dispatch-backoff', '0.01', SBATCH_BUSY='2')
+    assert 'Dispatched 3 of 3 job files.' in out
+    ids = sorted(d.join('submit.id').read().strip() for d in tmpdir.join('scripts').listdir() if d.isdir())
+    assert ids == ['1001', '1002', '1003']
+
+
+def test_dispatch_submit_command(tmpdir):
+    job_combine(tmpdir, 'add', *write_jobs(tmpdir, 4))
+    job_combine(tmpdir, 'queue', '-p', '2', '--dispatch', '--submit-command', 'bash')
+    assert submissions(tmpdir) == []
+    for i in range(4):
+        assert tmpdir.join('jobs', 'job%02i' % i, 'result').check()
+
+
+def make_submit_jobs(tmpdir, n):
+    return [Job(str(tmpdir.join('%02i.job' % i)), 'job', str(tmpdir), timedelta(minutes=10), None, None, [],
+                'Slurm') for i in range(n)]
+
+
+def test_dispatcher_retries_busy(tmpdir, monkeypatch):
+    monkeypatch.setenv('PATH', BIN + os.pathsep + os.environ['PATH'])
+    monkeypatch.setenv('SBATCH_LOG', str(tmpdir.join('sbatch.log')))
+    monkeypatch.setenv('SBATCH_BUSY', '3')
+    results = Dispatcher(workers=1, retries=2, backoff=0.01).submit_all(make_submit_jobs(tmpdir, 2))
+    assert results[0][2] is not None and 'temporarily unavailable' in results[0][2]
+    assert results[1][1:] == ('1001', None)
+    assert tmpdir.join('01.id').read() == '1001\n'
+
+
+def test_dispatcher_no_retry_on_failure(tmpdir):
+    start = time.time()
+    results = Dispatcher(retries=3, backoff=10, command='false').submit_all(make_submit_jobs(tmpdir, 2))
+    assert time.time() - start < 5
+    assert [error for _, _, error in results] == ['exit status 1'] * 2
+
+
+def test_dispatcher_rate_limit(tmpdir):
+    start = time.time()
+    results = Dispatcher(workers=4, rate=20, command='true').submit_all(make_submit_jobs(tmpdir, 6))
+    assert time.time() - start >= 0.25
+    assert [error for _, _, error in results] == [None] * 6
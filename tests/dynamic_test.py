@@ -0,0 +1,103 @@
+import os
+import subprocess
+import time
+from datetime import timedelta
+
+import pytest
+
+from job_combine.cluster import ledger, scripts, taskqueue
+from job_combine.cluster.job import Job
+
+
+def make_jobs(tmpdir, n, minutes=1):
+    jobs = []
+    log = tmpdir.join('runs.log')
+    for i in range(n):
+        f = tmpdir.join('job%02i.sh' % i)
+        f.write('#!/bin/bash\n#SBATCH --job-name=job%02i\n#SBATCH --time=%i:00\nsleep 0.0%i\necho job%02i >> "%s"\n'
+                % (i, minutes, i % 5, i, log))
+        f.chmod(0o755)
+        jobs.append(Job(str(f), 'job%02i' % i, str(tmpdir), timedelta(minutes=minutes), None, None, [], 'Slurm'))
+    return jobs
+
+
+def run_allocations(tmpdir, queue, n, walltime=3600):
+    """Runs `n` workers of the queue at the same time like separate allocations"""
+    procs = []
+    for i in range(n):
+        workdir = tmpdir.mkdir('alloc%i' % i)
+        workdir.join('submit.job').write('#!/bin/bash\n' + ''.join(scripts.dynamic(queue, walltime)))
+        procs.append(subprocess.Popen(['bash', 'submit.job'], cwd=str(workdir)))
+    assert [p.wait() for p in procs] == [0] * n
+    done = [tmpdir.join('alloc%i' % i, ledger.DONE) for i in range(n)]
+    return [r for d in done if d.check() for r in ledger.read(str(d))]
+
+
+def test_every_job_runs_once(tmpdir):
+    jobs = make_jobs(tmpdir, 40)
+    queue = taskqueue.create(jobs, str(tmpdir.join('queue')))
+    assert taskqueue.count(queue) == {'pending': 40, 'running': 0, 'finished': 0}
+
+    records = run_allocations(tmpdir, queue, 4)
+
+    assert sorted(tmpdir.join('runs.log').read().split()) == sorted(job.name for job in jobs)
+    assert sorted(r.file for r in records) == sorted(job.file for job in jobs)
+    assert all(r.status == 0 for r in records)
+    assert taskqueue.count(queue) == {'pending': 0, 'running': 0, 'finished': 40}
+    # a queue without pending or running tasks is replaced
+    assert taskqueue.count(taskqueue.create(jobs[:2], queue)) == {'pending': 2, 'running': 0, 'finished': 0}
+
+
+def test_skips_jobs_exceeding_walltime(tmpdir):
+    jobs = make_jobs(tmpdir, 3)
+    jobs[0].time = timedelta(hours=2)
+    queue = taskqueue.create(jobs, str(tmpdir.join('queue')))
+
+    records = run_allocations(tmpdir, queue, 2, walltime=3600)
+
+    assert sorted(r.file for r in records) == sorted(job.file for job in jobs[1:])
+    assert taskqueue.count(queue) == {'pending': 1, 'running': 0, 'finished': 2}
+    # longest jobs are queued first
+    assert tmpdir.join('queue', 'pending', '0').readlines()[2] == jobs[0].file + '\n'
+    # the pending job is not dropped by creating the queue again
+    with pytest.raises(ValueError):
+        taskqueue.create(jobs, queue)
+    assert taskqueue.count(queue)['pending'] == 1
+
+
+def test_queue_dynamic(tmpdir, monkeypatch):
+    from job_combine import job_combine
+
+    jobs = make_jobs(tmpdir, 6, minutes=10)
+    monkeypatch.chdir(tmpdir)
+    for args in (['add'] + [job.file for job in jobs], ['queue', '--dynamic', '-p', '3']):
+        monkeypatch.setattr('sys.argv', ['job-combine', '-s', str(tmpdir.join('s'))] + args)
+        job_combine.main()
+
+    scripts_dir = tmpdir.join('scripts')
+    assert taskqueue.count(str(scripts_dir.join('queue-00')))['pending'] == 6
+    submit = scripts_dir.join('00', 'submit.job').read()
+    assert '#SBATCH --time=00-00:20:00' in submit
+    assert 'jc_claim' in submit
+
+
+def test_abandoned_tasks_recovered(tmpdir):
+    jobs = make_jobs(tmpdir, 3)
+    queue = taskqueue.create(jobs, str(tmpdir.join('queue')))
+    # two workers claimed a task and were killed, one of them long ago
+    for name, claimed in (('0', time.time() - 60 - taskqueue.ABANDONED_MARGIN - 1), ('1', time.time())):
+        running = tmpdir.join('queue', 'running', name)
+        tmpdir.join('queue', 'pending', name).rename(running)
+        os.utime(str(running), (claimed, claimed))
+
+    with pytest.raises(ValueError):
+        taskqueue.create(jobs, queue)
+    assert taskqueue.count(queue) == {'pending': 2, 'running': 1, 'finished': 0}
+
+    records = run_allocations(tmpdir, queue, 1)
+    assert sorted(r.file for r in records) == [jobs[0].file, jobs[2].file]
+    assert taskqueue.count(queue) == {'pending': 0, 'running': 1, 'finished': 2}
+    # claiming records the time of the claim
+    assert tmpdir.join('queue', 'finished', '0').mtime() >= tmpdir.join('queue', 'running', '1').mtime()
+
+    assert taskqueue.count(taskqueue.create(jobs, queue, reset=True)) == {'pending': 3, 'running': 0, 'finished': 0}
@@ -0,0 +1,62 @@
+import json
+from datetime import timedelta
+
+import pytest
+
+from job_combine.cluster import equivalence
+from job_combine.cluster.equivalence import *
+from job_combine.cluster.job import Job
+
+
+def make_job(file, params):
+    return Job(file, 'job', 'dir', timedelta(minutes=10), None, None, params, 'Slurm')
+
+
+def test_normalize():
+    rules = Rules(ignore=['mail-user'], sort=['export'], alias={'A': 'account'}, rename={'account': {'old': 'proj'}})
+    a = (('A', 1, 'old'), ('export', 0, 'PATH,HOME'), ('mail-user', 0, 'a@example.com'))
+    b = (('account', 0, 'proj'), ('export', 0, 'HOME,PATH'))
+    assert rules.normalize(a) == rules.normalize(b) == (('account', 'proj'), ('export', 'HOME,PATH'))
+    assert rules.normalize((('export', 0, 'HOME'), ('exclusive', 0, None))) == (('exclusive', None),
+                                                                                ('export', 'HOME'))
+
+
+def test_parse():
+    assert isinstance(parse({'Slurm': {'ignore': ['comment']}})['Slurm'], Rules)
+    with pytest.raises(ValueError):
+        parse({'Unknown': {}})
+    with pytest.raises(ValueError):
+        parse({'Slurm': {'merge': []}})
+
+
+def test_job_key(monkeypatch):
+    a = make_job('a', [('mail-user', 0, 'a@example.com'), ('nodes', 0, '1')])
+    b = make_job('b', [('mail-user', 0, 'b@example.com'), ('nodes', 0, '1')])
+    assert a.key() != b.key()
+    monkeypatch.setattr(equivalence, 'rules', parse({'Slurm': {'ignore': ['mail-user']}}))
+    assert a.key() == b.key() == ('Slurm', (('nodes', '1'),))
+
+
+def test_status_consolidation(tmpdir, monkeypatch, capsys):
+    from job_combine import job_combine
+
+    files = []
+    for i in range(6):
+        f = tmpdir.join('job%i.sh' % i)
+        f.write('#!/bin/bash\n#SBATCH --job-name=job%i\n#SBATCH --time=10:00\n#SBATCH --mail-user=user%i@example.com\n'
+                '#SBATCH --export=%s\n' % (i, i % 3, 'HOME,PATH' if i % 2 else 'PATH,HOME'))
+        files.append(str(f))
+    config = tmpdir.join('equivalence.json')
+    config.write(json.dumps({'Slurm': {'ignore': ['mail-user'], 'sort': ['export']}}))
+
+    def run(*args):
+        monkeypatch.setattr('sys.argv', ['job-combine', '-s', str(tmpdir.join('s'))] + list(args))
+        job_combine.main()
+        return capsys.readouterr().out
+
+    monkeypatch.setattr(equivalence, 'rules', {})
+    run('add', *files)
+    assert 'combined to 6 tasks' in run('status')
+    out = run('-e', str(config), 'status')
+    assert 'combined to 1 tasks' in out
+    assert 'consolidated 6 groups into 1' in out
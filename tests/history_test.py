@@ -0,0 +1,73 @@
+from datetime import timedelta
+
+import pytest
+
+from job_combine.cluster import ledger
+from job_combine.cluster.job import Job
+from job_combine.storage.history import *
+
+
+def make_job(file, name='run-1', minutes=60):
+    return Job(file, name, 'dir', timedelta(minutes=minutes), None, None, [], 'Slurm')
+
+
+def test_pattern():
+    assert pattern('sim-n128-r3') == 'sim-n#-r#'
+    assert pattern(None) == ''
+
+
+def test_record_ignores_duplicates(tmpdir):
+    with History(str(tmpdir.join('h'))) as runs:
+        assert runs.record([('a', 0, 10, 0), ('a', 100, 120, 0)]) == 2
+        assert runs.record([('a', 0, 10, 0), ('a', 200, 230, 1)]) == 1
+        assert runs.elapsed(make_job('a'), min_runs=1) == [20, 10]
+
+
+@pytest.mark.parametrize('method,expected', [('mean', 2 * 60 + 1), ('quantile', 4 * 60 + 1)])
+def test_predict(tmpdir, method, expected):
+    with History(str(tmpdir.join('h'))) as runs:
+        runs.record([('a', i * 1000, i * 1000 + minutes * 60, 0) for i, minutes in enumerate([1, 1, 2, 4])])
+        runs.record([('a', 9000, 9000 + 50 * 60, 1)])  # failed runs are not considered
+        assert runs.predict(make_job('a'), method, quantile=0.9, margin=0) == timedelta(seconds=expected)
+        # the requested time is an upper bound
+        assert runs.predict(make_job('a', minutes=1), method) == timedelta(minutes=1)
+
+
+def test_predict_by_pattern(tmpdir):
+    with History(str(tmpdir.join('h'))) as runs:
+        runs.record([('a%i' % i, 0, 60, 0) for i in range(3)], dict(('a%i' % i, 'run-%i' % i) for i in range(3)))
+        assert runs.predict(make_job('b', 'run-7'), margin=0) == timedelta(seconds=61)
+        assert runs.predict(make_job('b', 'other')) is None
+
+
+def test_import_ledgers(tmpdir):
+    tmpdir.ensure('00', ledger.DONE).write('a\na\t0\t60\t1060\nb\tTIMEOUT\t30\t1030\n')
+    with History(str(tmpdir.join('h'))) as runs:
+        assert runs.import_ledgers(str(tmpdir)) == 2
+        assert runs.import_ledgers(str(tmpdir)) == 0
+        assert runs.elapsed(make_job('a'), min_runs=1) == [60]
+        assert runs.elapsed(make_job('b'), min_runs=1) == []
+
+
+def test_queue_use_predicted(tmpdir, monkeypatch, capsys):
+    from job_combine import job_combine
+
+    files = []
+    for i in range(4):
+        f = tmpdir.join('job%i.sh' % i)
+        f.write('#!/bin/bash\n#SBATCH --job-name=job%i\n#SBATCH --time=30:00\n' % i)
+        files.append(str(f))
+    done = tmpdir.ensure('scripts', '00', ledger.DONE)
+    done.write(''.join('%s\t0\t60\t%i\n' % (f, end) for f in files for end in (60, 160, 260)))
+
+    def run(*args):
+        monkeypatch.setattr('sys.argv', ['job-combine', '-s', str(tmpdir.join('s'))] + list(args))
+        job_combine.main()
+        return capsys.readouterr().out
+
+    monkeypatch.chdir(tmpdir)
+    run('add', *files)
+    assert '4 partitions' in run('queue', '-t', '0:40:0')
+    out = run('queue', '-t', '0:40:0', '--use-predicted')
+    assert 'Predicted the times of 4 of 4 jobs.' in out
+    assert '1 partitions' in out
@@ -1,3 +1,5 @@
+from collections import defaultdict
+
 from job_combine.cluster.job import Job, sum_times
 from job_combine.job_combine import *
 
@@ -35,3 +37,49 @@ def test_partition_max_time():
     assert len(part) == 2
     assert sum_times(part[0]) == timedelta(minutes=30)
     assert sum_times(part[1]) == timedelta(minutes=30)
+
+
+def test_partition_min_time():
+    part = partition(jobs[job_a.key()], min_time=timedelta(minutes=25), parallel=3)
+    assert len(part) == 2
+    assert sum_times(part[0]) == timedelta(minutes=30)
+    assert sum_times(part[1]) == timedelta(minutes=30)
+
+
+def test_partition_many_jobs():
+    many = [Job('file_%i' % i, 'job', 'dir', timedelta(minutes=1 + i % 7), None, None, [], 'Slurm')
+            for i in range(5000)]
+    part = partition(many, max_time=timedelta(minutes=30))
+    assert sum(len(p) for p in part) == 5000
+    assert all(sum_times(p) <= timedelta(minutes=30) for p in part)
+    assert len(part) == -(-sum_times(many) // timedelta(minutes=30))
+
+
+def test_job_compact():
+    a = Job('a', 'job-a', 'dir', timedelta(minutes=10, seconds=0.4), None, None, [('p', 0, 'v')], 'Slurm')
+    b = Job('b', 'job-b', 'dir', 90, None, None, [('p', 0, 'v')], 'Slurm')
+    assert not hasattr(a, '__dict__')
+    assert (a.seconds, a.time, b.time) == (600, timedelta(minutes=10), timedelta(seconds=90))
+    assert a.params is b.params
+    a.time *= 1.5
+    assert a.seconds == 900
+
+
+def test_job_pickle():
+    import pickle
+    a = Job('a', 'job-a', 'dir', timedelta(minutes=10), 'a.out', None, [('p', 0, 'v')], 'Slurm')
+    b = pickle.loads(pickle.dumps(a, protocol=2))
+    assert (b.file, b.name, b.directory, b.time, b.stdout, b.stderr, b.params, b.manager_name) == \
+           ('a', 'job-a', 'dir', timedelta(minutes=10), 'a.out', None, (('p', 0, 'v'),), 'Slurm')
+    assert b.params is a.params
+
+    # stored by the previous version of Job
+    old = (b'\x80\x02cjob_combine.cluster.job\nJob\nq\x00)\x81q\x01}q\x02(X\x04\x00\x00\x00fileq\x03X\t\x00\x00\x00'
+           b'/a/job.shq\x04X\x04\x00\x00\x00nameq\x05X\x03\x00\x00\x00jobq\x06X\t\x00\x00\x00directoryq\x07X\x02\x00'
+           b'\x00\x00/aq\x08X\x04\x00\x00\x00timeq\tcdatetime\ntimedelta\nq\nK\x00M\x18\x15K\x00\x87q\x0bRq\x0cX\x06'
+           b'\x00\x00\x00stdoutq\rX\x01\x00\x00\x00oq\x0eX\x06\x00\x00\x00stderrq\x0fNX\x06\x00\x00\x00paramsq\x10X'
+           b'\x05\x00\x00\x00nodesq\x11K\x00X\x01\x00\x00\x002q\x12\x87q\x13\x85q\x14X\x0c\x00\x00\x00manager_nameq'
+           b'\x15X\x05\x00\x00\x00Slurmq\x16ub.')
+    c = pickle.loads(old)
+    assert (c.file, c.name, c.directory, c.time, c.stdout, c.stderr, c.params, c.manager_name) == \
+           ('/a/job.sh', 'job', '/a', timedelta(minutes=90), 'o', None, (('nodes', 0, '2'),), 'Slurm')
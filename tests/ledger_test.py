@@ -0,0 +1,79 @@
+import os
+import signal
+import subprocess
+import time
+from datetime import timedelta
+
+from job_combine import job_combine
+from job_combine.cluster import scripts
+from job_combine.cluster.job import Job
+from job_combine.cluster.ledger import *
+
+
+def test_parse():
+    assert parse('/a/job.sh\n') == Record('/a/job.sh', 0, None, None)
+    assert parse('/a/job.sh\t3\t20\t1000\n') == Record('/a/job.sh', 3, 20, 1000)
+    assert parse('/a/job.sh\tTIMEOUT\t20\t1000\n') == Record('/a/job.sh', TIMEOUT, 20, 1000)
+    assert parse('\n') is None
+    assert parse('/a/job.sh\t3\t20') is None  # partially written
+
+
+def test_latest():
+    records = [Record('a', 1, 5, 100), Record('a', 0, 5, 200), Record('b', 0, None, None), Record('b', 2, 5, 50)]
+    assert latest(records) == {'a': Record('a', 0, 5, 200), 'b': Record('b', 2, 5, 50)}
+
+
+def test_rotate(tmpdir):
+    assert not rotate(str(tmpdir))
+    for i in range(3):
+        tmpdir.join(DONE).write('/a/job%i.sh\t0\t20\t%i\n' % (i, 1000 + i))
+        assert rotate(str(tmpdir))
+        assert not tmpdir.join(DONE).check()
+    # the records of every earlier script are kept
+    assert [r.file for r in read(str(tmpdir.join(PREVIOUS)))] == ['/a/job0.sh', '/a/job1.sh', '/a/job2.sh']
+
+
+def make_jobs(tmpdir, bodies):
+    jobs = []
+    for i, body in enumerate(bodies):
+        f = tmpdir.join('job%i.sh' % i)
+        f.write('#!/bin/bash\n#SBATCH --job-name=job%i\n#SBATCH --time=1:00\n%s\n' % (i, body))
+        f.chmod(0o755)
+        jobs.append(Job(str(f), 'job%i' % i, str(tmpdir), timedelta(minutes=1), None, None, [], 'Slurm'))
+    return jobs
+
+
+def test_terminated_script(tmpdir):
+    jobs = make_jobs(tmpdir, ['exit 0', 'sleep 30', 'exit 0'])
+    for slots, script in ((1, scripts.sequential(jobs)), (2, scripts.parallel(jobs, 2))):
+        workdir = tmpdir.mkdir('combined%i' % slots)
+        workdir.join('job.sh').write(''.join(script))
+        proc = subprocess.Popen(['bash', 'job.sh'], cwd=str(workdir), preexec_fn=os.setsid)
+        time.sleep(1)
+        os.killpg(proc.pid, signal.SIGTERM)  # like the workload manager at the time limit
+        assert proc.wait() == 143
+
+        records = latest(read(str(workdir.join(DONE))))
+        assert records[jobs[0].file].status == 0
+        assert records[jobs[1].file].status == TIMEOUT
+        # the sequential script does not start further jobs
+        assert (jobs[2].file in records) == (slots == 2)
+
+
+def test_restart(tmpdir, monkeypatch):
+    jobs = make_jobs(tmpdir, ['exit 0', 'exit 1', 'exit 0', 'exit 0'])
+    done = tmpdir.ensure('scripts', '00', DONE)
+    done.write('%s\n%s\t1\t5\t1000\n%s\tTIMEOUT\t60\t1000\n%s\tTIMEOUT\t10\t1000\n' % tuple(j.file for j in jobs))
+
+    def run(*args):
+        monkeypatch.setattr('sys.argv', ['job-combine', '-s', str(tmpdir.join('s'))] + list(args))
+        job_combine.main()
+
+    monkeypatch.chdir(tmpdir)
+    run('add', *[j.file for j in jobs])
+    run('restart', '--adapt-time', 'auto')
+    with job_combine.backends.open_store(str(tmpdir.join('s'))) as storage:
+        remaining = dict((job.file, job.time) for group in storage.groups().values() for job in group)
+    # only the job that succeeded is removed; only the job that used up its time gets more time
+    assert remaining == {jobs[1].file: timedelta(minutes=1), jobs[2].file: timedelta(minutes=2),
+                         jobs[3].file: timedelta(minutes=1)}
@@ -0,0 +1,84 @@
+from datetime import timedelta
+from os import path
+
+from job_combine.cluster.job import Job
+from job_combine.storage.manifest import *
+
+
+def make_job(file, minutes=30):
+    return Job(file, 'job', 'dir', timedelta(minutes=minutes), None, None, [('nodes', 0, '1')], 'Slurm')
+
+
+def test_group_id_is_stable():
+    assert group_id(make_job('a').key()) == group_id(make_job('b').key())
+    assert group_id(make_job('a').key()) == 'g' + hashlib.sha1(repr(make_job('a').key()).encode()).hexdigest()[:12]
+
+
+def test_content_hash():
+    jobs = [make_job('a'), make_job('b')]
+    options = {'slots': 1, 'parallel': 2}
+    assert content_hash(jobs, options) == content_hash(list(reversed(jobs)), dict(options))
+    assert content_hash(jobs, options) != content_hash(jobs, dict(options, slots=2))
+    assert content_hash(jobs, options) != content_hash([make_job('a', 60), make_job('b')], options)
+
+
+def test_manifest(tmpdir):
+    script = tmpdir.ensure('g1', '00', 'submit.job')
+    manifest = Manifest(str(tmpdir))
+    assert not manifest.unchanged('g1', 'h')
+    assert manifest.update('g1', 'h', [[make_job('a')]], [str(script)]) == []
+    manifest.save()
+
+    manifest = Manifest(str(tmpdir))
+    assert manifest.groups['g1']['partitions'] == [['a']]
+    assert manifest.unchanged('g1', 'h')
+    assert not manifest.unchanged('g1', 'other')
+    assert manifest.update('g1', 'other', [], []) == [str(script)]
+    assert manifest.retain([]) == []
+    script.remove()
+    assert not Manifest(str(tmpdir)).unchanged('g1', 'h')
+
+
+def test_queue_incremental(tmpdir, monkeypatch, capsys):
+    from job_combine import job_combine
+
+    def write_jobs(nodes, n):
+        files = []
+        for i in range(n):
+            f = tmpdir.join('job-%i-%i.sh' % (nodes, i))
+            f.write('#!/bin/bash\n#SBATCH --job-name=job%i\n#SBATCH --time=30:00\n#SBATCH --nodes=%i\n' % (i, nodes))
+            files.append(str(f))
+        return files
+
+    def run(*args):
+        monkeypatch.setattr('sys.argv', ['job-combine', '-s', str(tmpdir.join('s'))] + list(args))
+        job_combine.main()
+        return capsys.readouterr().out
+
+    def scripts():
+        return sorted(path.relpath(path.join(root, f), str(tmpdir.join('scripts')))
+                      for root, _, files in os.walk(str(tmpdir.join('scripts'))) for f in files if f == 'submit.job')
+
+    monkeypatch.chdir(tmpdir)
+    run('add', *write_jobs(1, 4) + write_jobs(2, 2))
+    assert 'Skipped 0 of 2 groups' in run('queue', '--incremental', '-t', '1:00:00')
+    first = scripts()
+    assert len(first) == 3
+    assert len(set(path.dirname(path.dirname(f)) for f in first)) == 2
+
+    # nothing changed
+    for f in first:
+        tmpdir.join('scripts', f).write('unchanged')
+    assert 'Skipped 2 of 2 groups' in run('queue', '--incremental', '-t', '1:00:00')
+    assert [tmpdir.join('scripts', f).read() for f in first] == ['unchanged'] * 3
+
+    # only the group with the new job is written again and its directories stay the same
+    run('add', *write_jobs(2, 3))
+    assert 'Skipped 1 of 2 groups' in run('queue', '--incremental', '-t', '1:00:00')
+    assert len(scripts()) == 4
+    assert set(first) < set(scripts())
+    assert sorted(tmpdir.join('scripts', f).read() == 'unchanged' for f in first) == [False, True, True]
+
+    # changed options regenerate every group; outdated scripts are removed
+    assert 'Skipped 0 of 2 groups' in run('queue', '--incremental', '-t', '2:00:00')
+    assert len(scripts()) == 2
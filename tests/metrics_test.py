@@ -0,0 +1,61 @@
+import json
+import pstats
+
+from job_combine import job_combine
+from job_combine.utils import metrics
+
+
+def test_disabled_records_nothing():
+    metrics.disable()
+    with metrics.phase('a'):
+        metrics.count('b')
+        metrics.observe('c', 1)
+    assert not metrics.recorder.enabled
+    assert metrics.phase('a') is metrics.phase('b')  # no objects are created
+
+
+def test_recorder(tmpdir):
+    recorder = metrics.enable()
+    try:
+        for _ in range(3):
+            with metrics.phase('a'):
+                metrics.count('b', 2)
+        for v in (3, 1, 2):
+            metrics.observe('c', v)
+        metrics.save(str(tmpdir.join('m.json')), mode='test')
+    finally:
+        metrics.disable()
+
+    assert recorder.phases['a'][1] == 3
+    with open(str(tmpdir.join('m.json'))) as f:
+        data = json.load(f)
+    assert data['mode'] == 'test'
+    assert data['phases']['a']['calls'] == 3
+    assert data['counters'] == {'b': 6}
+    assert data['observations']['c'] == {'count': 3, 'min': 1, 'mean': 2.0, 'median': 2, 'max': 3}
+
+
+def test_queue_metrics_and_profile(tmpdir, monkeypatch):
+    files = []
+    for i in range(4):
+        f = tmpdir.join('job%i.sh' % i)
+        f.write('#!/bin/bash\n#SBATCH --job-name=job%i\n#SBATCH --time=10:00\n' % i)
+        files.append(str(f))
+    monkeypatch.chdir(tmpdir)
+
+    def run(*args):
+        monkeypatch.setattr('sys.argv', ['job-combine', '-s', str(tmpdir.join('s'))] + list(args))
+        job_combine.main()
+
+    run('add', *files)
+    run('--metrics-json', 'm.json', '--profile', 'p.prof', 'queue', '-p', '2')
+    metrics.disable()
+
+    with open(str(tmpdir.join('m.json'))) as f:
+        data = json.load(f)
+    assert data['mode'] == 'queue'
+    assert set(['load', 'partition', 'combine', 'combine.names', 'write']) <= set(data['phases'])
+    assert data['counters']['jobs'] == 4
+    assert data['counters']['partitions'] == 2
+    assert data['counters']['bytes_written'] == sum(f.size() for f in tmpdir.join('scripts').visit('submit.job'))
+    assert pstats.Stats(str(tmpdir.join('p.prof'))).total_calls > 0
@@ -0,0 +1,53 @@
+import itertools
+import random
+
+import pytest
+
+from job_combine.utils.names import *
+
+
+def brute_force(names):
+    base = min(set(names), key=lambda s: (len(s), s))
+    for length in range(len(base), 0, -1):
+        for i in range(len(base) - length + 1):
+            if all(base[i:i + length] in n for n in names):
+                return base[i:i + length]
+    return ''
+
+
+def test_longest_common_substring():
+    assert longest_common_substring(['sim-a-1', 'run-sim-a-2', 'sim-a-3-x']) == 'sim-a-'
+    assert longest_common_substring(['abc']) == 'abc'
+    assert longest_common_substring(['abc', 'xyz']) == ''
+    assert longest_common_substring(['abc', '']) == ''
+    assert longest_common_substring([]) == ''
+
+
+def test_longest_common_substring_random():
+    rnd = random.Random(0)
+    for _ in range(500):
+        names = [''.join(rnd.choice('ab-') for _ in range(rnd.randint(0, 10))) for _ in range(rnd.randint(1, 4))]
+        assert longest_common_substring(names) == brute_force(names)
+
+
+def test_longest_common_substring_order():
+    # 'ab' and 'cd' are equally long; the first in the shortest name wins regardless of the order
+    names = ['cd-ab', 'ab-cd', 'xabxcdx']
+    results = set(longest_common_substring(list(p)) for p in itertools.permutations(names))
+    assert results == {'ab'}
+
+
+def test_naming_policies():
+    job_names = ['run-17-simulation', 'run-23-simulation', None]
+    assert Naming().name(job_names[:2]) == '-simulation'
+    assert Naming('prefix').name(job_names[:2]) == 'run-'
+    assert Naming('template', 'c{counter:02d}-{prefix}').name(job_names[:2], 3) == 'c03-run-'
+    assert Naming().name(job_names) == DEFAULT_NAME
+    assert Naming('template').name(job_names, 1) == 'Job-1'
+
+
+def test_naming_invalid():
+    with pytest.raises(ValueError):
+        Naming('suffix')
+    with pytest.raises(ValueError):
+        Naming('template', '{unknown}')
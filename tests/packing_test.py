@@ -0,0 +1,127 @@
+import os
+import subprocess
+from datetime import timedelta
+
+import pytest
+
+from job_combine.cluster import ledger
+from job_combine.cluster.job import Job
+from job_combine.job_combine import combine_packed
+from job_combine.partitioning.packing import *
+
+BIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bin')
+
+
+def make_job(file, minutes, nodes=None, tasks=None, cpus=None, directory='dir'):
+    params = [('partition', 0, 'micro')]
+    if nodes is not None:
+        params.append(('nodes', 0, str(nodes)))
+    if tasks is not None:
+        params.append(('n', 1, str(tasks)))
+    if cpus is not None:
+        params.append(('cpus-per-task', 0, str(cpus)))
+    return Job(file, file, directory, timedelta(minutes=minutes), None, None, params, 'Slurm')
+
+
+def test_resources():
+    assert resources(make_job('a', 1)) == Resources(1, 1, 1)
+    assert resources(make_job('a', 1, '2-4', 8, 2)) == Resources(2, 8, 2)
+    params = [('nodes', 0, '2'), ('ntasks-per-node', 0, '28')]
+    job = Job('a', 'a', 'dir', timedelta(minutes=1), None, None, params, 'Slurm')
+    assert resources(job) == Resources(2, 56, 1)
+    assert node_cores(resources(job)) == 28
+    job = Job('a', 'a', 'dir', timedelta(minutes=1), None, None, params + [('n', 1, '30')], 'Slurm')
+    assert resources(job) == Resources(2, 30, 1)  # the number of tasks takes precedence
+    with pytest.raises(ValueError):
+        resources(make_job('a', 1, 'many'))
+    assert cores(Resources(4, 2, 1)) == 4
+
+
+def test_pack_key():
+    assert pack_key(make_job('a', 1, 1, 4)) == pack_key(make_job('b', 1, 2, 28, 2)) == ('Slurm', (('partition', 0,
+                                                                                                  'micro'),))
+
+
+def test_shelves():
+    jobs = [make_job('a', 30), make_job('b', 60), make_job('c', 20), make_job('d', 10)]
+    demand = {'a': (1, 2), 'b': (1, 3), 'c': (1, 2), 'd': (1, 1)}
+    result = shelves(jobs, 1, 4, demand)
+    assert [[job.file for job in shelf.jobs] for shelf in result] == [['b', 'd'], ['a', 'c']]
+    assert [shelf.seconds for shelf in result] == [3600, 1800]
+
+
+def test_shelves_node_boundaries():
+    # 3 + 3 + 2 cores fit into 2 nodes of 4 cores only when the jobs may span nodes
+    jobs = [make_job('a', 30, 1, 3), make_job('b', 30, 1, 3), make_job('c', 30, 1, 2)]
+    packed = Packing(jobs, 2, 4)
+    assert [[job.file for job in shelf.jobs] for shelf in packed.allocations[0]] == [['a', 'b'], ['c']]
+    # a job on two nodes needs free cores on both
+    jobs = [make_job('a', 30, 1, 3), make_job('b', 20, 2, 4), make_job('c', 10, 1, 1)]
+    result = shelves(jobs, 2, 4, {'a': (1, 3), 'b': (2, 2), 'c': (1, 1)})
+    assert [[job.file for job in shelf.jobs] for shelf in result] == [['a', 'c'], ['b']]
+    assert node_cores(Resources(2, 3, 2)) == 4
+
+
+def test_allocate():
+    result = shelves([make_job(f, m) for f, m in zip('abcd', [50, 40, 30, 20])], 1, 1, dict.fromkeys('abcd', (1, 1)))
+    assert [[s.seconds // 60 for s in a] for a in allocate(result, 60 * 60)] == [[50], [40, 20], [30]]
+    assert [[s.seconds // 60 for s in a] for a in allocate(result, parallel=2)] == [[50, 20], [40, 30]]
+
+
+def test_packing_utilization():
+    jobs = [make_job('a', 60, 1, 14, 2), make_job('b', 60, 2, 28), make_job('c', 30, 1, 4), make_job('d', 30, 1, 4)]
+    packed = Packing(jobs, cores_per_node=28)
+    assert (packed.nodes, len(packed.allocations)) == (2, 1)
+    assert packed.used == (28 * 60 + 28 * 60 + 4 * 30 + 4 * 30) * 60
+    # b needs cores on both nodes, so it can not run next to a
+    assert packed.capacity() == 56 * 120 * 60
+    assert packed.separate_capacity(jobs) == 28 * (60 + 2 * 60 + 30 + 30) * 60
+    with pytest.raises(ValueError):
+        Packing(jobs, cores_per_node=8)
+
+
+def test_packed_script(tmpdir):
+    jobs = []
+    for i, (nodes, tasks) in enumerate([(1, 2), (2, 4), (1, 1)]):
+        file = tmpdir.join('job%i.sh' % i)
+        file.write('#!/bin/bash\necho job%i\n' % i)
+        file.chmod(0o755)
+        jobs.append(make_job(str(file), 10 - i, nodes, tasks, directory=str(tmpdir)))
+    packed = Packing(jobs, cores_per_node=4)
+    c_job, c_script = combine_packed(packed.allocations[0], (('partition', 0, 'micro'),), packed.nodes,
+                                     packed.cores_per_node)
+    assert ('#SBATCH --nodes=2\n#SBATCH --ntasks=8\n#SBATCH --ntasks-per-node=4\n#SBATCH --partition=micro\n'
+            in c_job.to_string())
+    assert c_job.time == timedelta(minutes=10)
+
+    workdir = tmpdir.mkdir('combined')
+    workdir.join('job.sh').write('#!/bin/bash\n' + ''.join(c_script))
+    env = dict(os.environ, PATH=BIN + os.pathsep + os.environ['PATH'], SRUN_LOG=str(tmpdir.join('srun.log')))
+    out = subprocess.check_output(['bash', 'job.sh'], cwd=str(workdir), env=env).decode()
+    # every job runs once in a step reserving its cores on each of its nodes
+    assert sorted(out.split()) == ['job0', 'job1', 'job2']
+    steps = sorted(line.split(' bash ')[0] + ' ' + line.split()[-1] for line in tmpdir.join('srun.log').readlines())
+    assert steps == ['--exclusive --nodes=%i --ntasks=%i --ntasks-per-node=1 --cpus-per-task=%i %s' % (n, n, c, f)
+                     for n, c, f in sorted([(1, 2, jobs[0].file), (2, 2, jobs[1].file), (1, 1, jobs[2].file)])]
+    assert [r.status for r in ledger.read(str(workdir.join(ledger.DONE)))] == [0, 0, 0]
+
+
+def test_queue_pack_unsupported(tmpdir, monkeypatch, capsys):
+    from job_combine import job_combine
+
+    files = []
+    for i, tasks in enumerate([2, 1]):
+        f = tmpdir.join('slurm%i.sh' % i)
+        f.write('#!/bin/bash\n#SBATCH --job-name=s%i\n#SBATCH --time=10:00\n#SBATCH --ntasks=%i\n' % (i, tasks))
+        files.append(str(f))
+    f = tmpdir.join('ll.sh')
+    f.write('#!/bin/bash\n#@ job_name = ll\n#@ wall_clock_limit = 00:10:00\n#@ queue\n')
+    files.append(str(f))
+    monkeypatch.chdir(tmpdir)
+    for args in (['add'] + files, ['queue', '--pack']):
+        monkeypatch.setattr('sys.argv', ['job-combine', '-s', str(tmpdir.join('s'))] + args)
+        job_combine.main()
+
+    assert 'WARNING: LoadLeveler does not support packing' in capsys.readouterr().out
+    assert 'srun --exclusive' in tmpdir.join('scripts', '00', 'submit.job').read()
+    assert '#@ job_name = ll' in tmpdir.join('scripts', '01', 'submit.job').read()
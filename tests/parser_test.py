@@ -0,0 +1,42 @@
+from datetime import timedelta
+
+from job_combine.cluster.job import Job
+from job_combine.cluster.managers import managers
+from job_combine.cluster.parser import *
+
+
+def test_parse_slurm():
+    p = parser(managers['Slurm'])
+    assert p.parse('#SBATCH --time=1:00:00\n') == ('time', 0, '1:00:00', TIME)
+    assert p.parse('#SBATCH -J my job \n') == ('J', 1, 'my job', NAME)
+    assert p.parse('#SBATCH --nodes=2\n') == ('nodes', 0, '2', None)
+    assert p.parse('#SBATCH --exclusive\n') == ('exclusive', 0, None, None)
+    assert p.parse('#SBATCH -D dir\n') == ('D', 1, 'dir', DIRECTORY)
+
+
+def test_parse_loadleveler():
+    p = parser(managers['LoadLeveler'])
+    assert p.parse('#@ wall_clock_limit = 01:00:00\n') == ('wall_clock_limit', 0, '01:00:00', TIME)
+    assert p.parse('#@ queue\n') == ('queue', 0, None, None)
+
+
+def test_header():
+    lines = ['#!/bin/bash\n', '#SBATCH -J a\n', '\n', '# comment\n', '#SBATCH -N 1\n', 'echo\n', '#SBATCH -N 2\n']
+    assert list(header(lines)) == ['#!/bin/bash\n', '#SBATCH -J a\n', '# comment\n', '#SBATCH -N 1\n']
+
+
+def test_from_file_stops_at_script(tmpdir):
+    f = tmpdir.join('job.sh')
+    f.write('#!/bin/bash\n#SBATCH --job-name=a\n#SBATCH --time=10:00\n#SBATCH --chdir=ignored\n\n'
+            'cat <<EOF\n#SBATCH --nodes=2\nEOF\n')
+    job = Job.from_file(str(f), verbose=False)
+    assert job.name == 'a'
+    assert job.time == timedelta(minutes=10)
+    assert job.params == (('chdir', 0, 'ignored'),)
+
+
+def test_from_file_directory(tmpdir):
+    f = tmpdir.join('job.sh')
+    f.write('#!/bin/bash\n#SBATCH -D sub\n')
+    job = Job.from_file(str(f), verbose=False)
+    assert job.directory == str(tmpdir.join('sub'))
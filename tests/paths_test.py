@@ -0,0 +1,59 @@
+import pytest
+
+from job_combine.utils.paths import *
+
+
+def make_tree(tmpdir):
+    tmpdir.join('a.job').write('')
+    tmpdir.join('b.job').write('')
+    tmpdir.join('c.txt').write('')
+    tmpdir.mkdir('sub').join('d.job').write('')
+    return str(tmpdir)
+
+
+def test_expand_glob(tmpdir):
+    root = make_tree(tmpdir)
+    files, unmatched = expand([path.join(root, '*.job'), path.join(root, 'a.job')])
+    assert files == [path.join(root, 'a.job'), path.join(root, 'b.job')]
+    assert unmatched == []
+
+
+def test_expand_directory(tmpdir):
+    root = make_tree(tmpdir)
+    files, unmatched = expand([root])
+    assert files == []
+    assert unmatched == [root]
+
+    files, unmatched = expand([root], recursive=True)
+    assert [path.relpath(f, root) for f in files] == ['a.job', 'b.job', 'c.txt', path.join('sub', 'd.job')]
+    assert unmatched == []
+
+
+def test_expand_missing(tmpdir):
+    root = make_tree(tmpdir)
+    files, unmatched = expand([path.join(root, 'x.job'), path.join(root, '*.x')])
+    assert files == []
+    assert unmatched == [path.join(root, 'x.job'), path.join(root, '*.x')]
+
+
+def test_read_list(tmpdir):
+    tmpdir.join('list').write('a.job\n\n  b.job \n')
+    assert read_list(str(tmpdir.join('list'))) == ['a.job', 'b.job']
+
+
+def test_write_atomic(tmpdir):
+    file = str(tmpdir.join('out.txt'))
+    assert write_atomic(file, (part for part in ['a', 'bc', '\n'])) == 4
+    assert open(file).read() == 'abc\n'
+    # the size is counted in bytes of the written file, not in characters
+    assert write_atomic(str(tmpdir.join('name.txt')), [u'r\u00e9sum\u00e9\n']) == tmpdir.join('name.txt').size()
+
+    def failing():
+        yield 'partial'
+        raise RuntimeError('generator failed')
+
+    with pytest.raises(RuntimeError):
+        write_atomic(file, failing())
+    # the previous content is kept and no temporary file is left behind
+    assert open(file).read() == 'abc\n'
+    assert sorted(os.listdir(str(tmpdir))) == ['name.txt', 'out.txt']
@@ -0,0 +1,184 @@
+import os
+import subprocess
+from os import path
+from datetime import timedelta
+
+import pytest
+
+from job_combine.cluster import ledger, scripts
+from job_combine.cluster.job import Job, slot_time
+from job_combine.job_combine import combine, partition, write_scripts
+
+DATA = os.path.join(os.path.dirname(__file__), 'data', 'scripts')
+
+
+def make_jobs(tmpdir, n, sleep=0):
+    jobs = []
+    for i in range(n):
+        directory = tmpdir.mkdir('job%i' % i)
+        file = directory.join('job.sh')
+        file.write('#!/bin/bash\nsleep %s\nfor k in 1 2 3; do echo "job%i line $k"; sleep 0.01; done\n' % (sleep, i))
+        file.chmod(0o755)
+        jobs.append(Job(str(file), 'job%i' % i, str(directory), timedelta(minutes=i + 1), None, None, [], 'Slurm'))
+    return jobs
+
+
+def test_slot_time():
+    jobs = [Job('f%i' % i, 'j', 'd', timedelta(minutes=m), None, None, [], 'Slurm') for i, m in enumerate([5, 3, 2, 2])]
+    assert slot_time(jobs) == timedelta(minutes=12)
+    assert slot_time(jobs, 2) == timedelta(minutes=7)
+    assert slot_time(jobs, 4) == timedelta(minutes=5)
+
+
+def test_partition_slots():
+    jobs = [Job('f%i' % i, 'j', 'd', timedelta(minutes=10), None, None, [], 'Slurm') for i in range(8)]
+    assert len(partition(jobs, max_time=timedelta(minutes=40))) == 2
+    assert len(partition(jobs, max_time=timedelta(minutes=40), slots=4)) == 1
+
+
+def test_partition_slots_max_time(capsys):
+    # the long job alone exceeds the time limit although the total time divided by the slots does not
+    jobs = [Job('f%i' % i, 'j', 'd', timedelta(minutes=m), None, None, [], 'Slurm')
+            for i, m in enumerate([60, 1, 1, 1])]
+    part = partition(jobs, max_time=timedelta(minutes=30), slots=4)
+    out = capsys.readouterr().out
+    assert 'WARNING: Could not fulfill max_time = 0:30:00 constraint as there exists a single script' in out
+    assert '4 partitions with times: 1:00:00, 0:01:00, 0:01:00, 0:01:00' in out
+    assert max(slot_time(p, 4) for p in part) == timedelta(minutes=60)
+
+
+def test_sequential_redirects_output():
+    job = Job('/a/job.sh', 'job', '/a', timedelta(minutes=1), 'job.log', 'job.error', [], 'Slurm')
+    # like earlier versions, the output is written to the files of the combined job in the directory of the job
+    assert '"/a/job.sh" >job.out 2>job.err\n' in ''.join(scripts.sequential([job]))
+
+
+def fixed_jobs():
+    return [Job('/data/run%i/job.sh' % i, 'run%i' % i, '/data/run%i' % i, timedelta(minutes=10 * (i + 1)),
+                'run%i.out' % i if i % 2 else None, 'run%i.err' % i if i == 2 else None, [], 'Slurm') for i in range(3)]
+
+
+@pytest.mark.parametrize('name, script', [
+    ('sequential.sh', lambda jobs: scripts.sequential(jobs)),
+    ('sequential-requeue.sh', lambda jobs: scripts.sequential(jobs, 3600, 'scontrol requeue $SLURM_JOB_ID')),
+    ('parallel.sh', lambda jobs: scripts.parallel(jobs, 2, 'srun --exclusive --nodes=1 --ntasks=1', 3600,
+                                                  'scontrol requeue $SLURM_JOB_ID')),
+    ('dynamic.sh', lambda jobs: scripts.dynamic('/data/queue-00', 3600)),
+])
+def test_scripts_unchanged(name, script):
+    # the generated scripts are byte-identical to the scripts of earlier versions
+    with open(os.path.join(DATA, name)) as f:
+        assert ''.join(script(fixed_jobs())) == f.read()
+
+
+def test_write_scripts(tmpdir):
+    written = write_scripts([combine([job]) for job in fixed_jobs()], str(tmpdir), 3, workers=2)
+    expected = [job.to_string() + '\n' + ''.join(combine([j])[1]) for job, j in zip(written, fixed_jobs())]
+    assert [path.relpath(job.file, str(tmpdir)) for job in written] == [path.join('%02i' % i, 'submit.job')
+                                                                       for i in (3, 4, 5)]
+    for job, content in zip(written, expected):
+        with open(job.file) as f:
+            assert f.read() == content
+    assert sorted(os.listdir(str(tmpdir.join('03')))) == ['submit.job']
+
+
+def test_parallel_script(tmpdir):
+    jobs = make_jobs(tmpdir, 6)
+    c_job, c_script = combine(jobs, slots=3)
+    assert c_job.time == timedelta(minutes=9)
+
+    workdir = tmpdir.mkdir('combined')
+    script = workdir.join('job.sh')
+    script.write('#!/bin/bash\n' + ''.join(c_script))
+    out = subprocess.check_output(['bash', str(script)], cwd=str(workdir)).decode()
+
+    done = ledger.read(str(workdir.join('done')))
+    assert sorted(record.file for record in done) == sorted(job.file for job in jobs)
+    assert [record.status for record in done] == [0] * 6
+    # the output of every job is printed in one piece
+    lines = out.splitlines()
+    assert len(lines) == 18
+    for i in range(0, 18, 3):
+        name = lines[i].split()[0]
+        assert lines[i:i + 3] == ['%s line %i' % (name, k) for k in (1, 2, 3)]
+    assert not [f for f in os.listdir(str(workdir)) if f.startswith('.job-')]
+
+
+def test_parallel_redirected_output(tmpdir):
+    # jobs of the same directory redirecting their output do not truncate the output of each other
+    jobs = make_jobs(tmpdir, 2, sleep=0.2)
+    for job in jobs:
+        job.directory = str(tmpdir)
+        job.stdout = 'job.log'
+    workdir = tmpdir.mkdir('combined')
+    script = workdir.join('job.sh')
+    script.write('#!/bin/bash\n' + ''.join(combine(jobs, slots=2)[1]))
+    out = subprocess.check_output(['bash', str(script)], cwd=str(workdir)).decode()
+    assert sorted(out.splitlines()) == ['job%i line %i' % (i, k) for i in range(2) for k in (1, 2, 3)]
+    assert not tmpdir.join('job.out').check()
+
+
+def run_script(workdir, script):
+    workdir.join('job.sh').write('#!/bin/bash\n' + ''.join(script))
+    return subprocess.call(['bash', 'job.sh'], cwd=str(workdir))
+
+
+def counting_jobs(tmpdir, minutes):
+    jobs = []
+    for i, m in enumerate(minutes):
+        file = tmpdir.join('job%i.sh' % i)
+        file.write('#!/bin/bash\necho run >> runs%i\n' % i)
+        file.chmod(0o755)
+        jobs.append(Job(str(file), 'job%i' % i, str(tmpdir), timedelta(minutes=m), None, None, [], 'Slurm'))
+    return jobs
+
+
+@pytest.mark.parametrize('slots', [1, 2])
+def test_resume_skips_succeeded(tmpdir, slots):
+    jobs = counting_jobs(tmpdir, [1, 1, 1])
+    jobs[2].file = str(tmpdir.join('missing.sh'))  # fails
+    workdir = tmpdir.mkdir('combined')
+    for _ in range(2):
+        assert run_script(workdir, combine(jobs, slots)[1]) == 0
+    assert tmpdir.join('runs0').read() == 'run\n'
+    assert tmpdir.join('runs1').read() == 'run\n'
+    assert len(ledger.read(str(workdir.join(ledger.DONE)))) == 4  # the failed job ran again
+
+
+def test_new_script_runs_jobs_again(tmpdir):
+    jobs = counting_jobs(tmpdir, [1, 1])
+    for run in range(2):
+        # e.g. queue after clearing and adding the jobs again; resubmitting the script skips the succeeded jobs
+        written = write_scripts([combine(jobs)], str(tmpdir.join('scripts')), 0)
+        for _ in range(2):
+            subprocess.check_call(['bash', written[0].file], cwd=written[0].directory)
+        assert tmpdir.join('runs0').read() == 'run\n' * (run + 1)
+    assert len(ledger.read(str(tmpdir.join('scripts', '00', ledger.DONE)))) == 2
+    assert len(ledger.read(str(tmpdir.join('scripts', '00', ledger.PREVIOUS)))) == 2
+
+
+@pytest.mark.parametrize('slots', [1, 2])
+def test_requeue(tmpdir, slots):
+    jobs = counting_jobs(tmpdir, [1, 30, 1])
+    script = scripts.parallel if slots > 1 else scripts.sequential
+    args = (jobs, slots) if slots > 1 else (jobs,)
+    workdir = tmpdir.mkdir('combined')
+
+    # the second job does not fit into the ten minutes of the allocation
+    assert run_script(workdir, script(*args, walltime=600, requeue='echo requeued > requeued')) == scripts.REQUEUE_EXIT
+    assert workdir.join('requeued').check()
+    assert [r.file for r in ledger.read(str(workdir.join(ledger.DONE)))] == [jobs[0].file]
+
+    assert run_script(workdir, script(*args, walltime=3600)) == 0
+    assert [tmpdir.join('runs%i' % i).read() for i in range(3)] == ['run\n'] * 3
+
+
+def test_combine_requeue():
+    jobs = [Job('/a/job%i.sh' % i, 'job', '/a', timedelta(minutes=10), None, None, [], 'Slurm') for i in range(2)]
+    c_job, c_script = combine(jobs, requeue=True)
+    c_script = ''.join(c_script)
+    assert '#SBATCH --requeue\n' in c_job.to_string()
+    assert 'jc_walltime=1200\n' in c_script
+    assert 'scontrol requeue $SLURM_JOB_ID' in c_script
+    assert 'jc_fits 600 || jc_requeue\n' in c_script
+    assert 'jc_walltime' not in ''.join(combine(jobs)[1])
@@ -0,0 +1,127 @@
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import pytest
+
+from job_combine import client
+from job_combine.storage import backends
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENV = dict(os.environ, PYTHONPATH=ROOT)
+
+
+def write_jobs(tmpdir, n):
+    for i in range(n):
+        tmpdir.join('job%i.sh' % i).write('#!/bin/bash\n#SBATCH --job-name=job%i\n#SBATCH --time=10:00\necho job%i\n'
+                                          % (i, i))
+
+
+def run_client(tmpdir, *args, **kwargs):
+    proc = subprocess.Popen([sys.executable, '-c', 'from job_combine import client; client.main()'] + list(args),
+                            cwd=str(tmpdir), env=ENV, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE)
+    out, err = proc.communicate(kwargs.get('stdin', '').encode(), timeout=60)
+    return proc.returncode, out.decode(), err.decode()
+
+
+def stored_files(tmpdir):
+    with backends.open_store(str(tmpdir.join('s'))) as storage:
+        return sorted(os.path.basename(job.file) for v in storage.groups().values() for job in v)
+
+
+@pytest.fixture
+def server(tmpdir):
+    proc = subprocess.Popen([sys.executable, '-m', 'job_combine.job_combine', '-s', 's', 'serve', '--flush-interval',
+                             '600'], cwd=str(tmpdir), env=ENV, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    for _ in range(100):
+        if tmpdir.join('s.sock').check():
+            break
+        time.sleep(0.1)
+    try:
+        yield proc
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+
+
+def stop(proc):
+    proc.send_signal(signal.SIGTERM)
+    out = proc.communicate(timeout=30)[0].decode()
+    assert proc.returncode == 0
+    return out
+
+
+def test_global_options():
+    assert client.global_options(['-s', 'x', '-v', '--socket=y', 'add', '-s']) == \
+        ('add', {'--storage-file': 'x', '-v': True, '--socket': 'y'})
+    assert client.global_options(['-sx', '--no-server', 'status']) == ('status', {'--storage-file': 'x',
+                                                                                 '--no-server': True})
+    assert client.global_options(['-h']) == (None, {'-h': True})
+    assert client.socket_file({}) == 'job_combine.storage.sock'
+    assert client.socket_file({'--storage-file': 'x'}) == 'x.sock'
+
+
+def test_direct_without_server(tmpdir):
+    write_jobs(tmpdir, 2)
+    # a socket file left behind by a killed server is ignored
+    tmpdir.join('s.sock').write('')
+    assert run_client(tmpdir, '-s', 's', 'add', 'job0.sh', 'job1.sh')[0] == 0
+    assert stored_files(tmpdir) == ['job0.sh', 'job1.sh']
+
+
+def test_serve(tmpdir, server):
+    write_jobs(tmpdir, 3)
+    status, out, _ = run_client(tmpdir, '-s', 's', 'add', 'job0.sh', 'job1.sh')
+    assert status == 0 and 'Added 2 of 2 job files' in out
+    out = run_client(tmpdir, '-s', 's', 'add', '-f', '-', stdin='job2.sh\n')[1]
+    assert 'Added 1 of 1 job files' in out
+    assert 'Stored 3 jobs' in run_client(tmpdir, '-s', 's', 'status')[1]
+
+    # the changes are written behind
+    assert stored_files(tmpdir) == []
+    assert 'Stored 0 jobs' in run_client(tmpdir, '-s', 's', '--no-server', 'status')[1]
+
+    assert run_client(tmpdir, '-s', 's', 'remove', 'job1.sh')[0] == 0
+    status, out, err = run_client(tmpdir, '-s', 's', 'queue', '-d', 'out', '--unknown')
+    assert status == 2 and 'unrecognized arguments: --unknown' in err
+    assert run_client(tmpdir, '-s', 's', 'queue', '-d', 'out')[0] == 0
+    script = tmpdir.join('out', '00', 'submit.job').read()
+    assert '--time=00-00:20:00' in script and str(tmpdir.join('job2.sh')) in script
+
+    assert 'Serving 0 stored jobs' in stop(server)
+    assert stored_files(tmpdir) == ['job0.sh', 'job2.sh']
+    assert not tmpdir.join('s.sock').check()
+
+
+def test_serve_fallback(tmpdir, server):
+    write_jobs(tmpdir, 1)
+    # another storage file is used directly even if the socket of the server is given
+    assert run_client(tmpdir, '-s', 'other', '--socket', 's.sock', 'add', 'job0.sh')[0] == 0
+    with backends.open_store(str(tmpdir.join('other'))) as storage:
+        assert len(storage.groups()) == 1
+    assert 'Stored 0 jobs' in run_client(tmpdir, '-s', 's', 'status')[1]
+
+    # the served storage file may be read but not changed directly
+    assert 'Stored 0 jobs' in run_client(tmpdir, '-s', 's', '--no-server', 'status')[1]
+    tmpdir.join('rules.json').write('{}')
+    for args in (['--no-server', 'add', 'job0.sh'], ['-e', 'rules.json', 'remove', 'job0.sh'],
+                 ['--no-server', 'clear']):
+        status, _, err = run_client(tmpdir, '-s', 's', *args)
+        assert status != 0 and 'is kept in memory by `job-combine serve`' in err
+    assert tmpdir.join('s').check()
+
+    # clear removes the jobs kept by the server instead of its storage file
+    run_client(tmpdir, '-s', 's', 'add', 'job0.sh')
+    assert 'Removed all stored jobs.' in run_client(tmpdir, '-s', 's', 'clear')[1]
+    assert 'Stored 0 jobs' in run_client(tmpdir, '-s', 's', 'status')[1]
+    stop(server)
+    assert stored_files(tmpdir) == []
+
+    # the storage file can be cleared directly once the server stopped, including the lock of the server
+    assert tmpdir.join('s' + backends.SERVED_SUFFIX).check()
+    assert run_client(tmpdir, '-s', 's', 'clear')[0] == 0
+    assert sorted(f for f in os.listdir(str(tmpdir)) if f.startswith('s.') or f == 's') == ['s.sock.lock']
@@ -0,0 +1,139 @@
+import multiprocessing
+import pickle
+from collections import defaultdict
+from datetime import timedelta
+
+import pytest
+
+from job_combine.cluster.job import Job
+from job_combine.storage.backends import *
+
+
+def make_job(file, minutes=10, params=(('param1', 0, 'val1'),)):
+    return Job(file, 'job', 'dir', timedelta(minutes=minutes), None, None, list(params), 'Slurm')
+
+
+@pytest.mark.parametrize('backend', available_backends())
+def test_add_remove(tmpdir, backend):
+    file = str(tmpdir.join('job.storage'))
+    with open_store(file, backend) as storage:
+        storage.add([make_job('a'), make_job('b'), make_job('c', params=[])])
+
+    with open_store(file, backend) as storage:
+        groups = storage.groups()
+        assert len(groups) == 2
+        assert [j.file for j in groups[make_job('a').key()]] == ['a', 'b']
+        assert storage.remove(['b', 'x']) == 1
+
+    with open_store(file, backend) as storage:
+        assert sorted(j.file for g in storage.groups().values() for j in g) == ['a', 'c']
+
+
+@pytest.mark.parametrize('backend', available_backends())
+def test_add_replaces(tmpdir, backend):
+    file = str(tmpdir.join('job.storage'))
+    with open_store(file, backend) as storage:
+        storage.add([make_job('a'), make_job('b')])
+        storage.add([make_job('a', minutes=20)])
+
+    with open_store(file, backend) as storage:
+        group = storage.groups()[make_job('a').key()]
+        assert [(j.file, j.time) for j in group] == [('a', timedelta(minutes=20)), ('b', timedelta(minutes=10))]
+
+
+@pytest.mark.parametrize('backend', available_backends())
+def test_update(tmpdir, backend):
+    file = str(tmpdir.join('job.storage'))
+    with open_store(file, backend) as storage:
+        storage.add([make_job('a')])
+
+    with open_store(file, backend) as storage:
+        jobs = storage.groups()[make_job('a').key()]
+        jobs.first().time *= 2
+        storage.update(jobs)
+
+    with open_store(file, backend) as storage:
+        assert storage.groups()[make_job('a').key()].first().time == timedelta(minutes=20)
+
+
+@pytest.mark.parametrize('backend', available_backends())
+def test_add_changed_key(tmpdir, backend):
+    file = str(tmpdir.join('job.storage'))
+    with open_store(file, backend) as storage:
+        storage.add([make_job('a'), make_job('b')])
+        storage.groups()
+        storage.add([make_job('a', params=[])])
+        assert [len(g) for g in storage.groups().values()] == [1, 1]
+
+    with open_store(file, backend) as storage:
+        assert storage.groups()[make_job('a', params=[]).key()].get('a') is not None
+        assert 'a' not in storage.groups()[make_job('b').key()]
+
+
+def test_uncommitted_changes_discarded(tmpdir):
+    file = str(tmpdir.join('job.storage'))
+    with pytest.raises(RuntimeError):
+        with open_store(file, 'sqlite') as storage:
+            storage.add([make_job('a')])
+            raise RuntimeError()
+
+    with open_store(file, 'sqlite') as storage:
+        assert len(storage.groups()) == 0
+
+
+def test_migrate_pickle(tmpdir):
+    file = str(tmpdir.join('job.storage'))
+    jobs = defaultdict(list)
+    jobs[make_job('a').key()] += [make_job('a'), make_job('b')]
+    with open(file, 'wb') as f:
+        pickle.dump(jobs, f, protocol=2)
+
+    with open_store(file, 'sqlite') as storage:
+        assert [j.file for j in storage.groups()[make_job('a').key()]] == ['a', 'b']
+
+    assert is_sqlite(file)
+    assert not is_sqlite(file + '.pickle')
+    with pytest.raises(ValueError):
+        open_store(file, 'pickle')
+
+
+def add_jobs(file, prefix, n):
+    for i in range(n):
+        with open_store(file) as storage:
+            storage.add([make_job('%s%i' % (prefix, i))])
+
+
+def test_concurrent_writers(tmpdir):
+    file = str(tmpdir.join('job.storage'))
+    processes = [multiprocessing.Process(target=add_jobs, args=(file, prefix, 50)) for prefix in 'ab']
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+    assert [p.exitcode for p in processes] == [0, 0]
+    with open_store(file) as storage:
+        assert len(storage.groups()[make_job('a').key()]) == 100
+
+
+@pytest.mark.parametrize('backend', available_backends())
+def test_write_behind(tmpdir, backend):
+    file = str(tmpdir.join('job.storage'))
+    with open_store(file, backend) as storage:
+        storage.add([make_job('a'), make_job('b')])
+
+    storage = WriteBehindStore(open_store(file, backend))
+    with storage:  # like a mode run by the server
+        storage.add([make_job('c'), make_job('a', minutes=20)])
+        assert storage.remove(['b', 'x']) == 1
+        storage.add([make_job('b')])
+        storage.remove(['c'])
+    assert storage.pending() == 3
+    with open_store(file, backend) as direct:
+        assert sorted(j.file for j in direct.groups()[make_job('a').key()]) == ['a', 'b']
+
+    assert storage.flush() == 3
+    assert storage.flush() == 0
+    storage.shutdown()
+    with open_store(file, backend) as direct:
+        assert [(j.file, j.time) for j in direct.groups()[make_job('a').key()]] == [
+            ('a', timedelta(minutes=20)), ('b', timedelta(minutes=10))]
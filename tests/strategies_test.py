@@ -0,0 +1,56 @@
+from datetime import timedelta
+
+import pytest
+
+from job_combine.cluster.job import Job, sum_times
+from job_combine.partitioning import engine
+from job_combine.partitioning.strategies import *
+
+# greedy assigns 3 | 3, 2 | 2, 2 to the first partition and ends with a makespan of 7 instead of 6
+jobs = [Job('file_%i' % i, 'job', 'dir', timedelta(minutes=t), None, None, [], 'Slurm')
+        for i, t in enumerate([3, 3, 2, 2, 2])]
+
+
+def makespan(part):
+    return max(sum_times(p) for p in part)
+
+
+@pytest.mark.parametrize('name', available_strategies())
+def test_strategy_keeps_all_jobs(name):
+    part, totals = strategies[name](jobs, 2)
+    assert sorted(j.file for p in part for j in p) == sorted(j.file for j in jobs)
+    assert totals == [sum_times(p) for p in part]
+    assert makespan(part) <= timedelta(minutes=7)
+
+
+@pytest.mark.parametrize('name', ['complete-greedy', 'local-search'])
+def test_strategy_optimal(name):
+    part, _ = strategies[name](jobs, 2)
+    assert makespan(part) == timedelta(minutes=6)
+
+
+def test_strategy_expired_budget():
+    part, _ = complete_greedy(jobs, 2, deadline=0)
+    assert makespan(part) == timedelta(minutes=7)
+
+
+def test_strategy_honors_max_time():
+    split = splitter('complete-greedy', budget=1, n_jobs=len(jobs))
+    part, warnings = engine.search(jobs, max_time=timedelta(minutes=6), split=split)
+    assert len(part) == 2
+    assert warnings == []
+
+
+def test_splitter_refines(monkeypatch):
+    # the result of the strategy is improved by the local search within the budget
+    monkeypatch.setitem(strategies, 'karmarkar-karp', lambda desc_jobs, n, deadline=None: engine.greedy(desc_jobs, n))
+    for budget in (None, 1):
+        part, totals = splitter('karmarkar-karp', budget, len(jobs))(jobs, 2)
+        assert makespan(part) == timedelta(minutes=6)
+        assert totals == [sum_times(p) for p in part]
+    assert makespan(splitter('greedy', 1, len(jobs))(jobs, 2)[0]) == timedelta(minutes=7)
+
+
+def test_lower_bound():
+    assert lower_bound(jobs, 2) == timedelta(minutes=6)
+    assert lower_bound(jobs, 5) == timedelta(minutes=3)
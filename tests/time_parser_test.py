@@ -66,3 +66,27 @@ def test_format_td_approx():
 def test_format_td_gap():
     result = str_from_timedelta(timedelta(hours=3, minutes=2, seconds=1), '%H:%S')
     assert_time_str(result, '3:121')
+
+
+def test_parse_str_fast_formats():
+    formats = ['%D-%H:%M:%S', '%D-%H:%M', '%H:%M:%S', '%M']
+    assert str_to_timedelta('1-2:3:4', *formats) == timedelta(days=1, hours=2, minutes=3, seconds=4)
+    assert str_to_timedelta('1-2:3', *formats) == timedelta(days=1, hours=2, minutes=3)
+    assert str_to_timedelta('2:3:4', *formats) == timedelta(hours=2, minutes=3, seconds=4)
+    with pytest.raises(ValueError):
+        str_to_timedelta('2::4', *formats)
+
+
+def test_parse_str_regex_characters():
+    assert str_to_timedelta('1a2', '%H.%M') == timedelta(hours=1, minutes=2)
+
+
+def test_parse_strs():
+    result = strs_to_timedeltas(['1:2:3', '4', '1:2:3'], '%H:%M:%S', '%M')
+    assert result == [timedelta(hours=1, minutes=2, seconds=3), timedelta(minutes=4),
+                      timedelta(hours=1, minutes=2, seconds=3)]
+
+
+def test_parse_strs_no_match():
+    with pytest.raises(ValueError):
+        strs_to_timedeltas(['1:2:3', '1-2'], '%H:%M:%S')